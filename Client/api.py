@@ -0,0 +1,151 @@
+import json
+import time
+
+from PyQt5.QtCore    import QObject, QUrl, QUrlQuery
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+
+from constants import API_TIMEOUT_MS
+from metrics   import metrics
+
+class ApiResult:
+    """
+    Результат REST-запроса, который получает обработчик:
+    код ответа HTTP (0 — ответа нет), разобранный JSON и текст ошибки сети.
+    """
+
+    __slots__ = ("status", "data", "error")
+
+    def __init__(self, status: int, data, error: str = ""):
+        self.status = status    # HTTP-код ответа (0, если сервер не ответил)
+        self.data   = data      # тело ответа, разобранное из JSON (или None)
+        self.error  = error     # описание сетевой ошибки (пусто, если ответ получен)
+
+    @property
+    def ok(self) -> bool:
+        """
+        True, если сервер ответил кодом 2xx.
+        """
+        return 200 <= self.status < 300
+
+class ApiClient(QObject):
+    """
+    Асинхронный клиент REST API сервера.
+    Все запросы идут через один QNetworkAccessManager: соединения с сервером
+    переиспользуются (keep-alive), а ответы приходят в цикле событий Qt,
+    не блокируя интерфейс. Запрос с тем же тегом отменяет предыдущий.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._nam = QNetworkAccessManager(self)
+        self._inflight = {}     # тег → выполняющийся QNetworkReply
+        self._cancelled = set() # запросы, отменённые через cancel() (обработчик не вызывается)
+
+    def get(self, url: str, params: dict = None, token: str = None,
+            callback=None, tag: str = None) -> QNetworkReply:
+        """
+        Выполняет GET-запрос с параметрами строки запроса.
+        По завершении вызывает callback(ApiResult).
+        """
+        qurl = QUrl(url)
+        if params:
+            query = QUrlQuery()
+            for key, value in params.items():
+                query.addQueryItem(key, str(value))
+            qurl.setQuery(query)
+
+        reply = self._nam.get(self._make_request(qurl, token))
+        return self._track(reply, callback, tag)
+
+    def post(self, url: str, payload: dict, token: str = None,
+             callback=None, tag: str = None) -> QNetworkReply:
+        """
+        Выполняет POST-запрос с JSON-телом.
+        По завершении вызывает callback(ApiResult).
+        """
+        request = self._make_request(QUrl(url), token)
+        request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
+        reply = self._nam.post(request, json.dumps(payload).encode("utf-8"))
+        return self._track(reply, callback, tag)
+
+    def cancel(self, tag: str):
+        """
+        Отменяет выполняющийся запрос с указанным тегом (обработчик не вызывается).
+        """
+        reply = self._inflight.pop(tag, None)
+        if reply is not None:
+            self._cancelled.add(reply)
+            reply.abort()
+
+    @staticmethod
+    def _make_request(qurl: QUrl, token: str = None) -> QNetworkRequest:
+        """
+        Готовит запрос: заголовок авторизации и тайм-аут.
+        """
+        request = QNetworkRequest(qurl)
+        if token:
+            request.setRawHeader(b"Authorization", f"Bearer {token}".encode())
+        request.setTransferTimeout(API_TIMEOUT_MS)
+        return request
+
+    def _track(self, reply: QNetworkReply, callback, tag: str) -> QNetworkReply:
+        """
+        Запоминает запрос под тегом (отменяя предыдущий с тем же тегом)
+        и подписывается на его завершение.
+        """
+        if tag is not None:
+            self.cancel(tag)
+            self._inflight[tag] = reply
+        started = time.perf_counter() if metrics.enabled else 0
+        reply.finished.connect(lambda: self._finished(reply, callback, tag, started))
+        return reply
+
+    def _finished(self, reply: QNetworkReply, callback, tag: str, started: float = 0):
+        """
+        Обрабатывает завершение запроса: разбирает ответ и вызывает обработчик.
+        Запросы, отменённые через cancel(), молча пропускаются; прерванные
+        по тайм-ауту (тоже OperationCanceledError) получают ApiResult с ошибкой "timeout".
+        При включённых метриках учитывает время запроса по пути URL.
+        """
+        reply.deleteLater()
+        if tag is not None and self._inflight.get(tag) is reply:
+            del self._inflight[tag]
+
+        if reply in self._cancelled:
+            # запрос отменён (вытеснен новым или закрыт диалог)
+            self._cancelled.discard(reply)
+            return
+
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) or 0
+        if started:
+            path = reply.url().path()
+            metrics.observe(f"rest_ms.{path}", (time.perf_counter() - started) * 1000)
+            metrics.inc(f"rest.status.{status}")
+        if reply.error() == QNetworkReply.OperationCanceledError:
+            # прервано по тайм-ауту (setTransferTimeout)
+            result = ApiResult(0, None, "timeout")
+        elif status == 0:
+            # сервер не ответил: ошибка соединения или тайм-аут
+            result = ApiResult(0, None, reply.errorString())
+        else:
+            body = bytes(reply.readAll())
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                data = None
+            result = ApiResult(status, data)
+
+        if callback is not None:
+            callback(result)
+
+_client = None
+
+def api_client() -> ApiClient:
+    """
+    Возвращает общий для всего приложения экземпляр ApiClient
+    (создаётся при первом обращении).
+    """
+    global _client
+    if _client is None:
+        _client = ApiClient()
+    return _client
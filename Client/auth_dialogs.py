@@ -1,7 +1,7 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QLineEdit, QPushButton, QMessageBox
 )
-import requests
+from api       import api_client
 from constants import SIGNUP_URL, LOGIN_URL, PASTEL_QSS
 
 class RegisterDialog(QDialog):
@@ -31,16 +31,16 @@ class RegisterDialog(QDialog):
         self.pw.setEchoMode(QLineEdit.Password)             # Скрываем ввод
 
         # Кнопка «Создать аккаунт»
-        btn = QPushButton("Создать аккаунт")
-        btn.setObjectName("sendBtn")  # Применим CSS-стили из темы
+        self.btn = QPushButton("Создать аккаунт")
+        self.btn.setObjectName("sendBtn")  # Применим CSS-стили из темы
 
         # Компонуем элементы вертикально
         lay = QVBoxLayout(self)
-        for w in (self.fn, self.ln, self.un, self.pw, btn):
+        for w in (self.fn, self.ln, self.un, self.pw, self.btn):
             lay.addWidget(w)
 
         # Обработка клика по кнопке — вызываем метод signup()
-        btn.clicked.connect(self.signup)
+        self.btn.clicked.connect(self.signup)
 
         # Применяем зелёную пастельную тему
         self.setStyleSheet(PASTEL_QSS)
@@ -49,8 +49,8 @@ class RegisterDialog(QDialog):
         """
         Обрабатывает регистрацию нового пользователя:
         1. Проверяет, что обязательные поля не пустые.
-        2. Формирует и отправляет POST-запрос на сервер.
-        3. Анализирует ответ сервера и сообщает результат пользователю.
+        2. Формирует и асинхронно отправляет POST-запрос на сервер
+           (ответ обработает on_signup_done).
         """
         # 1) Проверка на заполненность обязательных полей
         first_name = self.fn.text().strip()
@@ -74,16 +74,24 @@ class RegisterDialog(QDialog):
             "last_name":  self.ln.text().strip(),
             "password":   password
         }
-        # Пытаемся отправить POST-запрос на сервер для регистрации
-        try:
-            r = requests.post(SIGNUP_URL, json=payload, timeout=5)
-        except Exception as e:
+        # Отправляем POST-запрос на сервер, пока ждём ответ — кнопка неактивна
+        self.btn.setEnabled(False)
+        api_client().post(SIGNUP_URL, payload,
+                          callback=self.on_signup_done, tag="signup")
+
+    def on_signup_done(self, r):
+        """
+        3. Анализирует ответ сервера на регистрацию и сообщает результат пользователю.
+        """
+        self.btn.setEnabled(True)
+
+        if r.status == 0:
             # Если возникла ошибка сети — показываем сообщение
-            QMessageBox.critical(self, "Ошибка сети", str(e))
+            QMessageBox.critical(self, "Ошибка сети", r.error)
             return
 
-        # 3) Обрабатываем ответ сервера
-        if r.status_code == 200:
+        # Обрабатываем ответ сервера
+        if r.status == 200:
             QMessageBox.information(
                 self, "Успех",
                 "Регистрация завершена!"
@@ -91,7 +99,7 @@ class RegisterDialog(QDialog):
             self.accept()
 
         # Конфликт: такой username уже занят
-        elif r.status_code == 409:
+        elif r.status == 409:
             QMessageBox.warning(
                 self, "Имя занято",
                 "Пользователь с таким username уже существует."
@@ -101,7 +109,7 @@ class RegisterDialog(QDialog):
         else:
             QMessageBox.critical(
                 self, "Ошибка регистрации",
-                f"Сервер вернул код {r.status_code}"
+                f"Сервер вернул код {r.status}"
             )
 
 class LoginDialog(QDialog):
@@ -125,18 +133,18 @@ class LoginDialog(QDialog):
         self.pw.setEchoMode(QLineEdit.Password)
 
         # Кнопки входа и регистрации
-        btnLogin = QPushButton("Войти");
-        btnLogin.setObjectName("sendBtn")
+        self.btnLogin = QPushButton("Войти");
+        self.btnLogin.setObjectName("sendBtn")
         btnReg   = QPushButton("Регистрация");
         btnReg.setObjectName("sendBtn")
 
         # Размещение всех элементов вертикально
         lay = QVBoxLayout(self)
-        for w in (self.un, self.pw, btnLogin, btnReg):
+        for w in (self.un, self.pw, self.btnLogin, btnReg):
             lay.addWidget(w)
 
         # Обработка кликов по кнопкам
-        btnLogin.clicked.connect(self.login)
+        self.btnLogin.clicked.connect(self.login)
         btnReg.clicked.connect(self.open_register)
 
         # Эти поля будут заполнены при успешном входе
@@ -150,10 +158,8 @@ class LoginDialog(QDialog):
         """
         Обрабатывает попытку входа пользователя:
         1. Проверяет, что поля логина и пароля заполнены.
-        2. Отправляет POST-запрос на сервер с введёнными данными.
-        3. Обрабатывает ответ:
-           - при успехе сохраняет токен и имя пользователя, закрывает окно;
-           - иначе показывает соответствующее сообщение об ошибке.
+        2. Асинхронно отправляет POST-запрос на сервер с введёнными данными
+           (ответ обработает on_login_done).
         """
         # 1) Проверка: оба поля должны быть заполнены
         username = self.un.text().strip()
@@ -168,26 +174,35 @@ class LoginDialog(QDialog):
 
         # 2) Формируем запрос к серверу
         payload = {"username": username, "password": password}
-        try:
-            r = requests.post(LOGIN_URL, json=payload, timeout=5)
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка сети", str(e))
+        self.btnLogin.setEnabled(False)     # пока ждём ответ — повторно не отправляем
+        api_client().post(LOGIN_URL, payload,
+                          callback=self.on_login_done, tag="login")
+
+    def on_login_done(self, r):
+        """
+        3. Обрабатывает ответ сервера на вход:
+           - при успехе сохраняет токен и имя пользователя, закрывает окно;
+           - иначе показывает соответствующее сообщение об ошибке.
+        """
+        self.btnLogin.setEnabled(True)
+
+        if r.status == 0:
+            QMessageBox.critical(self, "Ошибка сети", r.error)
             return
 
-        # 3) Обработка ответа от сервера
-        if r.status_code == 200:
+        if r.status == 200 and isinstance(r.data, dict):
             # Успешный вход: сохраняем данные и закрываем окно
-            j = r.json()
+            j = r.data
             self.token    = j["token"]
             self.username = j["username"]
             self.accept()
 
-        elif r.status_code == 404:
+        elif r.status == 404:
             # Пользователь не найден
             QMessageBox.warning(self, "Нет пользователя",
                                 "Пользователь не найден.")
 
-        elif r.status_code == 401:
+        elif r.status == 401:
             # Пароль неверный
             QMessageBox.warning(self, "Неверный пароль",
                                 "Пароль не совпадает с учётными данными.")
@@ -195,7 +210,7 @@ class LoginDialog(QDialog):
         else:
             # Другая ошибка
             QMessageBox.critical(self, "Ошибка входа",
-                                 f"Сервер вернул код {r.status_code}")
+                                 f"Сервер вернул код {r.status}")
 
     def open_register(self):
         """
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+
+from constants  import CACHE_DIR, CACHE_LOAD_PER_CHAT
+from conv_store import Message
+from models     import ChatSummary
+
+class MessageCache:
+    """
+    Локальный кэш чатов и сообщений в SQLite (отдельный файл на каждого пользователя).
+    Позволяет показать переписку сразу при запуске и запрашивать у сервера
+    только сообщения новее последних сохранённых.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id  INTEGER PRIMARY KEY,
+            username TEXT    NOT NULL DEFAULT '',
+            display  TEXT    NOT NULL DEFAULT '',
+            last_msg TEXT    NOT NULL DEFAULT '',
+            last_at  INTEGER NOT NULL DEFAULT 0,
+            is_group INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            chat_id        INTEGER NOT NULL,
+            ts             INTEGER NOT NULL,
+            sender         TEXT    NOT NULL,
+            text           TEXT    NOT NULL,
+            sender_display TEXT    NOT NULL DEFAULT '',
+            UNIQUE (chat_id, ts, sender, text)
+        );
+        CREATE INDEX IF NOT EXISTS messages_chat_ts ON messages (chat_id, ts);
+    """
+
+    def __init__(self, username: str, directory: str = CACHE_DIR):
+        """
+        Открывает (или создаёт) файл кэша для указанного пользователя.
+        Имя файла — хэш username: само имя может содержать разделители пути
+        и другие недопустимые в имени файла символы.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.sha256(username.encode("utf-8")).hexdigest()[:32]
+        self.path = os.path.join(directory, f"{name}.sqlite3")
+
+        self._db = sqlite3.connect(self.path)
+        # WAL + NORMAL: быстрые коммиты без полной синхронизации диска на каждую запись
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+        self._db.commit()
+
+    def load_chats(self) -> list[ChatSummary]:
+        """
+        Возвращает сохранённый список чатов.
+        """
+        rows = self._db.execute(
+            "SELECT chat_id, username, display, last_msg, last_at, is_group FROM chats"
+        )
+        return [
+            ChatSummary(chat_id=cid, username=user, display=disp,
+                        last_msg=last_msg, last_at=last_at, is_group=bool(is_grp))
+            for cid, user, disp, last_msg, last_at, is_grp in rows
+        ]
+
+    def load_messages(self, per_chat: int = CACHE_LOAD_PER_CHAT) -> dict[int, list[Message]]:
+        """
+        Возвращает последние per_chat сообщений каждого чата в хронологическом порядке:
+        chat_id → список Message.
+        """
+        rows = self._db.execute("""
+            SELECT chat_id, sender, text, ts, sender_display
+              FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY ts DESC) AS rn
+                      FROM messages)
+             WHERE rn <= ?
+             ORDER BY chat_id, ts
+        """, (per_chat,))
+
+        result = {}
+        for cid, sender, text, ts, display in rows:
+            result.setdefault(cid, []).append(Message(sender, text, ts, display))
+        return result
+
+    def load_chat(self, chat_id: int, limit: int = CACHE_LOAD_PER_CHAT) -> list[Message]:
+        """
+        Возвращает последние limit сообщений одного чата в хронологическом порядке
+        (например, чтобы вернуть в память выгруженную историю).
+        """
+        rows = self._db.execute("""
+            SELECT sender, text, ts, sender_display
+              FROM (SELECT * FROM messages WHERE chat_id = ? ORDER BY ts DESC LIMIT ?)
+             ORDER BY ts
+        """, (chat_id, limit))
+        return [Message(sender, text, ts, display) for sender, text, ts, display in rows]
+
+    def last_ts(self) -> dict[int, int]:
+        """
+        Возвращает время последнего сохранённого сообщения по каждому чату:
+        chat_id → ts в миллисекундах.
+        """
+        rows = self._db.execute("SELECT chat_id, MAX(ts) FROM messages GROUP BY chat_id")
+        return dict(rows)
+
+    def save_chats(self, chats: list[ChatSummary]):
+        """
+        Заменяет сохранённый список чатов актуальным.
+        """
+        self._db.execute("DELETE FROM chats")
+        self._db.executemany(
+            "INSERT INTO chats (chat_id, username, display, last_msg, last_at, is_group) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(c.chat_id, c.username, c.display, c.last_msg, c.last_at, int(c.is_group))
+             for c in chats],
+        )
+
+    def clear_chat(self, chat_id: int):
+        """
+        Удаляет сохранённые сообщения чата (перед заменой его истории).
+        """
+        self._db.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+
+    def add_messages(self, chat_id: int, msgs: list[Message]):
+        """
+        Сохраняет сообщения чата.
+        Повторы (то же время, отправитель и текст) пропускаются.
+        """
+        self._db.executemany(
+            "INSERT OR IGNORE INTO messages (chat_id, sender, text, ts, sender_display) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(chat_id, m.sender, m.text, m.ts, m.display) for m in msgs],
+        )
+
+    def commit(self):
+        """
+        Записывает накопленные изменения на диск.
+        """
+        self._db.commit()
+
+    def close(self):
+        """
+        Сохраняет изменения и закрывает файл кэша.
+        """
+        self._db.commit()
+        self._db.close()
@@ -1,18 +1,24 @@
+import os
 import time
-from collections    import defaultdict
-from datetime       import datetime, timezone
+from collections    import defaultdict, OrderedDict
 
+from PyQt5.QtCore    import Qt, QTimer
+from PyQt5.QtGui     import QKeySequence
 from PyQt5.QtWidgets import (
-    QWidget, QListWidget, QListWidgetItem, QLabel, QLineEdit, QPushButton,
-    QHBoxLayout, QVBoxLayout, QSplitter, QListView, QDialog
+    QWidget, QLabel, QLineEdit, QPushButton,
+    QHBoxLayout, QVBoxLayout, QSplitter, QListView, QDialog, QShortcut, QToolTip
 )
 
-from constants  import PASTEL_QSS
-from models     import ChatListModel, ChatSummary
-from new_chat_dialog import NewChatDialog
-from new_group_dialog import NewGroupDialog
+from cache      import MessageCache
+from constants  import (PASTEL_QSS, PENDING_DIRECT_MAX, OUTGOING_MAX, HISTORY_PREFETCH_PX,
+                        CHAT_CARD_PIXMAP_CACHE, CACHE_DIR)
+from conv_store import (ConversationStore, Message,
+                        STATUS_SENT, STATUS_PENDING, STATUS_FAILED)
+from metrics    import metrics
+from models     import ChatListModel, MessageListModel
+from packets    import ChatHistory
 from ws         import WSBridge
-from widgets    import BubbleWidget, ChatItemDelegate
+from widgets    import BubbleDelegate, ChatItemDelegate, ChatListView, MetricsOverlay
 
 class ChatWindow(QWidget):
     """
@@ -33,7 +39,29 @@ class ChatWindow(QWidget):
         self.recipient = ""               # Текущий собеседник (username)
         self.current_chat_id = 0          # ID выбранного чата
         self.is_group = False             # Флаг: групповой ли чат
-        self.convs = defaultdict(list)    # История сообщений по chat_id
+        self.store = ConversationStore(on_evict=self.on_history_evicted)  # Истории сообщений по chat_id
+        self.pending_direct = defaultdict(list)  # Личные сообщения для чатов, которых ещё нет в списке (по username)
+        self.outgoing = OrderedDict()     # client_id → (chat_id, Message): свои сообщения, ждущие эха сервера
+
+        # Постраничная загрузка истории
+        self.oldest_ts = {}               # chat_id → время самого старого загруженного сообщения (мс)
+        self.oldest_id = {}               # chat_id → его ID на сервере (0 — история из кэша)
+        self.history_more = {}            # chat_id → есть ли на сервере сообщения старше загруженных
+        self.history_loading = set()      # chat_id, для которых уже запрошена страница
+        self.scroll_anchor = None         # расстояние от низа списка, которое держим при подгрузке сверху
+
+        # === WebSocket ===
+
+        # Соединение открываем первым: рукопожатие с сервером идёт, пока строится
+        # интерфейс (сигналы обрабатываются в цикле событий, когда окно уже готово).
+        # Входящие пакеты приходят пачками, уже разобранными в отдельном потоке
+        self.ws_bridge = WSBridge(username, token)
+        self.ws_bridge.got_packets.connect(self.handle_packets)
+        # После подключения просим у сервера только то, чего нет в кэше
+        self.ws_bridge.connected.connect(self.request_sync)
+        # Состояние доставки своих сообщений
+        self.ws_bridge.acked.connect(self.on_message_acked)
+        self.ws_bridge.send_failed.connect(self.on_message_failed)
 
         # Общие настройки окна
         self.setWindowTitle(f"Tychagram — {username}")
@@ -53,13 +81,15 @@ class ChatWindow(QWidget):
 
         # Список чатов
         self.chatModel = ChatListModel(self)    # модель чатов
-        self.chatListView = QListView()
+        self.chatListView = ChatListView()       # пока чатов нет — рисует заглушки карточек
         self.chatListView.setModel(self.chatModel)
-        self.chatListView.setItemDelegate(ChatItemDelegate(self.chatListView))  # кастомный внешний вид
+        self.chatListView.setItemDelegate(
+            ChatItemDelegate(self.chatListView, pixmap_cache=CHAT_CARD_PIXMAP_CACHE))  # кастомный внешний вид
         self.chatListView.setSpacing(2)
         self.chatListView.setVerticalScrollMode(QListView.ScrollPerPixel)
         self.chatListView.setStyleSheet("QListView{background:transparent;border:none;}")
         self.chatListView.clicked.connect(self.on_chat_selected)
+        self.chatModel.modelReset.connect(self.restore_chat_selection)
 
         # Компоновка левой панели
         leftBox = QWidget()
@@ -71,11 +101,28 @@ class ChatWindow(QWidget):
 
         # === Правая панель: сообщения и ввод ===
 
-        # Список сообщений
-        self.messages = QListWidget()
-        self.messages.setSpacing(4)
-        self.messages.setSelectionMode(QListWidget.NoSelection)
-        self.messages.setVerticalScrollMode(QListWidget.ScrollPerPixel)
+        # Список сообщений: модель над историей + делегат, рисующий пузыри
+        self.msgModel = MessageListModel(username, self.store, self)
+        self.messages = QListView()
+        self.messages.setModel(self.msgModel)
+        self.messages.setItemDelegate(BubbleDelegate(self.messages))
+        self.messages.setSpacing(2)
+        self.messages.setSelectionMode(QListView.NoSelection)
+        self.messages.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.messages.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.messages.setWordWrap(True)                     # пересчёт высоты пузырей при смене ширины
+        self.messages.setResizeMode(QListView.Adjust)
+        self.messages.setLayoutMode(QListView.Batched)      # раскладка строк порциями, без фриза на длинной истории
+        self.messages.setBatchSize(200)
+        self.messages.setStyleSheet("QListView{background:#d8f3dc;border:none;}")
+
+        # При прокрутке к началу переписки подгружаем более старые сообщения
+        scroll = self.messages.verticalScrollBar()
+        scroll.valueChanged.connect(self.maybe_load_older)
+        scroll.rangeChanged.connect(self.keep_scroll_anchor)
+        self.anchorTimer = QTimer(self)
+        self.anchorTimer.setSingleShot(True)
+        self.anchorTimer.timeout.connect(self.release_scroll_anchor)
 
         # Поле ввода текста
         self.input = QLineEdit()
@@ -117,18 +164,160 @@ class ChatWindow(QWidget):
         # Применяем стилизацию
         self.setStyleSheet(PASTEL_QSS)
 
-        # === WebSocket ===
+        # === Локальный кэш ===
 
-        # Создаём WebSocket-соединение и подписываемся на входящие пакеты
-        self.ws_bridge = WSBridge(username, token)
-        self.ws_bridge.got_packet.connect(self.handle_packet)
+        # Поднимаем сохранённые чаты и переписку, чтобы показать их сразу,
+        # ещё до ответа сервера
+        self.cache = MessageCache(username)
+        self.load_cache()
+        # Без сохранённых чатов показываем заглушки до первого списка от сервера
+        self.chatListView.set_loading(self.chatModel.rowCount() == 0)
+
+        # Изменения кэша записываем на диск пачками, а не на каждое сообщение
+        self.cacheTimer = QTimer(self)
+        self.cacheTimer.setSingleShot(True)
+        self.cacheTimer.timeout.connect(self.flush_cache)
+        self.chats_dirty = False    # список чатов изменился и ещё не сохранён
+
+        # === Метрики (для отладки) ===
+        # Ctrl+Shift+M — показать/скрыть окно метрик, Ctrl+Shift+S — сохранить их в JSON
+        self.metricsOverlay = MetricsOverlay(self, lambda: dict(metrics.snapshot(), **self.metrics_extra()))
+        QShortcut(QKeySequence("Ctrl+Shift+M"), self, activated=self.metricsOverlay.toggle)
+        QShortcut(QKeySequence("Ctrl+Shift+S"), self, activated=self.dump_metrics)
+
+    def load_cache(self):
+        """
+        Загружает из локального кэша список чатов и последние сообщения
+        каждого чата в модель и хранилище историй.
+        """
+        chats = self.cache.load_chats()
+        self.chatModel.update_chats(chats)
+
+        for cid, msgs in self.cache.load_messages().items():
+            self.set_history(cid, msgs, has_more=True)
+
+    def load_chat_from_cache(self, chat_id: int) -> bool:
+        """
+        Возвращает в память историю чата из локального кэша
+        (например, после выгрузки из-за бюджета памяти).
+        Возвращает False, если в кэше ничего нет.
+        """
+        msgs = self.cache.load_chat(chat_id)
+        if not msgs:
+            return False
+        self.set_history(chat_id, msgs, has_more=True)
+        return True
+
+    def set_history(self, chat_id: int, msgs: list, has_more: bool, oldest_id: int = 0):
+        """
+        Заменяет историю чата и запоминает состояние постраничной загрузки.
+        Более старые сообщения догрузим с сервера при прокрутке вверх.
+        oldest_id — ID первого сообщения на сервере (0 — неизвестен).
+        """
+        # Свои сообщения, которые уже есть в этой истории, заменяются строками сервера;
+        # остальные, ещё ждущие эха, остаются в конце переписки
+        self.settle_echoes(chat_id, msgs)
+        waiting = [m for cid, m in self.outgoing.values()
+                   if cid == chat_id and m.status == STATUS_PENDING]
+        self.store.replace(chat_id, msgs + waiting if waiting else msgs)
+        self.oldest_ts[chat_id] = msgs[0].ts if msgs else 0
+        self.oldest_id[chat_id] = oldest_id
+        self.history_more[chat_id] = has_more
+
+    def settle_echoes(self, chat_id: int, msgs: list) -> list:
+        """
+        Находит в истории с сервера свои сообщения, уже показанные в переписке
+        (по client_id): эхо могло потеряться вместе с соединением, а сообщение —
+        сохраниться на сервере. Ожидающая копия отмечается доставленной
+        (как при "ack"), повторять её больше не нужно.
+        Возвращает сообщения истории, которых в переписке ещё нет.
+        """
+        own = [m for m in msgs if m.client_id]
+        if not own:
+            return msgs
+
+        shown = {m.client_id for m in self.store.messages(chat_id) if m.client_id}
+        settled = set()
+        for row in own:
+            entry = self.outgoing.pop(row.client_id, None)
+            if entry is not None:
+                local = entry[1]
+                local.ts = row.ts
+                local.status = STATUS_SENT
+                self.msgModel.message_changed(local)
+                self.ws_bridge.confirm(row.client_id)
+                settled.add(row.client_id)
+            elif row.client_id in shown:
+                settled.add(row.client_id)      # уже подтверждено "ack" раньше истории
+        if not settled:
+            return msgs
+        return [m for m in msgs if m.client_id not in settled]
+
+    def on_history_evicted(self, chat_id: int):
+        """
+        История чата выгружена из памяти: забываем состояние её загрузки,
+        при открытии чата она будет прочитана из кэша или запрошена заново.
+        """
+        self.oldest_ts.pop(chat_id, None)
+        self.oldest_id.pop(chat_id, None)
+        self.history_more.pop(chat_id, None)
+        self.history_loading.discard(chat_id)
+
+    def request_sync(self):
+        """
+        Отправляет серверу запрос "history_since": для каждого чата из кэша —
+        время последнего сохранённого сообщения. Сервер пришлёт только более
+        новые сообщения, а для чатов без кэша — обычную историю.
+        При переподключении (resume) сервер вместо полного списка чатов
+        присылает только изменившиеся.
+        """
+        since = {str(cid): ts for cid, ts in self.cache.last_ts().items()}
+        self.ws_bridge.send({"type": "history_since", "since": since})
+
+        if self.ws_bridge.resumed():
+            # Ответы на запросы страниц, отправленные до разрыва, потеряны — запрашиваем заново
+            self.history_loading.clear()
+            cid = self.current_chat_id
+            if cid and cid not in self.history_more:
+                self.request_history_page(cid, 0)
+            else:
+                self.maybe_load_older()
+
+    def schedule_cache_flush(self):
+        """
+        Планирует запись изменений кэша на диск (не чаще раза в секунду).
+        """
+        if not self.cacheTimer.isActive():
+            self.cacheTimer.start(1000)
+
+    def flush_cache(self):
+        """
+        Сохраняет список чатов (если он менялся) и фиксирует изменения кэша.
+        """
+        if self.chats_dirty:
+            self.cache.save_chats(self.chatModel.chats())
+            self.chats_dirty = False
+        self.cache.commit()
+
+    def closeEvent(self, event):
+        """
+        При закрытии окна сохраняет несохранённые изменения кэша,
+        останавливает WebSocket-мост и закрывает файл кэша.
+        """
+        self.cacheTimer.stop()
+        self.flush_cache()
+        self.ws_bridge.shutdown()
+        self.cache.close()      # после моста: новые пакеты в кэш уже не попадут
+        super().closeEvent(event)
 
     def open_new_chat(self):
         """
         Открывает диалог создания нового личного чата.
         После закрытия диалога (если пользователь нажал «Начать»),
         список чатов обновится автоматически через WebSocket push от сервера.
+        Модуль диалога загружается при первом открытии (ускоряет запуск).
         """
+        from new_chat_dialog import NewChatDialog
         dlg = NewChatDialog(self.token, parent=self)
         if dlg.exec_() == QDialog.Accepted:
             # Обновление списка чатов произойдёт автоматически по сигналу от сервера
@@ -139,7 +328,9 @@ class ChatWindow(QWidget):
         Открывает диалог создания нового группового чата.
         После подтверждения сервер создаст чат и отправит обновлённый список
         участникам через WebSocket (обновление произойдёт автоматически).
+        Модуль диалога загружается при первом открытии (ускоряет запуск).
         """
+        from new_group_dialog import NewGroupDialog
         dlg = NewGroupDialog(self.token, parent=self)
         if dlg.exec_() == QDialog.Accepted:
             # Обновление списка чатов придёт от сервера автоматически
@@ -158,6 +349,13 @@ class ChatWindow(QWidget):
         self.current_chat_id = cid
         self.is_group = bool(is_grp)
 
+        # Открытый чат не выгружается из памяти; выгруженную историю поднимаем из кэша
+        self.store.pin(cid)
+        if not self.store.has(cid) and not self.load_chat_from_cache(cid):
+            # В кэше тоже пусто — заводим пустую историю: в неё модель допишет
+            # новые сообщения, пока с сервера идёт последняя страница
+            self.store.replace(cid, [])
+
         if self.is_group:
             # В группах нет конкретного получателя
             self.recipient = None
@@ -170,12 +368,28 @@ class ChatWindow(QWidget):
         self.sendBtn.setEnabled(True)                                       # Разблокируем кнопку отправки
         self.reload_chat_view()                                             # Перерисовываем историю сообщений
 
+        # История этого чата ещё не загружалась — просим последнюю страницу
+        if cid not in self.history_more:
+            self.request_history_page(cid, 0)
+
+    def restore_chat_selection(self):
+        """
+        Большой снимок списка чатов применяется сбросом модели — выделение
+        при этом теряется, снова выделяем открытый чат.
+        """
+        idx = self.chatModel.index_for_chat(self.current_chat_id)
+        if idx.isValid():
+            self.chatListView.setCurrentIndex(idx)
+
     def send(self):
         """
         Отправляет сообщение из текстового поля:
         - проверяет, что текст не пустой;
         - формирует пакет в зависимости от типа чата (групповой или личный);
-        - отправляет сообщение через WebSocket;
+        - ставит сообщение в очередь исходящих WSBridge (она доставит его,
+          в том числе после переподключения);
+        - сразу показывает его в переписке и в превью чата как ожидающее
+          подтверждения (эхо сервера найдёт его по client_id);
         - очищает поле ввода.
         """
         txt = self.input.text().strip()
@@ -191,197 +405,363 @@ class ChatWindow(QWidget):
                 "text": txt,
             }
         else:
-            # Для личного чата нужен получатель
-            if not self.recipient:
+            # Для личного чата нужен получатель — берём его из индекса чатов
+            recipient = self.chatModel.username_for_chat(self.current_chat_id) or self.recipient
+            if not recipient:
                 return
             payload = {
                 "type": "msg",
                 "from": self.username,
-                "to": self.recipient,
+                "to": recipient,
                 "text": txt,
             }
 
-        # Отправляем пакет через WebSocket и очищаем поле
-        self.ws_bridge.send(payload)
+        # Ставим пакет в очередь отправки и очищаем поле
+        client_id = self.ws_bridge.send_message(payload)
         self.input.clear()
 
-    def handle_packet(self, pkt: dict):
+        # Показываем сообщение сразу, не дожидаясь ответа сервера
+        # (пока чата нет в списке, например новый личный чат, — ждём эха как раньше)
+        cid = self.current_chat_id
+        if cid:
+            now = int(time.time() * 1000)
+            msg = Message(self.username, txt, now, client_id=client_id, status=STATUS_PENDING)
+            self.outgoing[client_id] = (cid, msg)
+            while len(self.outgoing) > OUTGOING_MAX:
+                self.outgoing.popitem(last=False)
+            self.add_message(cid, msg, cache=False)
+            self.chatModel.set_last_message(cid, txt, now)
+
+    def on_message_acked(self, client_id: str, ts: int):
+        """
+        Сервер ответил "ack" на повтор своего сообщения (эхо первой копии
+        потерялось): отмечаем его доставленным на месте, берём время сервера
+        и записываем в кэш — так же, как при эхе "msg".
+        """
+        entry = self.outgoing.pop(client_id, None)
+        if entry is None:
+            return
+        chat_id, msg = entry
+        if ts:
+            msg.ts = ts
+        msg.status = STATUS_SENT
+        self.msgModel.message_changed(msg)
+        self.cache.add_messages(chat_id, [msg])
+        self.schedule_cache_flush()
+
+    def on_message_failed(self, client_id: str):
+        """
+        Сообщение так и не подтверждено сервером — показываем его как недоставленное.
+        """
+        entry = self.outgoing.pop(client_id, None)
+        if entry is not None:
+            entry[1].status = STATUS_FAILED
+            self.msgModel.message_changed(entry[1])
+
+    def handle_packets(self, packets: list):
+        """
+        Применяет пачку пакетов, разобранных WSBridge в отдельном потоке.
+        При включённых метриках замеряет время применения каждого пакета.
+        """
+        if not metrics.enabled:
+            for pkt in packets:
+                self.handle_packet(pkt)
+            return
+
+        for pkt in packets:
+            started = time.perf_counter()
+            self.handle_packet(pkt)
+            metrics.observe(f"apply_ms.{pkt.type}", (time.perf_counter() - started) * 1000)
+        metrics.inc("ui.batches")
+
+    def metrics_extra(self) -> dict:
         """
-        Обрабатывает входящие пакеты от сервера по WebSocket.
-        Поддерживаются три типа пакетов:
+        Дополнение к метрикам: счётчики очередей WSBridge и память историй.
+        """
+        return {
+            "ws": self.ws_bridge.stats(),
+            "store": {"memory_bytes": self.store.memory_usage(),
+                      "evictions": self.store.evictions},
+        }
+
+    def dump_metrics(self):
+        """
+        Сохраняет текущие метрики в JSON-файл в папке кэша.
+        """
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = os.path.join(CACHE_DIR, f"metrics-{int(time.time())}.json")
+        metrics.dump(path, self.metrics_extra())
+        QToolTip.showText(self.mapToGlobal(self.rect().center()), f"Метрики сохранены: {path}", self)
+
+    def observe_render_latency(self, ts_ms: int):
+        """
+        Сквозная задержка входящего сообщения: от времени сервера (ts)
+        до момента, когда пузырь отрисован (следующая итерация цикла событий).
+        Включает расхождение часов клиента и сервера.
+        """
+        QTimer.singleShot(0, lambda: metrics.observe("e2e_render_ms", time.time() * 1000 - ts_ms))
+
+    def handle_packet(self, pkt):
+        """
+        Обрабатывает входящие пакеты от сервера по WebSocket
+        (объекты из packets, уже проверенные в потоке разбора):
         - "history"  — история сообщений чата;
+        - "history_bulk" — история многих чатов (начальная синхронизация);
         - "chats"    — список чатов;
+        - "chat_update" — изменения списка чатов;
         - "msg"      — новое сообщение.
         """
-        ptype = pkt.get("type")     # Определяем тип пакета
+        ptype = pkt.type            # Определяем тип пакета
 
         # 1. История сообщений чата
         if ptype == "history":
-            chat_id = pkt.get("chat_id", 0)
-            messages = pkt.get("messages") or []
-
-            # Очищаем текущую историю чата
-            self.convs[chat_id] = []
-
-            for row in messages:
-                ts = row.get("ts", 0) / 1000
-                hhmm = datetime.fromtimestamp(ts, timezone.utc) \
-                    .astimezone().strftime("%H:%M")
-                sender = row.get("from", "")
-                text = row.get("text", "")
-                display_name = row.get("sender_display", sender)
-
-                # Сохраняем сообщение как кортеж: (отправитель, текст, время, имя для отображения)
-                self.convs[chat_id].append((sender, text, hhmm, display_name))
-
             # Если история получена для текущего активного чата — обновляем отображение
-            if self.current_chat_id == chat_id:
+            if self.apply_history(pkt) and self.current_chat_id == pkt.chat_id:
+                self.reload_chat_view()
+            return
+
+        # 1a. История многих чатов одним кадром (начальная синхронизация):
+        #     применяем все чаты, а переписку перестраиваем не больше одного раза
+        if ptype == "history_bulk":
+            reload = False
+            for entry in pkt.chats:
+                if self.apply_history(entry) and entry.chat_id == self.current_chat_id:
+                    reload = True
+            if reload:
                 self.reload_chat_view()
             return
 
         # 2. Пакет со списком чатов
         if ptype == "chats":
-            raw = pkt.get("chats") or []
-            unique = {}     # предотвращаем дубликаты по chat_id
+            self.chatListView.set_loading(False)
+            # Модель сама сравнит снимок с текущим списком и обновит
+            # (переместит, вставит или удалит) только изменившиеся строки.
+            # partial — после переподключения сервер прислал только изменившиеся чаты
+            self.chatModel.update_chats(pkt.chats, partial=pkt.partial)
+            self.chats_dirty = True
+            self.schedule_cache_flush()
+
+            # Раскладываем отложенные личные сообщения по появившимся чатам
+            self.flush_pending_direct()
+            return
 
-            for c in raw:
-                cid = c.get("chat_id", 0)
-                if cid in unique:
-                    continue  # пропускаем повторы
+        # 2a. Изменения списка чатов (вместо полного снимка на каждое сообщение)
+        if ptype == "chat_update":
+            for cid in pkt.removed:
+                self.chatModel.remove_chat(cid)
 
-                is_grp = c.get("is_group", False)
-                last_at = c.get("last_at", 0)       # время последнего сообщения
-                last_msg = c.get("last_msg", "")    # текст последнего сообщения
+            if pkt.added:
+                self.chatModel.update_chats(pkt.added, partial=True)
 
-                if is_grp:
-                    user = ""                   # для групп нет конкретного собеседника
-                    disp = c.get("title", "")   # название группы
+            for cid, last_msg, last_at in pkt.updated:
+                if self.chatModel.index_for_chat(cid).isValid():
+                    self.chatModel.set_last_message(cid, last_msg, last_at)
                 else:
-                    user = c.get("username", "")    # username собеседника
-                    disp = c.get("display", "")     # отображаемое имя собеседника
-
-                # Создаём сводку по чату
-                summary = ChatSummary(
-                    chat_id=cid,
-                    username=user,
-                    display=disp,
-                    last_msg=last_msg,
-                    last_at=last_at,
-                    is_group=is_grp,
-                )
-                unique[cid] = summary
-
-            # Сортируем чаты по времени последнего сообщения (сначала новые)
-            chats = list(unique.values())
-            chats.sort(key=lambda x: x.last_at, reverse=True)
-
-            # Обновляем модель списка чатов
-            self.chatModel.update_chats(chats)
+                    # Изменился чат, которого у нас нет — просим полный список
+                    self.ws_bridge.send({"type": "chats_request"})
+
+            self.chats_dirty = True
+            self.schedule_cache_flush()
+            if pkt.added:
+                self.flush_pending_direct()
             return
 
         # 3. Пакет с новым сообщением
         if ptype == "msg":
-            ts_ms = pkt.get("ts", int(time.time() * 1000))
-            hhmm = datetime.fromtimestamp(ts_ms / 1000, timezone.utc) \
-                .astimezone().strftime("%H:%M")
-
-            sender = pkt.get("from")
-            text = pkt.get("text", "")
-            display_name = pkt.get("sender_display", sender)
+            msg = pkt.message
+
+            # Эхо своего сообщения, которое уже показано: обновляем его на месте
+            entry = self.outgoing.pop(pkt.client_id, None)
+            if entry is not None:
+                chat_id, local = entry
+                metrics.observe("send_echo_ms", time.time() * 1000 - local.ts)
+                local.ts = msg.ts
+                local.status = STATUS_SENT
+                self.msgModel.message_changed(local)
+                self.cache.add_messages(chat_id, [local])
+                self.schedule_cache_flush()
+                return
 
             # получаем chat_id (0 → личный)
-            cid = pkt.get("chat_id", 0)
+            cid = pkt.chat_id
 
             if cid:
-                # Групповое сообщение
-                # Добавляем в историю
-                self.convs[cid].append((sender, text, hhmm, display_name))
-
-                # Если открыт именно этот чат — отрисовываем сообщение сразу
-                if self.current_chat_id == cid:
-                    self.add_bubble(sender, text, hhmm, display_name)
+                # Групповое сообщение: добавляем в историю
+                # (если чат открыт — через модель, чтобы сразу отрисовать)
+                self.add_message(cid, msg)
             else:
                 # Личное сообщение
                 # Определяем peer (собеседника), чтобы найти нужный чат
-                peer = sender if sender != self.username else pkt.get("to")
+                peer = msg.sender if msg.sender != self.username else pkt.to
 
-                # Находим chat_id по username собеседника
-                cid = 0
-                for row in range(self.chatModel.rowCount()):
-                    idx = self.chatModel.index(row, 0)
-                    if self.chatModel.data(idx, ChatListModel.UsernameRole) == peer:
-                        cid = self.chatModel.data(idx, ChatListModel.ChatIDRole)
-                        break
+                # Находим chat_id по username собеседника (индекс модели, O(1))
+                cid = self.chatModel.chat_id_for_user(peer)
 
                 if cid == 0:
-                    # если не нашли такой чат — ничего не делаем
+                    # Чат ещё не пришёл в списке — откладываем сообщение
+                    # до следующего пакета "chats"
+                    buf = self.pending_direct[peer]
+                    buf.append(msg)
+                    del buf[:-PENDING_DIRECT_MAX]
                     return
 
-                # Добавляем сообщение в историю
-                self.convs[cid].append((sender, text, hhmm))
-
-                # Если это активный чат — отрисовываем сообщение
-                if self.current_chat_id == cid:
-                    self.add_bubble(sender, text, hhmm)
+                # Добавляем сообщение в историю (и в открытый чат, если это он)
+                self.add_message(cid, msg)
 
             return
 
-    def add_bubble(self, sender: str, text: str, time_str: str, display_name: str = None):
+    def apply_history(self, hist: ChatHistory) -> bool:
         """
-        Добавляет сообщение в виде «пузыря» в окно чата:
-        - определяет, является ли сообщение исходящим;
-        - создаёт виджет BubbleWidget;
-        - добавляет его в QListWidget с прокруткой вниз.
+        Применяет историю одного чата (пакет "history" или элемент "history_bulk")
+        к хранилищу и кэшу. Переписку на экране не трогает, кроме страницы
+        старых сообщений открытого чата (она добавляется сверху сразу).
+        Возвращает True, если открытый чат нужно перестроить.
         """
-        # Определяем, нужно ли рисовать сообщение справа (если оно от текущего пользователя)
-        outgoing = (sender == self.username)
-
-        # Создаём виджет пузыря с учётом направления и подписи
-        bubble = BubbleWidget(text, outgoing, time_str, display_name)
+        chat_id = hist.chat_id
+        msgs = hist.messages        # готовые Message из потока разбора
+
+        self.history_loading.discard(chat_id)
+
+        if hist.before:
+            # Страница старых сообщений — добавляем в начало переписки
+            if self.store.has(chat_id):
+                # Без ID границы сервер присылает миллисекунду before целиком —
+                # уже загруженные сообщения этой миллисекунды отбрасываем
+                if msgs and msgs[-1].ts == hist.before:
+                    known = set()
+                    for m in self.store.messages(chat_id):
+                        if m.ts != hist.before:
+                            break
+                        known.add((m.sender, m.text))
+                    msgs = [m for m in msgs
+                            if m.ts != hist.before or (m.sender, m.text) not in known]
+                self.history_more[chat_id] = hist.has_more
+                if hist.messages:
+                    self.oldest_ts[chat_id] = hist.messages[0].ts
+                    self.oldest_id[chat_id] = hist.oldest_id
+            self.cache.add_messages(chat_id, msgs)
+            self.schedule_cache_flush()
+            self.prepend_messages(chat_id, msgs)
+            return False
+
+        if hist.since:
+            # Дельта — дописываем к уже загруженной из кэша истории
+            # (если история выгружена, новые сообщения останутся в кэше);
+            # свои сообщения, уже показанные в переписке, второй раз не добавляем
+            self.store.extend(chat_id, self.settle_echoes(chat_id, msgs))
+        else:
+            # Последняя страница истории — заменяем текущую
+            # (в кэше тоже: между старыми и новыми сообщениями мог быть разрыв)
+            self.set_history(chat_id, msgs, has_more=hist.has_more, oldest_id=hist.oldest_id)
+            self.cache.clear_chat(chat_id)
 
-        # Оборачиваем его в элемент списка
-        item = QListWidgetItem()
-        self.messages.addItem(item)
-        self.messages.setItemWidget(item, bubble)
-        item.setSizeHint(bubble.sizeHint())
+        self.cache.add_messages(chat_id, msgs)
+        self.schedule_cache_flush()
+        return True
 
-        # Автоматически прокручиваем вниз, чтобы видеть последнее сообщение
-        self.messages.scrollToBottom()
+    def flush_pending_direct(self):
+        """
+        Переносит отложенные личные сообщения в историю тех чатов,
+        которые появились в индексе после очередного пакета "chats".
+        """
+        for peer in list(self.pending_direct):
+            cid = self.chatModel.chat_id_for_user(peer)
+            if cid == 0:
+                continue
+            for msg in self.pending_direct.pop(peer):
+                self.add_message(cid, msg)
+
+    def add_message(self, chat_id: int, msg: Message, cache: bool = True):
+        """
+        Добавляет сообщение в историю чата:
+        - если чат сейчас открыт — через модель, чтобы появилась одна новая строка,
+          и прокручивает список вниз;
+        - иначе дописывает его в загруженную историю (выгруженные истории не трогаем);
+        - сохраняет сообщение в локальный кэш (если cache; своё неподтверждённое
+          сообщение попадёт в кэш после эха сервера, с его временем).
+        """
+        if cache:
+            self.cache.add_messages(chat_id, [msg])
+            self.schedule_cache_flush()
+
+        if self.current_chat_id == chat_id:
+            # Модель хранит ссылку на этот же список из хранилища
+            self.msgModel.append_messages([msg])
+            self.messages.scrollToBottom()
+            if metrics.enabled and msg.sender != self.username:
+                self.observe_render_latency(msg.ts)
+        else:
+            self.store.append(chat_id, msg)
 
-    def add_sender_label(self, display_name: str):
+    def prepend_messages(self, chat_id: int, msgs: list):
         """
-        Добавляет имя отправителя в виде отдельной подписи над сообщением.
-        Используется в групповых чатах для отделения сообщений от разных участников.
+        Добавляет страницу старых сообщений в начало переписки.
+        Если чат открыт, позиция прокрутки сохраняется относительно низа списка,
+        чтобы видимые сообщения не «прыгали».
         """
-        item = QListWidgetItem()        # создаём пустой элемент списка
-        label = QLabel(display_name)    # создаём виджет с именем
+        if self.current_chat_id != chat_id:
+            self.store.prepend(chat_id, msgs)
+            return
+        if not msgs:
+            return
 
-        # Стили: жирный шрифт и небольшой отступ слева
-        label.setStyleSheet("font-weight:bold; margin-left:8px;")
+        scroll = self.messages.verticalScrollBar()
+        self.scroll_anchor = scroll.maximum() - scroll.value()
+        # Модель хранит ссылку на этот же список из хранилища
+        self.msgModel.prepend_messages(msgs)
+        self.anchorTimer.start(300)
 
-        # Добавляем элемент и прикрепляем к нему виджет QLabel
-        self.messages.addItem(item)
-        self.messages.setItemWidget(item, label)
+    def keep_scroll_anchor(self, _min: int, maximum: int):
+        """
+        Пока строки новой страницы раскладываются (порциями), держит
+        видимую часть переписки на месте: расстояние от низа не меняется.
+        """
+        if self.scroll_anchor is not None:
+            self.messages.verticalScrollBar().setValue(maximum - self.scroll_anchor)
+            self.anchorTimer.start(300)
 
-    def reload_chat_view(self):
+    def release_scroll_anchor(self):
         """
-        Полностью перерисовывает текущую переписку на экране:
-        - очищает список сообщений;
-        - добавляет каждый пузырь сообщений заново из истории self.convs;
-        - для групповых чатов отображает имя отправителя.
+        Раскладка новой страницы закончилась — прокрутка снова свободна.
         """
-        self.messages.clear()   # Удаляем все виджеты сообщений
+        self.scroll_anchor = None
+        self.maybe_load_older()
 
-        # Получаем список сообщений для текущего активного чата
-        msgs = self.convs.get(self.current_chat_id, [])
+    def maybe_load_older(self, *_):
+        """
+        Если переписка прокручена к самому началу (или целиком помещается на экране),
+        запрашивает у сервера страницу сообщений постарше.
+        """
+        cid = self.current_chat_id
+        if not cid or self.scroll_anchor is not None:
+            return
+        if not self.history_more.get(cid) or cid in self.history_loading:
+            return
+        if self.messages.verticalScrollBar().value() > HISTORY_PREFETCH_PX:
+            return
+        self.request_history_page(cid, self.oldest_ts.get(cid, 0), self.oldest_id.get(cid, 0))
+
+    def request_history_page(self, chat_id: int, before: int, before_id: int = 0):
+        """
+        Запрашивает страницу истории чата: сообщения старше сообщения
+        (before, before_id) — времени в мс и ID на сервере,
+        или последнюю страницу, если before == 0.
+        """
+        pkt = {"type": "history_before", "chat_id": chat_id, "before": before}
+        if before_id:
+            pkt["before_id"] = before_id
+        if self.ws_bridge.send(pkt):
+            self.history_loading.add(chat_id)
 
+    def reload_chat_view(self):
+        """
+        Переключает список сообщений на историю текущего чата:
+        модель получает ссылку на список из хранилища, а делегат рисует
+        только видимые пузыри (для групп — с именем отправителя).
+        """
+        self.scroll_anchor = None
+        self.msgModel.set_chat(self.current_chat_id, show_names=self.is_group)
+        self.messages.scrollToBottom()
 
-        for entry in msgs:
-            # Если это групповой чат и запись содержит имя отправителя
-            if self.is_group and len(entry) == 4:
-                frm, txt, tm, display_name = entry
-                self.add_bubble(frm, txt, tm, display_name)
-            else:
-                # Личный чат или display_name отсутствует — просто добавляем пузырь
-                frm, txt, tm = entry[:3]
-                self.add_bubble(frm, txt, tm)
\ No newline at end of file
+        # Короткая переписка не заполняет экран — сразу догружаем старые сообщения
+        self.maybe_load_older()
@@ -1,3 +1,5 @@
+import os
+
 # Адрес WebSocket-соединения, через которое клиент получает и отправляет сообщения
 SERVER_URL = "ws://localhost:8080/ws"
 
@@ -19,6 +21,25 @@ CHAT_CREATE_URL = f"{API_BASE}/chats/direct"
 # URL для создания группового чата (POST)
 GROUP_CREATE_URL = f"{API_BASE}/chats/group"
 
+# Тайм-аут REST-запросов к серверу, мс
+API_TIMEOUT_MS = 5000
+
+# Сколько пользователей сервер возвращает на один поисковый запрос (LIMIT в SearchUsers)
+SEARCH_LIMIT = 20
+
+# Кэш поиска пользователей: число запомненных запросов и время жизни результата, с
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL  = 60
+
+# Каталог локального кэша чатов и сообщений (по файлу SQLite на пользователя).
+# Можно переопределить переменной окружения TYCHAGRAM_CACHE_DIR
+CACHE_DIR = os.environ.get("TYCHAGRAM_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".tychagram"
+)
+
+# Сколько последних сообщений каждого чата поднимать из кэша при старте
+CACHE_LOAD_PER_CHAT = 200
+
 # Пастельная зелёная тема для виджетов Qt
 # Оформляет фон, цвет текста, кнопки, поля ввода и выделения
 PASTEL_QSS = """
@@ -108,4 +129,47 @@ GROUP_MEMBER_LIST_QSS = """
             border: 2px solid #52b788;
             border-radius: 4px;
         }
-    """
\ No newline at end of file
+    """
+# Сколько личных сообщений хранить для собеседника, чей чат ещё не пришёл в списке чатов
+PENDING_DIRECT_MAX = 500
+
+# Сколько своих сообщений, ещё не подтверждённых сервером, отслеживать для обновления на месте
+# (более старые остаются на экране как есть)
+OUTGOING_MAX = 1000
+
+# Как часто применять снимки списка чатов ("chats") при потоке сообщений, мс.
+# 0 — не чаще одного раза за итерацию цикла событий; более старые снимки отбрасываются
+CHATS_APPLY_INTERVAL_MS = 0
+
+# С какого числа новых и переместившихся чатов снимок применяется сбросом модели
+# (сортировка один раз), а не построчными вставками и перемещениями
+CHATS_RESET_MIN = 64
+
+# На каком расстоянии от начала переписки (в пикселях) подгружать более старые сообщения
+HISTORY_PREFETCH_PX = 200
+
+# Бюджет памяти на истории переписки в клиенте, байт.
+# При превышении выгружаются истории давно не открывавшихся чатов
+CONV_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Кэшировать ли отрисованные карточки списка чатов целиком (QPixmapCache)
+CHAT_CARD_PIXMAP_CACHE = False
+
+# Переподключение WebSocket: экспоненциальная задержка со случайным разбросом, мс
+RECONNECT_BASE_MS = 500
+RECONNECT_MAX_MS = 30000
+
+# Очередь исходящих сообщений: сколько ждать подтверждения ("ack") до повторной отправки, мс,
+# и сколько попыток сделать, прежде чем считать сообщение неотправленным
+SEND_ACK_TIMEOUT_MS = 10000
+SEND_MAX_ATTEMPTS = 5
+
+# Формат кадров от сервера, запрашиваемый при подключении (параметр enc):
+# "deflate" — JSON, сжатый одним потоком deflate на соединение (бинарные кадры);
+# "json" — обычные текстовые кадры. Сервер без поддержки enc отвечает JSON —
+# клиент принимает оба формата. Переопределяется переменной TYCHAGRAM_WIRE
+WIRE_ENCODING = os.environ.get("TYCHAGRAM_WIRE", "deflate")
+
+# Встроенные метрики клиента (счётчики и гистограммы задержек): включаются
+# переменной окружения TYCHAGRAM_METRICS=1; окно метрик — Ctrl+Shift+M, сохранить в JSON — Ctrl+Shift+S
+METRICS_ENABLED = os.environ.get("TYCHAGRAM_METRICS", "") not in ("", "0")
@@ -0,0 +1,161 @@
+import sys
+from collections import OrderedDict
+
+from constants import CONV_MEMORY_BUDGET
+
+# Состояние доставки сообщения
+STATUS_SENT    = "sent"     # сообщение есть на сервере
+STATUS_PENDING = "pending"  # своё сообщение показано сразу, подтверждения сервера ещё нет
+STATUS_FAILED  = "failed"   # своё сообщение так и не подтверждено сервером
+
+class Message:
+    """
+    Одно сообщение переписки в памяти клиента.
+    Хранит «сырое» время в миллисекундах (форматируется только при отрисовке),
+    а имена отправителей интернируются: одна строка на пользователя
+    вместо копии в каждом сообщении.
+    Для своих сообщений, показанных до ответа сервера, хранит client_id
+    и состояние доставки.
+    """
+
+    __slots__ = ("sender", "text", "ts", "display", "client_id", "status")
+
+    def __init__(self, sender: str, text: str, ts: int, display: str = None,
+                 client_id: str = None, status: str = STATUS_SENT):
+        self.sender    = sys.intern(sender)                             # username отправителя
+        self.text      = text                                           # текст сообщения
+        self.ts        = ts                                             # время отправки (мс Unix-времени)
+        self.display   = sys.intern(display) if display else self.sender  # имя отправителя для показа
+        self.client_id = client_id                                      # id, выданный при отправке
+        self.status    = status                                         # состояние доставки
+
+class ConversationStore:
+    """
+    Хранилище историй переписки по chat_id с ограничением по памяти.
+    Чаты упорядочены по давности использования: когда оценка занятой памяти
+    превышает бюджет, истории давно не открывавшихся чатов выгружаются
+    (их можно снова прочитать из локального кэша или запросить у сервера).
+    Открытый сейчас чат не выгружается никогда.
+    """
+
+    _MSG_OVERHEAD = 120     # примерная стоимость одного Message (объект + ссылка + строка без текста), байт
+
+    def __init__(self, budget_bytes: int = CONV_MEMORY_BUDGET, on_evict=None):
+        """
+        budget_bytes — бюджет памяти на все истории;
+        on_evict(chat_id) — вызывается после выгрузки истории чата.
+        """
+        self._budget = budget_bytes
+        self._on_evict = on_evict
+        self._chats = OrderedDict()     # chat_id → список Message (в конце — недавно использованные)
+        self._sizes = {}                # chat_id → оценка занятой памяти, байт
+        self._total = 0                 # суммарная оценка, байт
+        self._pinned = 0                # открытый чат (не выгружается)
+        self.evictions = 0              # сколько раз выгружались истории
+
+    def has(self, chat_id: int) -> bool:
+        """
+        True, если история чата загружена в память.
+        """
+        return chat_id in self._chats
+
+    def messages(self, chat_id: int):
+        """
+        Возвращает список сообщений чата или пустой кортеж, если история
+        не загружена (хранилище при этом не меняется).
+        Список живой: модель отображения держит на него ссылку.
+        """
+        return self._chats.get(chat_id, ())
+
+    def pin(self, chat_id: int):
+        """
+        Отмечает чат как открытый: он становится самым свежим и не выгружается.
+        """
+        self._pinned = chat_id
+        if chat_id in self._chats:
+            self._chats.move_to_end(chat_id)
+
+    def memory_usage(self) -> int:
+        """
+        Возвращает оценку памяти, занятой всеми историями, байт.
+        """
+        return self._total
+
+    def replace(self, chat_id: int, msgs: list):
+        """
+        Заменяет историю чата (на месте, чтобы ссылка у модели осталась верной).
+        Если история чата не загружена, создаёт её.
+        """
+        current = self._chats.get(chat_id)
+        if current is None:
+            current = self._chats[chat_id] = []
+            self._sizes[chat_id] = 0
+        current[:] = msgs
+        self._chats.move_to_end(chat_id)
+        self._account(chat_id, self._estimate(msgs) - self._sizes[chat_id])
+
+    def append(self, chat_id: int, msg: Message) -> bool:
+        """
+        Добавляет сообщение в конец загруженной истории.
+        Если история чата выгружена или ещё не загружалась, ничего не делает
+        и возвращает False (сообщение останется в локальном кэше).
+        """
+        msgs = self._chats.get(chat_id)
+        if msgs is None:
+            return False
+        msgs.append(msg)
+        self._account(chat_id, self._MSG_OVERHEAD + len(msg.text))
+        return True
+
+    def extend(self, chat_id: int, new: list) -> bool:
+        """
+        Дописывает сообщения в конец загруженной истории (см. append).
+        """
+        msgs = self._chats.get(chat_id)
+        if msgs is None:
+            return False
+        msgs.extend(new)
+        self._account(chat_id, self._estimate(new))
+        return True
+
+    def prepend(self, chat_id: int, old: list) -> bool:
+        """
+        Добавляет более старые сообщения в начало загруженной истории (см. append).
+        """
+        msgs = self._chats.get(chat_id)
+        if msgs is None:
+            return False
+        msgs[0:0] = old
+        self._account(chat_id, self._estimate(old))
+        return True
+
+    def _estimate(self, msgs: list) -> int:
+        """
+        Грубая оценка памяти, которую занимают сообщения.
+        """
+        return sum(self._MSG_OVERHEAD + len(m.text) for m in msgs)
+
+    def _account(self, chat_id: int, delta: int):
+        """
+        Учитывает изменение размера истории чата и при превышении бюджета
+        выгружает давно не использовавшиеся чаты.
+        """
+        self._sizes[chat_id] += delta
+        self._total += delta
+        if self._total > self._budget:
+            self._evict()
+
+    def _evict(self):
+        """
+        Выгружает истории в порядке давности использования, пока не уложимся в бюджет.
+        """
+        for chat_id in list(self._chats):
+            if self._total <= self._budget:
+                break
+            if chat_id == self._pinned:
+                continue
+            del self._chats[chat_id]
+            self._total -= self._sizes.pop(chat_id)
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(chat_id)
@@ -1,7 +1,36 @@
+import time
+_T0 = time.perf_counter()   # момент запуска (до импорта Qt) — для --startup-trace
+
+import sys
+
+from PyQt5.QtCore    import QObject, QEvent
 from PyQt5.QtWidgets import QApplication
 from auth_dialogs import LoginDialog
-from chat_window   import ChatWindow
-import sys
+
+_IMPORT_MS = (time.perf_counter() - _T0) * 1000
+
+class FirstPaintTrace(QObject):
+    """
+    Для --startup-trace: печатает время от запуска до первой отрисовки окна
+    и сразу снимает себя с окна.
+    """
+
+    def __init__(self, widget, label: str):
+        super().__init__(widget)
+        self._label = label
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            trace(f"first paint: {self._label}")
+        return False
+
+def trace(what: str):
+    """
+    Печатает шаг запуска и время от старта процесса, мс.
+    """
+    print(f"[startup] {(time.perf_counter() - _T0) * 1000:8.1f} ms  {what}", file=sys.stderr)
 
 def main():
     """
@@ -9,20 +38,44 @@ def main():
     - запускает интерфейс;
     - показывает окно входа;
     - если вход успешен — открывает основное окно мессенджера.
+
+    С флагом --startup-trace печатает время импорта и время до первой
+    отрисовки окон (для отслеживания скорости холодного старта).
     """
+    tracing = "--startup-trace" in sys.argv
+    if tracing:
+        sys.argv.remove("--startup-trace")
+        trace(f"imports done ({_IMPORT_MS:.1f} ms)")
+
     app = QApplication(sys.argv)    # Инициализация Qt-приложения
 
     login = LoginDialog()            # Открываем окно входа
+    if tracing:
+        FirstPaintTrace(login, "login dialog")
     # Если пользователь закрыл окно или нажал «Отмена» — выходим
     if login.exec_() != LoginDialog.Accepted:
         sys.exit()
 
+    # Главное окно (и модули WebSocket, кэша, моделей) загружаем только после входа
+    started = time.perf_counter()
+    from chat_window import ChatWindow
+    if tracing:
+        trace(f"chat_window imported ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
     # После успешного входа запускаем окно чата, передаём туда имя пользователя и токен
     win = ChatWindow(login.username, login.token)
+    if tracing:
+        trace("chat window built")
+        FirstPaintTrace(win, "chat window")
+
+        def chats_shown(*_):
+            win.chatModel.rowsInserted.disconnect(chats_shown)
+            trace("first chats in list")
+        win.chatModel.rowsInserted.connect(chats_shown)
     win.show()
     # Запуск главного цикла приложения
     sys.exit(app.exec_())
 
 # Запуск приложения
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from constants import METRICS_ENABLED
+
+class Histogram:
+    """
+    Гистограмма длительностей (мс) с фиксированными границами корзин.
+    Хранит число значений, сумму, минимум и максимум; перцентили
+    оцениваются по верхней границе корзины.
+    """
+
+    # Верхние границы корзин, мс (последняя — всё, что больше)
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """
+        Оценка p-го перцентиля (0 < p < 1): верхняя граница корзины,
+        в которую он попадает (для последней корзины — максимум).
+        """
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "min": round(self.min, 3),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+        }
+
+class Metrics:
+    """
+    Счётчики и гистограммы клиента.
+    По умолчанию выключены (включаются переменной окружения TYCHAGRAM_METRICS):
+    места замеров проверяют metrics.enabled и при выключенных метриках
+    не берут даже время. Запись возможна из нескольких потоков (разбор пакетов).
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}     # имя → число
+        self._hists = {}        # имя → Histogram
+        self._started = time.time()
+
+    def inc(self, name: str, value: int = 1):
+        """
+        Увеличивает счётчик.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value_ms: float):
+        """
+        Добавляет значение (мс) в гистограмму.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._hists.get(name)
+            if hist is None:
+                hist = self._hists[name] = Histogram()
+            hist.observe(value_ms)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._hists.clear()
+            self._started = time.time()
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает текущие значения: счётчики и сводки гистограмм.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "uptime_s": round(time.time() - self._started, 1),
+                "counters": dict(sorted(self._counters.items())),
+                "histograms": {k: h.summary() for k, h in sorted(self._hists.items())},
+            }
+
+    def dump(self, path: str, extra: dict = None) -> str:
+        """
+        Сохраняет снимок метрик (и дополнительные данные extra) в JSON-файл.
+        """
+        data = self.snapshot()
+        if extra:
+            data.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+# Общий для всего приложения экземпляр
+metrics = Metrics()
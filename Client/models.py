@@ -1,11 +1,18 @@
+from bisect import bisect_left
+
 from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QVariant
 
+from constants import CHATS_RESET_MIN
+from timefmt   import format_hhmm
+
 class ChatSummary:
     """
     Представляет краткую информацию об одном чате:
     используется для отображения списка чатов в боковой панели.
     """
 
+    __slots__ = ("chat_id", "username", "display", "last_msg", "last_at", "is_group")
+
     def __init__(
         self,
         chat_id: int,           # Уникальный ID чата
@@ -41,7 +48,9 @@ class ChatListModel(QAbstractListModel):
         Инициализация модели. Начинаем с пустого списка чатов.
         """
         super().__init__(parent)
-        self._chats = []    # список объектов ChatSummary
+        self._chats = []    # список объектов ChatSummary, упорядоченный по last_at (сначала новые)
+        self._rows = {}     # chat_id → номер строки в self._chats
+        self._by_user = {}  # username собеседника → chat_id (только личные чаты)
 
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
         """
@@ -79,14 +88,328 @@ class ChatListModel(QAbstractListModel):
         """
         return len(self._chats)
 
-    def update_chats(self, chats: list[ChatSummary]):
+    def chats(self) -> list[ChatSummary]:
+        """
+        Возвращает копию текущего списка чатов (в порядке отображения).
+        """
+        return list(self._chats)
+
+    def index_for_chat(self, chat_id: int) -> QModelIndex:
+        """
+        Возвращает индекс строки чата по его ID (или недопустимый индекс).
+        """
+        row = self._rows.get(chat_id)
+        if row is None:
+            return QModelIndex()
+        return self.index(row, 0)
+
+    def chat_id_for_user(self, username: str) -> int:
+        """
+        Возвращает ID личного чата с указанным собеседником (0, если чата нет).
+        """
+        return self._by_user.get(username, 0)
+
+    def username_for_chat(self, chat_id: int) -> str:
         """
-        Обновляет список чатов в модели:
-        - сообщает Qt, что модель будет перезаписана (beginResetModel);
-        - заменяет внутренний список на новый;
-        - сообщает Qt, что модель обновлена (endResetModel),
-          чтобы интерфейс перерисовался.
+        Возвращает username собеседника личного чата по его ID
+        (пустую строку для групп и неизвестных чатов).
         """
+        row = self._rows.get(chat_id)
+        if row is None:
+            return ""
+        return self._chats[row].username
+
+    def update_chats(self, chats: list[ChatSummary], partial: bool = False):
+        """
+        Применяет новый снимок списка чатов инкрементально:
+        - сравнивает его с текущим состоянием по chat_id;
+        - вставляет новые чаты, удаляет пропавшие (кроме частичного снимка — partial);
+        - перемещает строку, если изменилось время последнего сообщения;
+        - для остальных изменений сообщает только dataChanged.
+        Выделение и позиция прокрутки при этом сохраняются,
+        а перерисовываются только реально изменившиеся строки.
+
+        Если модель пуста или снимок меняет положение большей части строк,
+        построчные вставки обошлись бы в O(n²) — тогда список сортируется
+        один раз и модель сбрасывается целиком (см. _reset_chats).
+        """
+        incoming = {}   # chat_id → ChatSummary (повторы отбрасываем)
+        for chat in chats:
+            incoming.setdefault(chat.chat_id, chat)
+
+        # Сколько строк придётся вставить, переместить или удалить
+        changes, kept = 0, 0
+        for chat in incoming.values():
+            row = self._rows.get(chat.chat_id)
+            if row is None:
+                changes += 1
+            else:
+                kept += 1
+                if self._chats[row].last_at != chat.last_at:
+                    changes += 1
+        if not partial:
+            changes += len(self._chats) - kept
+        if changes and (not self._chats or
+                        (changes >= CHATS_RESET_MIN and changes * 2 >= len(self._chats))):
+            self._reset_chats(incoming, partial)
+            return
+
+        # 1) Удаляем чаты, которых больше нет в снимке
+        #    (частичный снимок содержит только изменившиеся чаты — ничего не удаляем)
+        if not partial:
+            for chat_id in [cid for cid in self._rows if cid not in incoming]:
+                self._remove_row(self._rows[chat_id])
+
+        # 2) Добавляем новые и обновляем существующие
+        for chat in incoming.values():
+            row = self._rows.get(chat.chat_id)
+            if row is None:
+                self._insert_chat(chat)
+            elif self._chats[row].last_at != chat.last_at:
+                self._move_chat(row, chat)
+            elif not self._same(self._chats[row], chat):
+                self._replace(row, chat)
+                idx = self.index(row, 0)
+                self.dataChanged.emit(idx, idx)
+
+    def _reset_chats(self, incoming: dict, partial: bool):
+        """
+        Применяет снимок сбросом модели: собирает новый список (для частичного
+        снимка — вместе с остальными текущими чатами) и сортирует его один раз.
+        """
+        if partial:
+            chats = [c for c in self._chats if c.chat_id not in incoming]
+            chats.extend(incoming.values())
+        else:
+            chats = list(incoming.values())
+        chats.sort(key=lambda c: -c.last_at)
+
         self.beginResetModel()
         self._chats = chats
+        self._rows = {}
+        self._by_user = {}
+        self._reindex(0, len(chats) - 1)
+        for chat in chats:
+            self._index_user(chat)
         self.endResetModel()
+
+    def set_last_message(self, chat_id: int, last_msg: str, last_at: int):
+        """
+        Обновляет превью последнего сообщения одного чата (например, своего,
+        ещё не подтверждённого сервером) и при необходимости поднимает чат вверх.
+        """
+        row = self._rows.get(chat_id)
+        if row is None:
+            return
+        old = self._chats[row]
+        chat = ChatSummary(old.chat_id, old.username, old.display,
+                           last_msg, last_at, old.is_group)
+        if old.last_at != last_at:
+            self._move_chat(row, chat)
+        else:
+            self._replace(row, chat)
+            idx = self.index(row, 0)
+            self.dataChanged.emit(idx, idx)
+
+    def remove_chat(self, chat_id: int):
+        """
+        Удаляет чат из списка (если он есть).
+        """
+        row = self._rows.get(chat_id)
+        if row is not None:
+            self._remove_row(row)
+
+    @staticmethod
+    def _same(a: ChatSummary, b: ChatSummary) -> bool:
+        """
+        Проверяет, совпадают ли отображаемые поля двух сводок одного чата.
+        """
+        return (a.display == b.display and a.last_msg == b.last_msg and
+                a.last_at == b.last_at and a.username == b.username and
+                a.is_group == b.is_group)
+
+    def _replace(self, row: int, chat: ChatSummary):
+        """
+        Заменяет сводку чата в строке и поддерживает индекс username → chat_id.
+        """
+        old = self._chats[row]
+        if self._by_user.get(old.username) == old.chat_id:
+            del self._by_user[old.username]
+        self._chats[row] = chat
+        self._index_user(chat)
+
+    def _index_user(self, chat: ChatSummary):
+        """
+        Добавляет личный чат в индекс username → chat_id.
+        """
+        if not chat.is_group and chat.username:
+            self._by_user[chat.username] = chat.chat_id
+
+    def _position(self, last_at: int) -> int:
+        """
+        Находит позицию для чата с указанным временем так,
+        чтобы список оставался упорядоченным (сначала новые).
+        """
+        return bisect_left(self._chats, -last_at, key=lambda c: -c.last_at)
+
+    def _reindex(self, first: int, last: int):
+        """
+        Обновляет индекс chat_id → строка для диапазона строк [first, last].
+        """
+        for row in range(first, last + 1):
+            self._rows[self._chats[row].chat_id] = row
+
+    def _insert_chat(self, chat: ChatSummary):
+        """
+        Вставляет новый чат на его место в упорядоченном списке.
+        """
+        row = self._position(chat.last_at)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._chats.insert(row, chat)
+        self._reindex(row, len(self._chats) - 1)
+        self._index_user(chat)
+        self.endInsertRows()
+
+    def _remove_row(self, row: int):
+        """
+        Удаляет строку чата и сдвигает индексы следующих строк.
+        """
+        self.beginRemoveRows(QModelIndex(), row, row)
+        chat = self._chats.pop(row)
+        del self._rows[chat.chat_id]
+        if self._by_user.get(chat.username) == chat.chat_id:
+            del self._by_user[chat.username]
+        self._reindex(row, len(self._chats) - 1)
+        self.endRemoveRows()
+
+    def _move_chat(self, row: int, chat: ChatSummary):
+        """
+        Перемещает чат с изменившимся временем последнего сообщения
+        на новое место и обновляет его данные.
+        Переиндексируются только строки между старой и новой позицией.
+        """
+        dest = self._position(chat.last_at)
+        if dest > row:
+            # старая запись стоит выше новой позиции и будет убрана из списка
+            dest -= 1
+
+        if dest != row:
+            # Qt ожидает позицию «до перемещения»: при сдвиге вниз — на одну больше
+            qt_dest = dest if dest < row else dest + 1
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), qt_dest)
+            self._replace(row, chat)
+            self._chats.insert(dest, self._chats.pop(row))
+            self._reindex(min(row, dest), max(row, dest))
+            self.endMoveRows()
+        else:
+            self._replace(row, chat)
+
+        idx = self.index(dest, 0)
+        self.dataChanged.emit(idx, idx)
+
+class MessageListModel(QAbstractListModel):
+    """
+    Модель для отображения переписки одного чата в QListView.
+    Работает напрямую со списком сообщений из ConversationStore,
+    поэтому никаких виджетов на каждое сообщение не создаётся:
+    делегат рисует только видимые строки.
+    """
+
+    # Пользовательские роли (какие поля сообщения можно извлечь из модели)
+    SenderRole      = Qt.UserRole + 1  # username отправителя
+    TextRole        = Qt.UserRole + 2  # текст сообщения
+    TimeRole        = Qt.UserRole + 3  # время отправки (строка HH:MM)
+    DisplayNameRole = Qt.UserRole + 4  # имя отправителя для показа (только в группах)
+    OutgoingRole    = Qt.UserRole + 5  # True, если сообщение отправил текущий пользователь
+    TimestampRole   = Qt.UserRole + 6  # время отправки в миллисекундах
+    StatusRole      = Qt.UserRole + 7  # состояние доставки (STATUS_* из conv_store)
+
+    def __init__(self, username: str, store, parent=None):
+        """
+        Инициализация модели. Изначально чат не выбран — список пуст.
+        store — ConversationStore, из которого берутся истории чатов.
+        """
+        super().__init__(parent)
+        self._username = username   # имя текущего пользователя (для определения исходящих)
+        self._store = store         # хранилище историй
+        self._chat_id = 0           # открытый чат
+        self._messages = []         # список Message открытого чата (ссылка из store)
+        self._show_names = False    # показывать ли имя отправителя (групповой чат)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        """
+        Возвращает данные одного сообщения в зависимости от роли.
+        """
+        if not index.isValid():
+            return QVariant()
+        msg = self._messages[index.row()]
+
+        if role == Qt.DisplayRole or role == self.TextRole:
+            return msg.text
+        if role == self.SenderRole:
+            return msg.sender
+        if role == self.TimeRole:
+            return format_hhmm(msg.ts)
+        if role == self.DisplayNameRole:
+            # Имя показываем только в группах
+            return msg.display if self._show_names else None
+        if role == self.OutgoingRole:
+            return msg.sender == self._username
+        if role == self.TimestampRole:
+            return msg.ts
+        if role == self.StatusRole:
+            return msg.status
+
+        return QVariant()
+
+    def rowCount(self, parent=QModelIndex()):
+        """
+        Возвращает количество сообщений в открытом чате.
+        """
+        return len(self._messages)
+
+    def set_chat(self, chat_id: int, show_names: bool = False):
+        """
+        Переключает модель на другой чат.
+        Список не копируется — модель хранит ссылку на историю из store
+        (пока история не загружена — пустой кортеж из store.messages).
+        """
+        self.beginResetModel()
+        self._chat_id = chat_id
+        self._messages = self._store.messages(chat_id)
+        self._show_names = show_names
+        self.endResetModel()
+
+    def prepend_messages(self, msgs: list):
+        """
+        Добавляет страницу более старых сообщений в начало открытого чата.
+        """
+        if not msgs:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(msgs) - 1)
+        self._store.prepend(self._chat_id, msgs)
+        self.endInsertRows()
+
+    def append_messages(self, msgs: list):
+        """
+        Добавляет сообщения в конец открытого чата
+        и сообщает представлению только о новых строках.
+        """
+        if not msgs:
+            return
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row + len(msgs) - 1)
+        self._store.extend(self._chat_id, msgs)
+        self.endInsertRows()
+
+    def message_changed(self, msg):
+        """
+        Сообщает представлению, что сообщение изменилось (например, состояние доставки):
+        перерисовывается только его строка. Ищем с конца — свои недавние
+        сообщения обычно внизу переписки.
+        """
+        for row in range(len(self._messages) - 1, -1, -1):
+            if self._messages[row] is msg:
+                idx = self.index(row, 0)
+                self.dataChanged.emit(idx, idx)
+                return
@@ -4,8 +4,9 @@ from PyQt5.QtWidgets import (
     QPushButton, QMessageBox, QFrame
 )
 from PyQt5.QtGui     import QStandardItemModel, QStandardItem
-import requests
-from constants import USER_SEARCH_URL, CHAT_CREATE_URL, LIST_VIEW_QSS
+from api       import api_client
+from search_cache import search_users
+from constants import CHAT_CREATE_URL, LIST_VIEW_QSS
 
 class NewChatDialog(QDialog):
     """Диалоговое окно для поиска пользователя и создания нового личного чата."""
@@ -58,36 +59,48 @@ class NewChatDialog(QDialog):
         self.timer.timeout.connect(self.do_search)
         self.searchEdit.textChanged.connect(lambda _: self.timer.start(300))
 
+        # Теги запросов этого диалога: новый поиск отменяет предыдущий,
+        # а при закрытии окна отменяются все незавершённые запросы
+        self.search_tag = f"search:{id(self)}"
+        self.create_tag = f"create:{id(self)}"
+        self.finished.connect(self.cancel_requests)
+
+    def cancel_requests(self):
+        """
+        Отменяет незавершённые запросы диалога (вызывается при закрытии окна).
+        """
+        api_client().cancel(self.search_tag)
+        api_client().cancel(self.create_tag)
+
     def do_search(self):
         """
         Выполняет поиск пользователей по введённому запросу:
         - если строка пуста, очищает список;
-        - иначе отправляет GET-запрос на сервер;
-        - обрабатывает ответ и отображает найденных пользователей в списке.
+        - иначе берёт результат из общего кэша поиска или асинхронно
+          отправляет GET-запрос на сервер (устаревший запрос отменяется);
+        - ответ обработает on_search_done.
         """
         q = self.searchEdit.text().strip()
         if not q:
             # Если поле пустое — просто очищаем список результатов
+            api_client().cancel(self.search_tag)
             self.model.clear()
             return
 
-        try:
-            # Отправляем GET-запрос с параметром q и заголовком авторизации
-            r = requests.get(
-                USER_SEARCH_URL,
-                params={'q': q},
-                headers={'Authorization': f'Bearer {self.token}'},
-                timeout=5
-            )
-            r.raise_for_status()    # выбросит исключение, если код ответа не 200
-            data = r.json()         # преобразуем JSON-ответ в Python-объект
-        except Exception as e:
+        # Отправляем GET-запрос с параметром q и заголовком авторизации
+        search_users(self.token, q, self.on_search_done, self.search_tag)
+
+    def on_search_done(self, r):
+        """
+        Обрабатывает ответ на поиск и отображает найденных пользователей в списке.
+        """
+        if not r.ok:
             # Если что-то пошло не так — показываем ошибку
-            QMessageBox.critical(self, "Ошибка поиска", str(e))
+            QMessageBox.critical(self, "Ошибка поиска", r.error or f"Сервер вернул код {r.status}")
             return
 
         # Проверяем, что сервер вернул список
-        users = data if isinstance(data, list) else []
+        users = r.data if isinstance(r.data, list) else []
 
         # Очищаем предыдущие результаты
         self.model.clear()
@@ -116,25 +129,27 @@ class NewChatDialog(QDialog):
 
     def on_start(self):
         """
-        Отправляет запрос на сервер для создания нового чата с выбранным пользователем.
-        Если успешно — закрывает диалог.
+        Асинхронно отправляет запрос на сервер для создания нового чата
+        с выбранным пользователем (ответ обработает on_start_done).
         """
         if not self.selected_username:
             # ничего не выбрано — ничего не делаем
             return
 
-        try:
-            # POST-запрос на создание личного чата
-            r = requests.post(
-                CHAT_CREATE_URL,
-                json={'username': self.selected_username},
-                headers={'Authorization': f'Bearer {self.token}'},
-                timeout=5
-            )
-            r.raise_for_status()
-        except Exception as e:
+        # POST-запрос на создание личного чата
+        self.startBtn.setEnabled(False)
+        api_client().post(CHAT_CREATE_URL, {'username': self.selected_username},
+                          token=self.token, callback=self.on_start_done,
+                          tag=self.create_tag)
+
+    def on_start_done(self, r):
+        """
+        Если чат успешно создан — закрывает диалог, иначе показывает ошибку.
+        """
+        self.startBtn.setEnabled(True)
+        if not r.ok:
             # Ошибка сети или сервера
-            QMessageBox.critical(self, "Ошибка создания чата", str(e))
+            QMessageBox.critical(self, "Ошибка создания чата", r.error or f"Сервер вернул код {r.status}")
             return
         # Если чат успешно создан — закрываем диалог
         self.accept()
\ No newline at end of file
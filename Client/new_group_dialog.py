@@ -4,8 +4,9 @@ from PyQt5.QtWidgets import (
     QLineEdit, QListView, QPushButton, QLabel, QMessageBox, QFrame
 )
 from PyQt5.QtGui     import QStandardItemModel, QStandardItem
-import requests
-from constants import USER_SEARCH_URL, GROUP_CREATE_URL, GROUP_MEMBER_LIST_QSS
+from api       import api_client
+from search_cache import search_users
+from constants import GROUP_CREATE_URL, GROUP_MEMBER_LIST_QSS
 
 class NewGroupDialog(QDialog):
     """Диалог создания группового чата: ввод названия и выбор участников."""
@@ -49,6 +50,12 @@ class NewGroupDialog(QDialog):
         self.searchTimer.timeout.connect(self.do_search)
         self.searchEdit.textChanged.connect(lambda _: self.searchTimer.start(300))
 
+        # Теги запросов этого диалога: новый поиск отменяет предыдущий,
+        # а при закрытии окна отменяются все незавершённые запросы
+        self.search_tag = f"search:{id(self)}"
+        self.create_tag = f"create:{id(self)}"
+        self.finished.connect(self.cancel_requests)
+
         # 3) Список найденных пользователей (можно отмечать несколько)
         self.model = QStandardItemModel(self)
         self.view = QListView(self)
@@ -86,20 +93,31 @@ class NewGroupDialog(QDialog):
         lay.addWidget(self.view, 1)
         lay.addLayout(btnBox)
 
+    def cancel_requests(self):
+        """
+        Отменяет незавершённые запросы диалога (вызывается при закрытии окна).
+        """
+        api_client().cancel(self.search_tag)
+        api_client().cancel(self.create_tag)
+
     def do_search(self):
         """
         Выполняет поиск пользователей по введённому запросу:
         - если поле пустое — отображает только уже выбранных;
-        - иначе отправляет запрос к серверу и отображает найденных;
+        - иначе берёт результат из общего кэша поиска или асинхронно
+          отправляет запрос к серверу (устаревший запрос отменяется),
+          найденных отобразит on_search_done;
         - в списке можно отметить нескольких участников галочками.
         """
         q = self.searchEdit.text().strip()
 
-        # Начинаем с очистки предыдущих результатов
-        self.model.clear()
-
         # Если поле поиска пустое
         if not q:
+            api_client().cancel(self.search_tag)
+
+            # Начинаем с очистки предыдущих результатов
+            self.model.clear()
+
             # Показываем только уже выбранных участников
             for username in sorted(self.selected):
                 # Показываем отображаемое имя (если есть) или username
@@ -112,22 +130,23 @@ class NewGroupDialog(QDialog):
             return
 
         # Поиск пользователей на сервере
-        try:
-            r = requests.get(
-                USER_SEARCH_URL,
-                params={'q': q},
-                headers={'Authorization': f'Bearer {self.token}'},
-                timeout=5
-            )
-            r.raise_for_status()    # выбрасывает исключение, если код ответа не 200
-            data = r.json()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка поиска", str(e))
+        search_users(self.token, q, self.on_search_done, self.search_tag)
+
+    def on_search_done(self, r):
+        """
+        Обрабатывает ответ на поиск: сначала показывает выбранных участников,
+        затем — найденных, которые ещё не выбраны.
+        """
+        if not r.ok:
+            QMessageBox.critical(self, "Ошибка поиска", r.error or f"Сервер вернул код {r.status}")
             return
 
         # Проверяем, что ответ от сервера — это список.
         # Если по какой-то причине это не список (например, словарь с ошибкой) — подставляем пустой список.
-        users = data if isinstance(data, list) else []
+        users = r.data if isinstance(r.data, list) else []
+
+        # Начинаем с очистки предыдущих результатов
+        self.model.clear()
 
         # Сначала показываем выбранных пользователей
         for username in sorted(self.selected):
@@ -182,8 +201,7 @@ class NewGroupDialog(QDialog):
         """
         Отправляет запрос на создание группового чата:
         - собирает название и список участников;
-        - делает POST-запрос к серверу;
-        - если всё успешно — закрывает окно.
+        - асинхронно делает POST-запрос к серверу (ответ обработает on_create_done).
         """
         title = self.nameEdit.text().strip()
 
@@ -196,18 +214,19 @@ class NewGroupDialog(QDialog):
             'title': title,
             'usernames': list(self.selected)
         }
-        try:
-            # Отправляем запрос на сервер
-            r = requests.post(
-                GROUP_CREATE_URL,
-                json=payload,
-                headers={'Authorization': f'Bearer {self.token}'},
-                timeout=5
-            )
-            r.raise_for_status()    # выбрасывает исключение, если код ответа не 200
-        except Exception as e:
+        # Отправляем запрос на сервер
+        self.okBtn.setEnabled(False)
+        api_client().post(GROUP_CREATE_URL, payload, token=self.token,
+                          callback=self.on_create_done, tag=self.create_tag)
+
+    def on_create_done(self, r):
+        """
+        Если группа создана — закрывает окно, иначе показывает ошибку.
+        """
+        self.okBtn.setEnabled(True)
+        if not r.ok:
             # При ошибке показываем сообщение
-            QMessageBox.critical(self, "Ошибка создания группы", str(e))
+            QMessageBox.critical(self, "Ошибка создания группы", r.error or f"Сервер вернул код {r.status}")
             return
 
         # Группа успешно создана — закрываем диалог
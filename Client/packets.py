@@ -0,0 +1,194 @@
+"""
+Типизированные входящие пакеты сервера.
+
+parse() превращает разобранный JSON-словарь в объект пакета и проверяет типы
+полей — один раз, в потоке разбора (PacketDecoder). Дальше интерфейс работает
+с атрибутами, а сообщения и сводки чатов сразу создаются как Message
+и ChatSummary и без преобразований уходят в хранилище и модели.
+Некорректный пакет — исключение PacketError (обрабатывается в PacketDecoder).
+"""
+
+import time
+
+from conv_store import Message
+from models     import ChatSummary
+
+class PacketError(ValueError):
+    """
+    Пакет не соответствует протоколу (нет нужного поля или поле не того типа).
+    """
+
+def _int(d: dict, key: str) -> int:
+    v = d.get(key)
+    if v is None:
+        return 0
+    if type(v) is not int:
+        raise PacketError(f"{key}: ожидалось целое число, получено {type(v).__name__}")
+    return v
+
+def _str(d: dict, key: str) -> str:
+    v = d.get(key)
+    if v is None:
+        return ""
+    if type(v) is not str:
+        raise PacketError(f"{key}: ожидалась строка, получено {type(v).__name__}")
+    return v
+
+def _list(d: dict, key: str) -> list:
+    v = d.get(key)
+    if v is None:
+        return []
+    if type(v) is not list:
+        raise PacketError(f"{key}: ожидался список, получено {type(v).__name__}")
+    return v
+
+def _dict(v) -> dict:
+    if type(v) is not dict:
+        raise PacketError(f"ожидался объект, получено {type(v).__name__}")
+    return v
+
+def _message(row: dict, default_ts: int = 0) -> Message:
+    """
+    Сообщение из строки истории или пакета "msg".
+    default_ts — время, если в строке его нет. client_id в истории сервер
+    присылает только для своих сообщений пользователя.
+    """
+    row = _dict(row)
+    sender = _str(row, "from")
+    return Message(sender, _str(row, "text"), _int(row, "ts") or default_ts,
+                   _str(row, "sender_display") or sender,
+                   client_id=_str(row, "client_id") or None)
+
+def _summary(c: dict) -> ChatSummary:
+    """
+    Сводка чата из элемента "chats" / "added".
+    """
+    c = _dict(c)
+    is_grp = bool(c.get("is_group", False))
+    if is_grp:
+        user = ""                       # для групп нет конкретного собеседника
+        disp = _str(c, "title")         # название группы
+    else:
+        user = _str(c, "username")      # username собеседника
+        disp = _str(c, "display")       # отображаемое имя собеседника
+    return ChatSummary(_int(c, "chat_id"), user, disp,
+                       _str(c, "last_msg"), _int(c, "last_at"), is_grp)
+
+class MsgPacket:
+    """
+    Новое сообщение ("msg"): сообщение, chat_id (0 — личное), получатель
+    и client_id (для эха своего сообщения).
+    """
+
+    type = "msg"
+    __slots__ = ("message", "chat_id", "to", "client_id")
+
+    def __init__(self, d: dict):
+        # Без времени от сервера — время получения (исходный словарь не меняем)
+        self.message   = _message(d, int(time.time() * 1000) if d.get("ts") is None else 0)
+        self.chat_id   = _int(d, "chat_id")
+        self.to        = _str(d, "to")
+        self.client_id = _str(d, "client_id")
+
+class ChatHistory:
+    """
+    История одного чата: пакет "history" или элемент "history_bulk".
+    since > 0 — только сообщения новее кэша; before > 0 — страница старых сообщений.
+    oldest_id — ID первого сообщения на сервере (0 — не прислан), с ним
+    запрашивается следующая страница.
+    """
+
+    type = "history"
+    __slots__ = ("chat_id", "messages", "since", "before", "has_more", "oldest_id")
+
+    def __init__(self, d: dict):
+        d = _dict(d)
+        self.chat_id  = _int(d, "chat_id")
+        self.messages = [_message(row) for row in _list(d, "messages")]
+        self.since    = _int(d, "since")
+        self.before   = _int(d, "before")
+        self.has_more = bool(d.get("has_more", False))
+        self.oldest_id = _int(d, "oldest_id")
+
+class HistoryBulkPacket:
+    """
+    История многих чатов одним кадром ("history_bulk").
+    """
+
+    type = "history_bulk"
+    __slots__ = ("chats",)
+
+    def __init__(self, d: dict):
+        self.chats = [ChatHistory(entry) for entry in _list(d, "chats")]
+
+class ChatsPacket:
+    """
+    Список чатов ("chats"); partial — только изменившиеся чаты.
+    """
+
+    type = "chats"
+    __slots__ = ("chats", "partial")
+
+    def __init__(self, d: dict):
+        self.chats   = [_summary(c) for c in _list(d, "chats")]
+        self.partial = bool(d.get("partial", False))
+
+class ChatUpdatePacket:
+    """
+    Изменения списка чатов ("chat_update"): updated — кортежи
+    (chat_id, last_msg, last_at), added — новые чаты, removed — ID удалённых.
+    """
+
+    type = "chat_update"
+    __slots__ = ("updated", "added", "removed")
+
+    def __init__(self, d: dict):
+        self.updated = [(_int(u, "chat_id"), _str(u, "last_msg"), _int(u, "last_at"))
+                        for u in map(_dict, _list(d, "updated"))]
+        self.added   = [_summary(c) for c in _list(d, "added")]
+        self.removed = _list(d, "removed")
+        if any(type(cid) is not int for cid in self.removed):
+            raise PacketError("removed: ожидались целые числа")
+
+class AckPacket:
+    """
+    Подтверждение сообщения, отправленного повторно ("ack"):
+    client_id и время сохранённой на сервере копии (0 — сервер его не прислал).
+    """
+
+    type = "ack"
+    __slots__ = ("client_id", "ts")
+
+    def __init__(self, d: dict):
+        self.client_id = _str(d, "client_id")
+        self.ts        = _int(d, "ts")
+
+class HelloPacket:
+    """
+    Первый пакет соединения ("hello"): формат кадров, выбранный сервером.
+    """
+
+    type = "hello"
+    __slots__ = ("enc",)
+
+    def __init__(self, d: dict):
+        self.enc = _str(d, "enc") or "json"
+
+# Тип пакета → класс
+_TYPES = {
+    "msg": MsgPacket,
+    "history": ChatHistory,
+    "history_bulk": HistoryBulkPacket,
+    "chats": ChatsPacket,
+    "chat_update": ChatUpdatePacket,
+    "ack": AckPacket,
+    "hello": HelloPacket,
+}
+
+def parse(d):
+    """
+    Создаёт пакет из JSON-объекта. Для неизвестного типа возвращает None
+    (пакеты новых версий сервера пропускаются), для некорректного — PacketError.
+    """
+    cls = _TYPES.get(_str(_dict(d), "type"))
+    return cls(d) if cls is not None else None
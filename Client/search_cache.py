@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+
+from api       import ApiResult, api_client
+from constants import (
+    USER_SEARCH_URL, SEARCH_LIMIT, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+)
+
+class SearchCache:
+    """
+    LRU-кэш результатов поиска пользователей с ограниченным временем жизни.
+    Если результат для более короткого префикса полный (сервер вернул меньше
+    SEARCH_LIMIT строк), результат для более длинного запроса получается
+    локальной фильтрацией, без запроса к серверу.
+    """
+
+    def __init__(self, size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self._size = size
+        self._ttl = ttl
+        self._entries = OrderedDict()   # (токен, запрос) → (время сохранения, список пользователей)
+
+    @staticmethod
+    def _key(token: str, q: str) -> tuple:
+        """
+        Ключ кэша: поиск на сервере регистронезависимый (ILIKE)
+        и исключает текущего пользователя, поэтому учитываем токен.
+        """
+        return token, q.lower()
+
+    def get(self, token: str, q: str):
+        """
+        Возвращает свежий результат для запроса (или None).
+        """
+        key = self._key(token, q)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        saved_at, users = entry
+        if time.monotonic() - saved_at > self._ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return users
+
+    def put(self, token: str, q: str, users: list):
+        """
+        Сохраняет результат поиска, вытесняя самые давно использованные записи.
+        """
+        key = self._key(token, q)
+        self._entries[key] = (time.monotonic(), users)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def lookup(self, token: str, q: str):
+        """
+        Ищет результат для запроса в кэше:
+        - точное совпадение;
+        - иначе полный результат для самого длинного префикса,
+          отфильтрованный локально (тем же правилом, что и на сервере:
+          подстрока в username или display_name без учёта регистра).
+        Возвращает список пользователей или None.
+        """
+        users = self.get(token, q)
+        if users is not None:
+            return users
+
+        # Символы-шаблоны ILIKE сервер трактует иначе, чем простую подстроку
+        if any(ch in q for ch in "%_\\"):
+            return None
+
+        needle = q.lower()
+        for n in range(len(q) - 1, 0, -1):
+            prefix_users = self.get(token, q[:n])
+            if prefix_users is None or len(prefix_users) >= SEARCH_LIMIT:
+                # нет результата или он обрезан сервером — сузить нельзя
+                continue
+            users = [
+                u for u in prefix_users
+                if needle in (u.get('username') or '').lower()
+                or needle in (u.get('display_name') or '').lower()
+            ]
+            self.put(token, q, users)
+            return users
+        return None
+
+_cache = SearchCache()
+
+def search_users(token: str, q: str, callback, tag: str):
+    """
+    Поиск пользователей с общим для всех диалогов кэшем.
+    Результат из кэша передаётся в callback(ApiResult) сразу,
+    иначе выполняется запрос к серверу (предыдущий запрос с тем же тегом отменяется).
+    """
+    users = _cache.lookup(token, q)
+    if users is not None:
+        # Ответ уже есть — устаревший запрос к серверу больше не нужен
+        api_client().cancel(tag)
+        callback(ApiResult(200, users))
+        return
+
+    def on_done(r: ApiResult):
+        if r.ok and isinstance(r.data, list):
+            _cache.put(token, q, r.data)
+        callback(r)
+
+    api_client().get(USER_SEARCH_URL, params={'q': q}, token=token,
+                     callback=on_done, tag=tag)
@@ -0,0 +1,18 @@
+from datetime  import datetime, timezone
+from functools import lru_cache
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute: int) -> str:
+    """
+    Форматирует начало минуты (минуты Unix-времени) в локальное «HH:MM».
+    """
+    return datetime.fromtimestamp(minute * 60, timezone.utc) \
+        .astimezone().strftime("%H:%M")
+
+def format_hhmm(ts_ms: int) -> str:
+    """
+    Переводит время в миллисекундах Unix-времени в локальное «HH:MM».
+    Результат кэшируется по минутам: сообщения одной минуты
+    (и повторные отрисовки) не форматируются заново.
+    """
+    return _format_minute(ts_ms // 60000)
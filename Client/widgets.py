@@ -1,98 +1,292 @@
-from datetime import datetime
-
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore    import Qt, QSize
-from PyQt5.QtWidgets import QWidget, QLabel, QFrame, QVBoxLayout, QHBoxLayout
 
-from models import ChatListModel
+from conv_store import STATUS_PENDING, STATUS_FAILED
+from models     import ChatListModel, MessageListModel
+from timefmt    import format_hhmm
 
-class BubbleWidget(QWidget):
+class BubbleDelegate(QtWidgets.QStyledItemDelegate):
     """
-    Виджет одного сообщения в чате в виде «пузыря».
-    Показывает текст, имя отправителя (для групп), время отправки.
+    Делегат для рисования сообщений чата в виде «пузырей».
+    Заменяет отдельный виджет на каждое сообщение: пузырь рисуется
+    прямо в QListView, поэтому стоимость есть только у видимых строк.
+    Показывает имя отправителя (для групп), текст и время отправки,
+    а у своих сообщений — значок состояния доставки.
     """
 
-    def __init__(
-        self,
-        text: str,                  # Текст сообщения
-        outgoing: bool,             # True, если это исходящее сообщение
-        time_str: str,              # Время отправки (формат HH:MM)
-        display_name: str = None    # Имя отправителя (для групповых чатов)
-    ):
-        super().__init__()
+    _OUTER_H   = 4      # Отступ пузыря от левого/правого края списка
+    _OUTER_V   = 2      # Отступ пузыря сверху и снизу
+    _PAD_H     = 10     # Внутренний отступ пузыря по горизонтали
+    _PAD_V     = 6      # Внутренний отступ пузыря по вертикали
+    _SPACING   = 4      # Расстояние между именем, текстом и временем
+    _RADIUS    = 10     # Радиус скругления пузыря
+    _MAX_RATIO = 0.7    # Максимальная ширина пузыря относительно ширины списка
+    _CACHE_MAX = 10000  # Сколько рассчитанных размеров держим в кэше
 
-        # 1) Имя отправителя (только для групповых чатов)
-        if display_name:
-            lbl_name = QLabel(display_name)
-            name_font = lbl_name.font()
-            name_font.setBold(True)
-            lbl_name.setFont(name_font)
-            lbl_name.setStyleSheet("margin:0; padding:0;")
-        else:
-            # В личных чатах имя не показывается
-            lbl_name = None
+    # Значки состояния доставки своих сообщений (после времени)
+    _STATUS_MARKS = {STATUS_PENDING: " …", STATUS_FAILED: " ✗"}
+    _SENT_MARK = " ✓"
 
-        # 2) Текст сообщения
-        lbl_text = QLabel(text)
-        lbl_text.setWordWrap(True)
-        lbl_text.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
-        lbl_text.setStyleSheet("padding:0; margin:0;")
-
-        # 3) Метка с временем отправки
-        lbl_time = QLabel(time_str)
-        lbl_time.setStyleSheet("font-size:11px;")
-        lbl_time.setAlignment(Qt.AlignRight | Qt.AlignBottom)
-
-        # 4) Собираем пузырь: вертикально — имя, текст, время
-        bubble = QFrame()
-        bubble_lyt = QVBoxLayout(bubble)
-        bubble_lyt.setContentsMargins(10, 6, 10, 6)
-        bubble_lyt.setSpacing(4)
-
-        if lbl_name:
-            bubble_lyt.addWidget(lbl_name)                      # имя отправителя сверху
-        bubble_lyt.addWidget(lbl_text)                          # затем текст
-        bubble_lyt.addWidget(lbl_time, alignment=Qt.AlignRight) # время внизу
-
-        # 5) Стилизация пузыря: цвет и скругления
+    def __init__(self, view: QtWidgets.QListView):
+        """
+        Запоминает представление (нужна ширина области прокрутки)
+        и готовит цвета. Шрифты создаются при первой отрисовке,
+        когда стили окна уже применены.
+        """
+        super().__init__(view)
+        self._view = view
+        self._base_font = None  # шрифт представления, от которого посчитаны метрики
+        self._sizes = {}        # (текст, имя, время, ширина) → геометрия пузыря
+
+        # Цвета пузырей: зелёный — исходящие, белый — входящие
+        self._out_bg = QtGui.QColor("#52b788")
+        self._out_fg = QtGui.QColor("#ffffff")
+        self._in_bg  = QtGui.QColor("#ffffff")
+        self._in_fg  = QtGui.QColor("#2d6a4f")
+        # Пузырь своего сообщения, ожидающего подтверждения / не доставленного
+        self._pending_bg = QtGui.QColor("#95d5b2")
+        self._failed_bg  = QtGui.QColor("#e5989b")
+
+    def _ensure_fonts(self, font: QtGui.QFont):
+        """
+        Пересоздаёт шрифты и метрики только при смене шрифта представления.
+        """
+        if self._base_font == font:
+            return
+        self._base_font = QtGui.QFont(font)
+
+        self._text_font = QtGui.QFont(font)
+        self._name_font = QtGui.QFont(font)
+        self._name_font.setBold(True)
+        self._time_font = QtGui.QFont(font)
+        self._time_font.setPixelSize(11)
+
+        self._fm_text = QtGui.QFontMetrics(self._text_font)
+        self._fm_name = QtGui.QFontMetrics(self._name_font)
+        self._fm_time = QtGui.QFontMetrics(self._time_font)
+
+        # Метрики изменились — старые размеры больше не годятся
+        self._sizes.clear()
+
+    def _layout(self, text: str, name: str, time_str: str) -> tuple:
+        """
+        Рассчитывает геометрию пузыря для текущей ширины списка:
+        (ширина содержимого, высота содержимого, высота текста, высота имени).
+        Результат кэшируется, чтобы прокрутка не переносила текст заново.
+        """
+        width = self._view.viewport().width()
+        key = (text, name, time_str, width)
+        geo = self._sizes.get(key)
+        if geo is not None:
+            return geo
+
+        # Ширина, в которую должен уместиться текст внутри пузыря
+        max_w = max(int(width * self._MAX_RATIO) - 2 * self._PAD_H, 40)
+        text_rect = self._fm_text.boundingRect(
+            QtCore.QRect(0, 0, max_w, 1 << 20), Qt.TextWordWrap, text
+        )
+
+        name_w = self._fm_name.horizontalAdvance(name) if name else 0
+        name_h = self._fm_name.height() if name else 0
+        time_w = self._fm_time.horizontalAdvance(time_str)
+
+        inner_w = min(max(text_rect.width(), name_w, time_w), max_w)
+        inner_h = text_rect.height() + self._SPACING + self._fm_time.height()
+        if name:
+            inner_h += name_h + self._SPACING
+
+        geo = (inner_w, inner_h, text_rect.height(), name_h)
+        if len(self._sizes) >= self._CACHE_MAX:
+            self._sizes.clear()
+        self._sizes[key] = geo
+        return geo
+
+    def _time_text(self, index, outgoing: bool, status: str) -> str:
+        """
+        Время отправки; у своих сообщений — со значком состояния доставки.
+        """
+        time_str = index.data(MessageListModel.TimeRole) or ""
         if outgoing:
-            # зелёный (исходящее)
-            bubble.setStyleSheet(
-                "background:#52b788; color:white; border-radius:10px;"
-            )
-        else:
-            # белый (входящее)
-            bubble.setStyleSheet(
-                "background:#ffffff; color:#2d6a4f; border-radius:10px;"
-            )
-
-        # 6) Выравнивание всего пузыря по левому или правому краю
-        root = QHBoxLayout(self)
-        root.setContentsMargins(4, 2, 4, 2)
+            time_str += self._STATUS_MARKS.get(status, self._SENT_MARK)
+        return time_str
+
+    def paint(self, painter, option, index):
+        """
+        Отрисовывает одно сообщение:
+        - пузырь слева (входящее) или справа (исходящее);
+        - имя отправителя сверху (только в группах);
+        - текст с переносом строк и время в правом нижнем углу.
+        """
+        self._ensure_fonts(option.font)
+
+        text     = index.data(MessageListModel.TextRole) or ""
+        name     = index.data(MessageListModel.DisplayNameRole) or ""
+        outgoing = bool(index.data(MessageListModel.OutgoingRole))
+        status   = index.data(MessageListModel.StatusRole)
+        time_str = self._time_text(index, outgoing, status)
+
+        inner_w, inner_h, text_h, name_h = self._layout(text, name, time_str)
+        bubble_w = inner_w + 2 * self._PAD_H
+        bubble_h = inner_h + 2 * self._PAD_V
+
+        # Выравнивание пузыря по левому или правому краю
+        r = option.rect
         if outgoing:
-            root.addStretch()       # отступ слева
-            root.addWidget(bubble)  # пузырь справа
+            x = r.right() - self._OUTER_H - bubble_w + 1
+        else:
+            x = r.left() + self._OUTER_H
+        bubble = QtCore.QRect(x, r.top() + self._OUTER_V, bubble_w, bubble_h)
+
+        painter.save()
+
+        # Фон пузыря
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        painter.setPen(Qt.NoPen)
+        if not outgoing:
+            painter.setBrush(self._in_bg)
+        elif status == STATUS_PENDING:
+            painter.setBrush(self._pending_bg)
+        elif status == STATUS_FAILED:
+            painter.setBrush(self._failed_bg)
         else:
-            root.addWidget(bubble)  # пузырь слева
-            root.addStretch()       # отступ справа
+            painter.setBrush(self._out_bg)
+        painter.drawRoundedRect(bubble, self._RADIUS, self._RADIUS)
+
+        painter.setPen(self._out_fg if outgoing else self._in_fg)
+        inner = bubble.adjusted(self._PAD_H, self._PAD_V, -self._PAD_H, -self._PAD_V)
+        y = inner.top()
+
+        # 1) Имя отправителя (только для групповых чатов)
+        if name:
+            painter.setFont(self._name_font)
+            painter.drawText(inner.left(), y, inner.width(), name_h,
+                             Qt.AlignLeft | Qt.AlignVCenter,
+                             self._fm_name.elidedText(name, Qt.ElideRight, inner.width()))
+            y += name_h + self._SPACING
+
+        # 2) Текст сообщения
+        painter.setFont(self._text_font)
+        painter.drawText(inner.left(), y, inner.width(), text_h,
+                         Qt.AlignLeft | Qt.TextWordWrap, text)
+        y += text_h + self._SPACING
+
+        # 3) Время отправки (справа снизу)
+        painter.setFont(self._time_font)
+        painter.drawText(inner.left(), y, inner.width(), self._fm_time.height(),
+                         Qt.AlignRight | Qt.AlignBottom, time_str)
+
+        painter.restore()
 
-    def sizeHint(self):
+    def sizeHint(self, option, index):
         """
-        Возвращает рекомендуемый размер пузыря для правильной отрисовки в списке сообщений.
-        Учитывает размер внутреннего содержимого + небольшой вертикальный отступ.
+        Возвращает размер строки с пузырём.
+        Ширина — вся ширина списка, высота зависит от переноса текста.
         """
-        return self.layout().sizeHint() + QSize(0, 20)
+        self._ensure_fonts(option.font)
+        text     = index.data(MessageListModel.TextRole) or ""
+        name     = index.data(MessageListModel.DisplayNameRole) or ""
+        time_str = self._time_text(index, bool(index.data(MessageListModel.OutgoingRole)),
+                                   index.data(MessageListModel.StatusRole))
+
+        _, inner_h, _, _ = self._layout(text, name, time_str)
+        height = inner_h + 2 * self._PAD_V + 2 * self._OUTER_V
+        return QSize(self._view.viewport().width(), height)
 
 class ChatItemDelegate(QtWidgets.QStyledItemDelegate):
     """
     Кастомный делегат для рисования элементов списка чатов.
     Используется в QListView, чтобы каждый элемент выглядел как «карточка» чата.
+
+    Всё, что не зависит от строки (шрифты, метрики, цвета), готовится один раз,
+    а производные данные строки (время, обрезанный текст) кэшируются по chat_id
+    и сбрасываются только по dataChanged модели или при смене ширины.
+    По желанию готовые карточки целиком кэшируются в QPixmapCache.
     """
 
     _MARGIN = 6   # Отступ от краёв карточки
     _RADIUS = 6   # Радиус скругления углов
     _HEIGHT = 64  # Рекомендуемая высота элемента
 
+    def __init__(self, view: QtWidgets.QListView, pixmap_cache: bool = False):
+        """
+        Готовит цвета и подписывается на изменения модели представления.
+        pixmap_cache — кэшировать ли отрисованные карточки целиком (QPixmapCache).
+        """
+        super().__init__(view)
+        self._pixmap_cache = pixmap_cache
+        self._base_font = None  # шрифт, от которого посчитаны шрифты и метрики
+
+        # Цвета фона: выделение, наведение, обычное состояние
+        self._bg_selected = QtGui.QColor("#d0e8ff")
+        self._bg_hover    = QtGui.QColor("#eef5ff")
+        self._bg_normal   = QtGui.QColor("#f7f7f7")
+        # Цвета текста: имя, время, последнее сообщение
+        self._pen_name = QtGui.QColor("#000000")
+        self._pen_time = QtGui.QColor("#888888")
+        self._pen_msg  = QtGui.QColor("#444444")
+
+        # Кэши по chat_id
+        self._elided = {}       # chat_id → (текст, ширина, обрезанный текст)
+        self._pix_keys = {}     # chat_id → ключи карточки в QPixmapCache
+
+        model = view.model()
+        if model is not None:
+            model.dataChanged.connect(self._on_data_changed)
+            model.modelReset.connect(self.clear_caches)
+            model.rowsRemoved.connect(self.clear_caches)
+
+    def clear_caches(self, *_):
+        """
+        Сбрасывает все кэши строк.
+        """
+        self._elided.clear()
+        for keys in self._pix_keys.values():
+            for key in keys:
+                QtGui.QPixmapCache.remove(key)
+        self._pix_keys.clear()
+
+    def _on_data_changed(self, top_left, bottom_right, _roles=None):
+        """
+        Данные строк изменились — забываем кэш только для них.
+        """
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            chat_id = top_left.sibling(row, 0).data(ChatListModel.ChatIDRole)
+            self._elided.pop(chat_id, None)
+            for key in self._pix_keys.pop(chat_id, ()):
+                QtGui.QPixmapCache.remove(key)
+
+    def _ensure_fonts(self, font: QtGui.QFont):
+        """
+        Пересоздаёт шрифты и метрики только при смене шрифта представления.
+        """
+        if self._base_font == font:
+            return
+        self._base_font = QtGui.QFont(font)
+
+        self._font_name = QtGui.QFont(font)
+        self._font_name.setPointSize(11)
+        self._font_name.setBold(True)
+        self._font_small = QtGui.QFont(font)
+        self._font_small.setPointSize(10)
+        self._font_small.setBold(False)
+
+        self._fm_name = QtGui.QFontMetrics(self._font_name)
+        self._fm_msg  = QtGui.QFontMetrics(self._font_small)
+
+        # Метрики изменились — обрезанные тексты и карточки больше не годятся
+        self.clear_caches()
+
+    def _elide(self, chat_id: int, text: str, width: int) -> str:
+        """
+        Возвращает последнее сообщение, обрезанное по ширине (с кэшем по chat_id).
+        """
+        cached = self._elided.get(chat_id)
+        if cached is not None and cached[0] == text and cached[1] == width:
+            return cached[2]
+        elided = self._fm_msg.elidedText(text, QtCore.Qt.ElideRight, width)
+        self._elided[chat_id] = (text, width, elided)
+        return elided
+
     def paint(self, painter, option, index):
         """
         Отрисовывает один элемент списка:
@@ -100,22 +294,52 @@ class ChatItemDelegate(QtWidgets.QStyledItemDelegate):
         - имя собеседника/группы слева, время справа;
         - последнее сообщение снизу.
         """
-        painter.save()  # сохраняем текущее состояние кисти
-
-        # Фон карточки
-        r = option.rect.adjusted(self._MARGIN, self._MARGIN,
-                                 -self._MARGIN, -self._MARGIN)
+        self._ensure_fonts(option.font)
 
         # Выбор цвета фона в зависимости от состояния
         if option.state & QtWidgets.QStyle.State_Selected:
-            # голубой при выделении
-            bg = QtGui.QColor("#d0e8ff")
+            state, bg = 2, self._bg_selected     # голубой при выделении
         elif option.state & QtWidgets.QStyle.State_MouseOver:
-            # светло-голубой при наведении
-            bg = QtGui.QColor("#eef5ff")
+            state, bg = 1, self._bg_hover        # светло-голубой при наведении
         else:
-            # серо-белый фон по умолчанию
-            bg = QtGui.QColor("#f7f7f7")
+            state, bg = 0, self._bg_normal       # серо-белый фон по умолчанию
+
+        # Извлекаем данные из модели
+        chat_id = index.data(ChatListModel.ChatIDRole)
+        display = index.data(ChatListModel.DisplayRole) or ""         # имя или название группы
+        lastmsg = index.data(ChatListModel.LastMsgRole) or ""   # последнее сообщение
+        last_at = index.data(ChatListModel.LastAtRole) or 0     # время в миллисекундах
+
+        if not self._pixmap_cache:
+            self._paint_card(painter, option.rect, bg, chat_id, display, lastmsg, last_at)
+            return
+
+        # Готовая карточка из QPixmapCache (ключ учитывает состояние, размер и данные)
+        rect = option.rect
+        key = f"chat:{chat_id}:{state}:{rect.width()}x{rect.height()}:{last_at}:{hash(display)}:{hash(lastmsg)}"
+        pixmap = QtGui.QPixmapCache.find(key)
+        if pixmap is None:
+            dpr = painter.device().devicePixelRatioF()
+            pixmap = QtGui.QPixmap(rect.size() * dpr)
+            pixmap.setDevicePixelRatio(dpr)
+            pixmap.fill(QtCore.Qt.transparent)
+            card = QtGui.QPainter(pixmap)
+            self._paint_card(card, QtCore.QRect(QtCore.QPoint(0, 0), rect.size()),
+                             bg, chat_id, display, lastmsg, last_at)
+            card.end()
+            QtGui.QPixmapCache.insert(key, pixmap)
+            self._pix_keys.setdefault(chat_id, set()).add(key)
+        painter.drawPixmap(rect.topLeft(), pixmap)
+
+    def _paint_card(self, painter, rect, bg, chat_id, display, lastmsg, last_at):
+        """
+        Рисует карточку чата в прямоугольнике rect.
+        """
+        painter.save()  # сохраняем текущее состояние кисти
+
+        # Фон карточки
+        r = rect.adjusted(self._MARGIN, self._MARGIN,
+                          -self._MARGIN, -self._MARGIN)
 
         # Рисуем скруглённый прямоугольник
         painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
@@ -123,24 +347,14 @@ class ChatItemDelegate(QtWidgets.QStyledItemDelegate):
         painter.setBrush(bg)
         painter.drawRoundedRect(r, self._RADIUS, self._RADIUS)
 
-        # Извлекаем данные из модели
-        display = index.data(ChatListModel.DisplayRole)         # имя или название группы
-        lastmsg = index.data(ChatListModel.LastMsgRole) or ""   # последнее сообщение
-        last_at = index.data(ChatListModel.LastAtRole) or 0     # время в миллисекундах
-
         # Область для текста внутри карточки
         inner = r.adjusted(10, 8, -10, -8)
 
         # Строка 1: Имя и время
         # Имя собеседника (слева)
-        font = painter.font()
-        font.setPointSize(11)
-        font.setBold(True)
-        painter.setFont(font)
-        painter.setPen(QtGui.QColor("#000000"))
-
-        fm_name = QtGui.QFontMetrics(font)
-        name_h = fm_name.height()
+        painter.setFont(self._font_name)
+        painter.setPen(self._pen_name)
+        name_h = self._fm_name.height()
 
         painter.drawText(inner.x(), inner.y(),
                          inner.width(), name_h,
@@ -149,30 +363,24 @@ class ChatItemDelegate(QtWidgets.QStyledItemDelegate):
 
         # Время (справа)
         if last_at > 0:
-            ts = datetime.fromtimestamp(last_at/1000)
-            timestr = ts.strftime("%H:%M")
-            font.setPointSize(10)
-            font.setBold(False)
-            painter.setFont(font)
-            painter.setPen(QtGui.QColor("#888888"))
+            painter.setFont(self._font_small)
+            painter.setPen(self._pen_time)
             painter.drawText(inner.x(), inner.y(),
                              inner.width(), name_h,
                              QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter,
-                             timestr)
+                             format_hhmm(last_at))
 
         # Строка 2: Последнее сообщение
-        font.setPointSize(10)
-        painter.setFont(font)
-        painter.setPen(QtGui.QColor("#444444"))
+        painter.setFont(self._font_small)
+        painter.setPen(self._pen_msg)
 
-        fm_msg = QtGui.QFontMetrics(font)
-        # обрезаем, если не влезает
-        msg = fm_msg.elidedText(lastmsg, QtCore.Qt.ElideRight, inner.width())
+        # обрезаем, если не влезает (результат кэшируется по chat_id и ширине)
+        msg = self._elide(chat_id, lastmsg, inner.width())
 
         painter.drawText(inner.x(),
                          inner.y() + name_h + 4,
                          inner.width(),
-                         fm_msg.height(),
+                         self._fm_msg.height(),
                          QtCore.Qt.AlignLeft|QtCore.Qt.AlignVCenter,
                          msg)
 
@@ -184,4 +392,115 @@ class ChatItemDelegate(QtWidgets.QStyledItemDelegate):
         Высота фиксированная (_HEIGHT), ширина зависит от размера виджета.
         Добавляется небольшой вертикальный отступ (5 пикселей).
         """
-        return QtCore.QSize(option.rect.width(), self._HEIGHT) + QSize(0, 5)
\ No newline at end of file
+        return QtCore.QSize(option.rect.width(), self._HEIGHT) + QSize(0, 5)
+
+class MetricsOverlay(QtWidgets.QLabel):
+    """
+    Скрытое окно метрик поверх главного окна (для отладки).
+    Пока видно, раз в секунду обновляет текст из provider() — функции,
+    возвращающей словарь с метриками.
+    """
+
+    def __init__(self, parent: QtWidgets.QWidget, provider):
+        super().__init__(parent)
+        self._provider = provider
+        self.setObjectName("metricsOverlay")
+        self.setStyleSheet(
+            "QLabel#metricsOverlay{background:rgba(0,0,0,190);color:#d8f3dc;"
+            "font-family:monospace;font-size:11px;padding:8px;border-radius:6px;}"
+        )
+        self.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self.hide()
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(1000)
+        self._timer.timeout.connect(self.refresh)
+
+    def toggle(self):
+        """
+        Показывает или прячет окно метрик.
+        """
+        if self.isVisible():
+            self._timer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self._timer.start()
+
+    def refresh(self):
+        """
+        Перестраивает текст: счётчики и сводки гистограмм построчно.
+        """
+        data = self._provider()
+        lines = []
+        for section, values in data.items():
+            if not isinstance(values, dict):
+                lines.append(f"{section}: {values}")
+                continue
+            lines.append(f"[{section}]")
+            for key, value in values.items():
+                if isinstance(value, dict):
+                    value = " ".join(f"{k}={v}" for k, v in value.items())
+                lines.append(f"  {key}: {value}")
+        self.setText("\n".join(lines))
+
+        # Занимаем правую часть окна, не выходя за его границы
+        parent = self.parentWidget()
+        width = min(520, parent.width() - 20)
+        self.setFixedWidth(width)
+        self.adjustSize()
+        self.setFixedHeight(min(self.sizeHint().height(), parent.height() - 20))
+        self.move(parent.width() - width - 10, 10)
+
+class ChatListView(QtWidgets.QListView):
+    """
+    Список чатов, который до прихода данных рисует «скелет» —
+    серые заглушки карточек. Так окно выглядит готовым сразу после входа,
+    ещё до ответа сервера.
+    """
+
+    _CARDS = 8          # Сколько заглушек рисовать
+    _HEIGHT = ChatItemDelegate._HEIGHT + 5
+    _MARGIN = ChatItemDelegate._MARGIN
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._loading = False
+        self._card_bg = QtGui.QColor("#f0f0f0")
+        self._bar_bg  = QtGui.QColor("#e0e0e0")
+
+    def set_loading(self, loading: bool):
+        """
+        Включает или выключает показ заглушек (пока модель пуста).
+        """
+        if self._loading != loading:
+            self._loading = loading
+            self.viewport().update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        model = self.model()
+        if not self._loading or (model is not None and model.rowCount() > 0):
+            return
+
+        painter = QtGui.QPainter(self.viewport())
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        painter.setPen(Qt.NoPen)
+        width = self.viewport().width()
+        for i in range(self._CARDS):
+            card = QtCore.QRect(0, i * self._HEIGHT, width, self._HEIGHT).adjusted(
+                self._MARGIN, self._MARGIN, -self._MARGIN, -self._MARGIN)
+            painter.setBrush(self._card_bg)
+            painter.drawRoundedRect(card, 6, 6)
+
+            # Полоски вместо имени и последнего сообщения
+            inner = card.adjusted(10, 10, -10, -10)
+            painter.setBrush(self._bar_bg)
+            painter.drawRoundedRect(QtCore.QRect(inner.left(), inner.top(),
+                                                 inner.width() // 2, 10), 4, 4)
+            painter.drawRoundedRect(QtCore.QRect(inner.left(), inner.top() + 20,
+                                                 inner.width() * 4 // 5, 8), 4, 4)
+        painter.end()
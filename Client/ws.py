@@ -1,41 +1,289 @@
 import json
-from PyQt5.QtCore import QObject, pyqtSignal, QUrl
+import random
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from PyQt5.QtCore import (
+    QObject, QThread, QTimer, QMetaObject, QCoreApplication, Qt,
+    pyqtSignal, pyqtSlot, QUrl, QByteArray
+)
 from PyQt5.QtNetwork import QAbstractSocket
 from PyQt5.QtWebSockets import QWebSocket
-from constants import SERVER_URL
+from constants import (SERVER_URL, CHATS_APPLY_INTERVAL_MS,
+                       RECONNECT_BASE_MS, RECONNECT_MAX_MS,
+                       SEND_ACK_TIMEOUT_MS, SEND_MAX_ATTEMPTS, WIRE_ENCODING)
+from metrics   import metrics
+import packets
+from timefmt   import format_hhmm
+
+class PacketDecoder(QObject):
+    """
+    Разбор входящих кадров в отдельном потоке:
+    - распаковывает бинарные кадры (enc=deflate: один поток deflate на соединение);
+    - преобразует JSON в типизированные пакеты (packets.parse) — некорректные
+      кадры отбрасываются здесь, а не в интерфейсе;
+    - заранее форматирует время сообщений (наполняет общий кэш format_hhmm),
+      чтобы при отрисовке GUI-поток брал готовые строки;
+    - копит разобранные пакеты и отдаёт их пачкой раз за итерацию цикла событий.
+    """
+
+    decoded = pyqtSignal(list)  # Пачка разобранных пакетов
+    stream_broken = pyqtSignal()  # Сжатый поток не распаковывается — нужно переподключиться
+
+    def __init__(self):
+        super().__init__()
+        self._batch = []            # разобранные, но ещё не отданные пакеты
+        self._scheduled = False     # отправка пачки уже запланирована
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    @pyqtSlot()
+    def reset(self):
+        """
+        Начинает новый поток распаковки (вызывается перед каждым подключением).
+        """
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    @pyqtSlot(str)
+    def decode(self, raw: str):
+        """
+        Разбирает один текстовый кадр и добавляет пакет в текущую пачку.
+        Некорректные кадры пропускаются.
+        """
+        started = time.perf_counter() if metrics.enabled else 0
+        self._decode(raw, started, len(raw.encode("utf-8")) if started else 0)
+
+    @pyqtSlot(QByteArray)
+    def decode_binary(self, data: QByteArray):
+        """
+        Распаковывает бинарный кадр (JSON, сжатый потоком deflate) и разбирает его.
+        Если распаковать не удалось, дальнейшие кадры тоже не распакуются —
+        сообщаем об этом (stream_broken), чтобы соединение переоткрылось.
+        """
+        started = time.perf_counter() if metrics.enabled else 0
+        payload = bytes(data)
+        try:
+            raw = self._inflate.decompress(payload).decode("utf-8")
+        except (zlib.error, UnicodeDecodeError):
+            metrics.inc("ws.bad_frames")
+            self.stream_broken.emit()
+            return
+        self._decode(raw, started, len(payload))
+
+    def _decode(self, raw: str, started: float, wire_bytes: int):
+        """
+        Разбирает JSON одного кадра; wire_bytes — размер кадра на линии (для метрик).
+        """
+        try:
+            pkt = packets.parse(json.loads(raw))
+        except ValueError:          # некорректный JSON или packets.PacketError
+            metrics.inc("ws.bad_frames")
+            return
+        if pkt is None:
+            metrics.inc("ws.unknown_packets")
+            return
+
+        self._prepare(pkt)
+        self._batch.append(pkt)
+
+        if started:
+            ptype = pkt.type
+            metrics.inc(f"ws.packets_in.{ptype}")
+            metrics.inc(f"ws.bytes_in.{ptype}", wire_bytes)
+            metrics.observe("ws.decode_ms", (time.perf_counter() - started) * 1000)
+
+        if not self._scheduled:
+            # Отдадим пачку после того, как обработаются уже пришедшие кадры
+            self._scheduled = True
+            QMetaObject.invokeMethod(self, "_flush", Qt.QueuedConnection)
+
+    @staticmethod
+    def _prepare(pkt):
+        """
+        Выполняет подготовку, которую иначе пришлось бы делать в GUI-потоке:
+        форматирует время каждого сообщения в «HH:MM» (результат остаётся
+        в кэше format_hhmm и понадобится делегату при отрисовке).
+        """
+        ptype = pkt.type
+        if ptype == "msg":
+            format_hhmm(pkt.message.ts)
+        elif ptype == "history":
+            for msg in pkt.messages:
+                format_hhmm(msg.ts)
+        elif ptype == "history_bulk":
+            for entry in pkt.chats:
+                for msg in entry.messages:
+                    format_hhmm(msg.ts)
+
+    @pyqtSlot()
+    def _flush(self):
+        """
+        Отдаёт накопленную пачку пакетов в GUI-поток.
+        """
+        batch, self._batch = self._batch, []
+        self._scheduled = False
+        if batch:
+            self.decoded.emit(batch)
 
 class WSBridge(QObject):
     """
     Класс-мост между WebSocket-соединением и интерфейсом Qt.
     Преобразует события WebSocket в сигналы Qt, которые можно обрабатывать в UI.
+
+    При разрыве соединения автоматически переподключается с экспоненциальной
+    задержкой и случайным разбросом (чтобы после перезапуска сервера клиенты
+    не подключались все одновременно). Повторное подключение идёт с resume=1:
+    сервер не присылает полный список чатов, а клиент в "history_since"
+    сообщает, что у него уже есть.
+
+    Исходящие сообщения идут через очередь (send_message): каждому присваивается
+    client_id, и оно хранится до подтверждения сервером (эхо "msg" с тем же
+    client_id или пакет "ack"). Пока соединения нет, очередь копится и после
+    подключения отправляется заново; без подтверждения сообщение повторяется
+    (сервер отбрасывает повторы по client_id).
     """
 
     # Сигналы, которые будут ловить виджеты Qt
-    got_packet = pyqtSignal(dict)   # Сигнал, испускается при получении пакета от сервера (dict)
+    got_packets = pyqtSignal(list)  # Сигнал с пачкой пакетов от сервера (не чаще раза за итерацию цикла событий)
     connected = pyqtSignal()        # Сигнал, испускается при успешном подключении к серверу
     disconnected = pyqtSignal()     # Сигнал, испускается при отключении от сервера
+    acked = pyqtSignal(str, object) # Сервер подтвердил повтор сообщения: client_id, время сервера (мс)
+    send_failed = pyqtSignal(str)   # Сообщение с этим client_id так и не подтверждено
+    _reset_decoder = pyqtSignal()   # Новое соединение — потоку разбора начать распаковку заново
 
-    def __init__(self, username: str, token: str):
+    def __init__(self, username: str, token: str, chats_interval_ms: int = CHATS_APPLY_INTERVAL_MS):
         """
         Создаёт и настраивает WebSocket-клиент:
         - подключается к серверу с токеном;
-        - обрабатывает полученные сообщения и состояния соединения.
+        - передаёт входящие кадры на разбор в отдельный поток;
+        - собирает разобранные пакеты в пачки для GUI-потока;
+        - из нескольких снимков "chats" применяет только последний
+          (раз за итерацию цикла событий или раз в chats_interval_ms).
         """
         super().__init__()
 
+        self._token = token
+        self._closing = False       # соединение закрыто намеренно — не переподключаемся
+        self._had_session = False   # соединение уже хотя бы раз устанавливалось
+        self._resume = False        # текущее подключение — возобновление сессии
+        self._attempt = 0           # номер попытки переподключения подряд
+
+        # Очередь исходящих сообщений: client_id → [пакет, попыток, время последней отправки]
+        self._outbox = OrderedDict()
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setInterval(SEND_ACK_TIMEOUT_MS // 2)
+        self._retry_timer.timeout.connect(self._retry_unacked)
+
+        # Таймер отложенного переподключения
+        self._reconnect_timer = QTimer(self)
+        self._reconnect_timer.setSingleShot(True)
+        self._reconnect_timer.timeout.connect(self._open)
+
+        self._inbox = []            # пакеты, ожидающие передачи в интерфейс
+        self._deliver_scheduled = False
+
+        # Последний ещё не применённый снимок "chats": более новый заменяет старый
+        self._pending_chats = None
+        self._chats_timer = QTimer(self)
+        self._chats_timer.setSingleShot(True)
+        self._chats_timer.timeout.connect(self._deliver_chats)
+        self._chats_interval_ms = chats_interval_ms
+
+        # Счётчики очереди входящих пакетов (см. stats())
+        self._counters = {
+            "packets": 0,           # всего пакетов передано в интерфейс
+            "batches": 0,           # сколько пачек передано
+            "chats_received": 0,    # снимков "chats" получено
+            "chats_applied": 0,     # снимков "chats" передано в интерфейс
+            "chats_dropped": 0,     # снимков "chats", вытесненных более новыми
+            "max_queue_depth": 0,   # наибольшая длина очереди перед передачей
+            "reconnects": 0,        # сколько раз соединение восстанавливалось
+            "sent": 0,              # исходящих сообщений отправлено (включая повторы)
+            "retransmits": 0,       # из них повторных отправок
+            "acked": 0,             # исходящих сообщений подтверждено
+            "send_failed": 0,       # исходящих сообщений не подтверждено за SEND_MAX_ATTEMPTS
+            "max_outbox_depth": 0,  # наибольшая длина очереди исходящих
+        }
+
+        # Поток разбора входящих кадров
+        self._thread = QThread(self)
+        self._decoder = PacketDecoder()
+        self._decoder.moveToThread(self._thread)
+        self._decoder.decoded.connect(self._on_decoded)
+        self._decoder.stream_broken.connect(self._on_stream_broken)
+        self._reset_decoder.connect(self._decoder.reset)
+        self._thread.start()
+
+        # Формат кадров текущего соединения (сообщает сервер пакетом "hello")
+        self._wire = "json"
+
+        # Останавливаем поток разбора при выходе из приложения
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
         # Создаём объект WebSocket-клиента
         self.ws = QWebSocket()
 
-        # При получении текстового сообщения — преобразуем из JSON и отправляем как сигнал
-        self.ws.textMessageReceived.connect(
-            lambda raw: self.got_packet.emit(json.loads(raw))
-        )
+        # Кадры сразу уходят в поток разбора (соединение между потоками — очередь)
+        self.ws.textMessageReceived.connect(self._decoder.decode)
+        self.ws.binaryMessageReceived.connect(self._decoder.decode_binary)
 
         # Подключаем обработку смены состояния (подключено / отключено и т.п.)
         self.ws.stateChanged.connect(self._state_changed)
 
-        # Открываем соединение с сервером по URL + передаём токен авторизации
-        self.ws.open(QUrl(f"{SERVER_URL}?token={token}"))
+        self._open()
+
+    def _open(self):
+        """
+        Открывает соединение с сервером по URL + передаёт токен авторизации.
+        sync=1 — историю клиент запросит сам ("history_since"), с учётом локального кэша;
+        resume=1 — сессия возобновляется после разрыва, полный список чатов не нужен;
+        enc=deflate — сервер может сжимать кадры (см. WIRE_ENCODING).
+        """
+        if self._closing:
+            return
+        self._resume = self._had_session
+        url = f"{SERVER_URL}?token={self._token}&sync=1"
+        if self._resume:
+            url += "&resume=1"
+        if WIRE_ENCODING != "json":
+            url += f"&enc={WIRE_ENCODING}"
+        # Сброс встаёт в очередь потока разбора раньше любых кадров нового соединения
+        self._wire = "json"
+        self._reset_decoder.emit()
+        self.ws.open(QUrl(url))
+
+    def wire_encoding(self) -> str:
+        """
+        Возвращает формат кадров текущего соединения: "deflate" или "json".
+        """
+        return self._wire
+
+    def _on_stream_broken(self):
+        """
+        Сжатый поток повреждён — обрываем соединение, дальше сработает переподключение.
+        """
+        if self.is_connected():
+            self.ws.abort()
+
+    def _schedule_reconnect(self):
+        """
+        Планирует переподключение: задержка растёт вдвое с каждой неудачной
+        попыткой (до RECONNECT_MAX_MS), из неё случайна вторая половина.
+        """
+        if self._closing or self._reconnect_timer.isActive():
+            return
+        delay = min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * (2 ** min(self._attempt, 16)))
+        self._attempt += 1
+        self._reconnect_timer.start(int(delay / 2 + random.uniform(0, delay / 2)))
+
+    def resumed(self) -> bool:
+        """
+        Возвращает True, если текущее подключение — возобновление сессии после разрыва.
+        """
+        return self._resume
 
     def send(self, data: dict) -> bool:
         """
@@ -48,9 +296,104 @@ class WSBridge(QObject):
             return False
 
         # Преобразуем словарь в JSON-строку и отправляем
-        self.ws.sendTextMessage(json.dumps(data))
+        self._send_text(data)
         return True
 
+    def send_message(self, payload: dict) -> str:
+        """
+        Ставит сообщение в очередь исходящих и, если есть соединение, сразу отправляет
+        (не дожидаясь подтверждения предыдущих). Возвращает присвоенный client_id.
+        """
+        client_id = uuid.uuid4().hex
+        payload = dict(payload, client_id=client_id)
+        entry = [payload, 0, 0.0]
+        self._outbox[client_id] = entry
+
+        depth = len(self._outbox)
+        if depth > self._counters["max_outbox_depth"]:
+            self._counters["max_outbox_depth"] = depth
+
+        if self.is_connected():
+            self._transmit(entry)
+        if not self._retry_timer.isActive():
+            self._retry_timer.start()
+        return client_id
+
+    def outbox_depth(self) -> int:
+        """
+        Возвращает число исходящих сообщений, ещё не подтверждённых сервером.
+        """
+        return len(self._outbox)
+
+    def _transmit(self, entry: list):
+        """
+        Отправляет сообщение из очереди и отмечает попытку.
+        """
+        if entry[1] > 0:
+            self._counters["retransmits"] += 1
+        entry[1] += 1
+        entry[2] = time.monotonic()
+        self._counters["sent"] += 1
+        self._send_text(entry[0])
+
+    def _send_text(self, data: dict):
+        """
+        Отправляет пакет текстовым кадром (и учитывает его в метриках).
+        """
+        raw = json.dumps(data)
+        self.ws.sendTextMessage(raw)
+        if metrics.enabled:
+            ptype = data.get("type", "?")
+            metrics.inc(f"ws.packets_out.{ptype}")
+            metrics.inc(f"ws.bytes_out.{ptype}", len(raw.encode("utf-8")))
+
+    def _resend_outbox(self):
+        """
+        После подключения отправляет заново все неподтверждённые сообщения (по порядку).
+        """
+        for entry in self._outbox.values():
+            self._transmit(entry)
+
+    def _retry_unacked(self):
+        """
+        Повторяет сообщения, которые не подтверждены за SEND_ACK_TIMEOUT_MS.
+        После SEND_MAX_ATTEMPTS попыток сообщение убирается из очереди (send_failed).
+        Пока соединения нет, попытки не расходуются.
+        """
+        if not self._outbox:
+            self._retry_timer.stop()
+            return
+        if not self.is_connected():
+            return
+
+        deadline = time.monotonic() - SEND_ACK_TIMEOUT_MS / 1000
+        for client_id, entry in list(self._outbox.items()):
+            if entry[2] > deadline:
+                continue
+            if entry[1] >= SEND_MAX_ATTEMPTS:
+                del self._outbox[client_id]
+                self._counters["send_failed"] += 1
+                self.send_failed.emit(client_id)
+            else:
+                self._transmit(entry)
+
+    def _ack(self, client_id: str) -> bool:
+        """
+        Убирает подтверждённое сервером сообщение из очереди.
+        Возвращает True, если оно там было.
+        """
+        if self._outbox.pop(client_id, None) is None:
+            return False
+        self._counters["acked"] += 1
+        return True
+
+    def confirm(self, client_id: str):
+        """
+        Сообщение нашлось в истории с сервера (эхо потерялось вместе с соединением):
+        убирает его из очереди, повторять больше не нужно.
+        """
+        self._ack(client_id)
+
     def is_connected(self) -> bool:
         """
         Возвращает True, если WebSocket-соединение установлено,
@@ -58,17 +401,143 @@ class WSBridge(QObject):
         """
         return self.ws.state() == QAbstractSocket.ConnectedState
 
+    def shutdown(self):
+        """
+        Закрывает соединение и останавливает поток разбора пакетов.
+        """
+        self._closing = True
+        self._reconnect_timer.stop()
+        self.ws.close()
+        if self._thread.isRunning():
+            self._thread.quit()
+            self._thread.wait()
+
+    def queue_depth(self) -> int:
+        """
+        Возвращает число пакетов, ожидающих передачи в интерфейс
+        (включая отложенный снимок "chats").
+        """
+        return len(self._inbox) + (self._pending_chats is not None)
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики очереди входящих пакетов: сколько пакетов и пачек
+        передано, сколько снимков "chats" получено, применено и отброшено,
+        текущую и наибольшую глубину очереди; то же для очереди исходящих сообщений;
+        формат кадров соединения (wire).
+        """
+        return dict(self._counters, queue_depth=self.queue_depth(),
+                    outbox_depth=self.outbox_depth(), wire=self._wire)
+
+    def _on_decoded(self, batch: list):
+        """
+        Принимает пачку из потока разбора и планирует передачу в интерфейс.
+        Несколько пачек за одну итерацию цикла событий объединяются в одну.
+        Снимок "chats" не ставится в очередь, а заменяет предыдущий необработанный.
+        """
+        for pkt in batch:
+            ptype = pkt.type
+
+            # Формат кадров, выбранный сервером, — служебный пакет
+            if ptype == "hello":
+                self._wire = pkt.enc
+                metrics.inc(f"ws.wire.{self._wire}")
+                continue
+
+            # Подтверждения исходящих: "ack" — служебный пакет, эхо "msg" идёт дальше в интерфейс
+            if ptype == "ack":
+                if self._ack(pkt.client_id):
+                    # эха не будет — сообщаем интерфейсу отдельно
+                    self.acked.emit(pkt.client_id, pkt.ts)
+                continue
+            if ptype == "msg" and pkt.client_id in self._outbox:
+                self._ack(pkt.client_id)
+
+            # Изменение списка чатов применяется после уже полученного снимка
+            if ptype == "chat_update" and self._pending_chats is not None:
+                self._inbox.append(self._pending_chats)
+                self._pending_chats = None
+                self._counters["chats_applied"] += 1
+
+            # Частичный снимок (после переподключения) не заменяет полный — идёт в очередь
+            if ptype == "chats" and not pkt.partial:
+                self._counters["chats_received"] += 1
+                if self._pending_chats is not None:
+                    self._counters["chats_dropped"] += 1
+                self._pending_chats = pkt
+            else:
+                self._inbox.append(pkt)
+
+        depth = self.queue_depth()
+        if depth > self._counters["max_queue_depth"]:
+            self._counters["max_queue_depth"] = depth
+
+        # Снимок списка чатов с заданным интервалом применяем по своему таймеру
+        if self._pending_chats is not None and self._chats_interval_ms > 0:
+            if not self._chats_timer.isActive():
+                self._chats_timer.start(self._chats_interval_ms)
+
+        chats_now = self._pending_chats is not None and self._chats_interval_ms <= 0
+        if not self._deliver_scheduled and (self._inbox or chats_now):
+            self._deliver_scheduled = True
+            QTimer.singleShot(0, self._deliver)
+
+    def _deliver(self):
+        """
+        Передаёт накопленные пакеты интерфейсу одним сигналом.
+        Если интервал для "chats" не задан, последний снимок идёт в конце той же пачки.
+        """
+        packets, self._inbox = self._inbox, []
+        self._deliver_scheduled = False
+
+        if self._pending_chats is not None and self._chats_interval_ms <= 0:
+            packets.append(self._pending_chats)
+            self._pending_chats = None
+            self._counters["chats_applied"] += 1
+
+        self._emit(packets)
+
+    def _deliver_chats(self):
+        """
+        Передаёт интерфейсу последний снимок "chats" (режим с интервалом).
+        """
+        if self._pending_chats is None:
+            return
+        pkt, self._pending_chats = self._pending_chats, None
+        self._counters["chats_applied"] += 1
+        self._emit([pkt])
+
+    def _emit(self, packets: list):
+        """
+        Испускает сигнал got_packets и обновляет счётчики.
+        """
+        if not packets:
+            return
+        self._counters["packets"] += len(packets)
+        self._counters["batches"] += 1
+        self.got_packets.emit(packets)
+
     def _state_changed(self, state):
         """
         Внутренний обработчик изменения состояния WebSocket-соединения.
         Излучает соответствующие сигналы Qt:
         - connected → при успешном подключении;
-        - disconnected → при разрыве соединения.
+        - disconnected → при разрыве соединения (после чего планируется переподключение).
         """
         if state == QAbstractSocket.ConnectedState:
             # Соединение успешно установлено
+            self._attempt = 0
+            if self._resume:
+                self._counters["reconnects"] += 1
+                metrics.inc("ws.reconnects")
+            self._had_session = True
+            # Сначала неподтверждённые сообщения, потом запросы интерфейса ("history_since"):
+            # сервер обрабатывает пакеты соединения по порядку, и "ack" повторов
+            # приходит раньше ответа на синхронизацию
+            self._resend_outbox()
             self.connected.emit()
 
         elif state == QAbstractSocket.UnconnectedState:
             # Соединение потеряно или закрыто
-            self.disconnected.emit()
\ No newline at end of file
+            self.disconnected.emit()
+            self._schedule_reconnect()
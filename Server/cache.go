@@ -0,0 +1,131 @@
+package main
+
+import (
+	"crypto/subtle"
+	"encoding/json"
+	"net/http"
+	"os"
+	"sync"
+	"sync/atomic"
+)
+
+// cacheMaxEntries — сколько записей хранит один кэш; при переполнении он очищается целиком
+const cacheMaxEntries = 100000
+
+// memoCache — потокобезопасный кэш редко меняющихся значений из базы данных
+// со счётчиками попаданий и промахов.
+type memoCache[K comparable, V any] struct {
+	mu     sync.RWMutex
+	m      map[K]V
+	hits   atomic.Int64
+	misses atomic.Int64
+}
+
+func newMemoCache[K comparable, V any]() *memoCache[K, V] {
+	return &memoCache[K, V]{m: map[K]V{}}
+}
+
+func (c *memoCache[K, V]) get(key K) (V, bool) {
+	/**
+	Возвращает значение из кэша и учитывает попадание или промах.
+	*/
+
+	c.mu.RLock()
+	v, ok := c.m[key]
+	c.mu.RUnlock()
+	if ok {
+		c.hits.Add(1)
+	} else {
+		c.misses.Add(1)
+	}
+	return v, ok
+}
+
+func (c *memoCache[K, V]) put(key K, v V) {
+	c.mu.Lock()
+	if len(c.m) >= cacheMaxEntries {
+		c.m = map[K]V{}
+	}
+	c.m[key] = v
+	c.mu.Unlock()
+}
+
+func (c *memoCache[K, V]) del(key K) {
+	c.mu.Lock()
+	delete(c.m, key)
+	c.mu.Unlock()
+}
+
+func (c *memoCache[K, V]) stats() map[string]interface{} {
+	/**
+	Возвращает размер кэша, число попаданий и промахов и долю попаданий.
+	*/
+
+	c.mu.RLock()
+	size := len(c.m)
+	c.mu.RUnlock()
+
+	hits, misses := c.hits.Load(), c.misses.Load()
+	rate := 0.0
+	if hits+misses > 0 {
+		rate = float64(hits) / float64(hits+misses)
+	}
+	return map[string]interface{}{
+		"size":     size,
+		"hits":     hits,
+		"misses":   misses,
+		"hit_rate": rate,
+	}
+}
+
+// Кэши горячего пути доставки сообщений (router → persistMsg / deliver)
+var (
+	// userIDs — username → ID пользователя (имена не меняются)
+	userIDs = newMemoCache[string, int64]()
+
+	// directChats — пара ID пользователей (меньший, больший) → ID их личного чата
+	directChats = newMemoCache[[2]int64, int64]()
+
+	// chatMembers — ID чата → username участников
+	// (сбрасывается там, где меняется chat_members; срез из кэша нельзя изменять)
+	chatMembers = newMemoCache[int64, []string]()
+)
+
+// debugTokenEnv — переменная окружения с токеном для /debug/cache.
+// Если она не задана, обработчик не регистрируется
+const debugTokenEnv = "DEBUG_TOKEN"
+
+func debugCacheHandler(token string) http.HandlerFunc {
+	/**
+	Отладочный обработчик (GET /debug/cache): статистика кэшей в формате JSON.
+	Отвечает только на запросы с заголовком "X-Debug-Token: <token>".
+	*/
+
+	return func(w http.ResponseWriter, r *http.Request) {
+		got := r.Header.Get("X-Debug-Token")
+		if subtle.ConstantTimeCompare([]byte(got), []byte(token)) != 1 {
+			http.Error(w, "forbidden", http.StatusForbidden)
+			return
+		}
+
+		w.Header().Set("Content-Type", "application/json")
+		json.NewEncoder(w).Encode(map[string]interface{}{
+			"user_ids":     userIDs.stats(),
+			"direct_chats": directChats.stats(),
+			"chat_members": chatMembers.stats(),
+		})
+	}
+}
+
+func registerDebugHandlers() {
+	/**
+	Регистрирует отладочные обработчики, если задан токен (DEBUG_TOKEN):
+	статистика кэшей раскрывает сведения о нагрузке, без токена она недоступна.
+	*/
+
+	token := os.Getenv(debugTokenEnv)
+	if token == "" {
+		return
+	}
+	http.HandleFunc("/debug/cache", debugCacheHandler(token)) // статистика кэшей сервера
+}
@@ -4,6 +4,7 @@ import (
 	"context"
 	"encoding/json"
 	"fmt"
+	"log"
 	"net/http"
 )
 
@@ -95,7 +96,7 @@ func createDirectChatHandler(w http.ResponseWriter, r *http.Request) {
 	}
 
 	// Убеждаемся, что такой чат существует или создаём его
-	chatID, err := ensureDirectChat(ctx, fromID, toID)
+	chatID, created, err := ensureDirectChat(ctx, fromID, toID)
 	if err != nil {
 		http.Error(w, "cannot ensure chat", http.StatusInternalServerError)
 		return
@@ -105,15 +106,13 @@ func createDirectChatHandler(w http.ResponseWriter, r *http.Request) {
 	w.Header().Set("Content-Type", "application/json")
 	json.NewEncoder(w).Encode(map[string]int64{"chat_id": chatID})
 
-	// Пушим обновлённые списки чатов обоим участникам по WebSocket
-	mu.Lock()
-	if c, ok := clients[user]; ok {
-		sendChats(user, c) // отправителю
+	// Новый чат — отправляем его обоим участникам по WebSocket ("chat_update")
+	if !created {
+		return
 	}
-	if c, ok := clients[req.Username]; ok {
-		sendChats(req.Username, c) // получателю
+	for _, c := range lookupClients(user, req.Username) {
+		sendChatAdded(c.user, c, chatID) // отправителю и получателю
 	}
-	mu.Unlock()
 }
 
 func createGroupChatHandler(w http.ResponseWriter, r *http.Request) {
@@ -180,13 +179,21 @@ func createGroupChatHandler(w http.ResponseWriter, r *http.Request) {
 	w.Header().Set("Content-Type", "application/json")
 	json.NewEncoder(w).Encode(map[string]int64{"chat_id": chatID})
 
-	// Уведомляем всех участников (включая создателя), отправив им обновлённый список чатов
+	// Уведомляем всех участников (включая создателя) о новом чате.
+	// Сводка группы у всех одинаковая — запрашиваем её один раз
+	chat, err := GetUserChat(ctx, creator, chatID)
+	if err != nil {
+		log.Printf("createGroupChat: chat %d: %v", chatID, err)
+		return
+	}
+	added, err := json.Marshal(Packet{Type: "chat_update", Added: []ChatSummary{chat}})
+	if err != nil {
+		log.Printf("createGroupChat: marshal: %v", err)
+		return
+	}
+
 	participants := append(req.Usernames, creator)
-	mu.Lock()
-	for _, uname := range participants {
-		if conn, ok := clients[uname]; ok {
-			sendChats(uname, conn)
-		}
+	for _, conn := range lookupClients(participants...) {
+		conn.push(added)
 	}
-	mu.Unlock()
 }
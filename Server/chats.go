@@ -3,19 +3,19 @@ package main
 import (
 	"context"
 	"database/sql"
+	"encoding/json"
 	"fmt"
-	"github.com/gorilla/websocket"
 	"github.com/jackc/pgx/v5"
 	"log"
 )
 
-func sendChats(username string, ws *websocket.Conn) {
+func sendChats(username string, cl *client) {
 	/**
 	Отправляет пользователю обновлённый список его чатов через WebSocket.
 
 	Параметры:
 	- username: имя пользователя, которому нужно отправить список;
-	- ws: его WebSocket-соединение.
+	- cl: его WebSocket-соединение.
 
 	Используется:
 	- после входа в систему;
@@ -39,20 +39,80 @@ func sendChats(username string, ws *websocket.Conn) {
 	}
 
 	// Отправляем JSON-пакет через WebSocket
-	_ = ws.WriteJSON(p)
+	_ = cl.send(p)
 }
 
-func ensureDirectChat(ctx context.Context, u1, u2 int64) (int64, error) {
+func sendChatsSince(username string, cl *client, since map[int64]int64) {
+	/**
+	Отправляет пользователю частичный список чатов (поле "partial") —
+	только чаты, которых нет в since, и чаты с сообщениями новее since.
+
+	since — chat_id → время последнего сообщения, которое уже есть у клиента (мс).
+	Используется при возобновлении сессии вместо полного sendChats.
+	*/
+
+	ctx := context.Background()
+
+	chats, err := GetUserChats(ctx, username)
+	if err != nil {
+		log.Printf("sendChatsSince: cannot fetch chats for %s: %v", username, err)
+		return
+	}
+
+	// Оставляем только изменившиеся (или неизвестные клиенту) чаты
+	changed := make([]ChatSummary, 0, len(chats))
+	for _, c := range chats {
+		if ts, ok := since[c.ChatID]; !ok || c.LastAt > ts {
+			changed = append(changed, c)
+		}
+	}
+	if len(changed) == 0 {
+		return
+	}
+
+	_ = cl.send(Packet{
+		Type:    "chats",
+		Chats:   changed,
+		Partial: true,
+	})
+}
+
+func sendChatAdded(username string, cl *client, chatID int64) {
+	/**
+	Отправляет пользователю пакет "chat_update" с новым чатом (поле "added").
+	Пакет ставится в очередь без ожидания (см. client.push).
+	*/
+
+	chat, err := GetUserChat(context.Background(), username, chatID)
+	if err != nil {
+		log.Printf("sendChatAdded: chat %d for %s: %v", chatID, username, err)
+		return
+	}
+	data, err := json.Marshal(Packet{Type: "chat_update", Added: []ChatSummary{chat}})
+	if err != nil {
+		log.Printf("sendChatAdded: marshal: %v", err)
+		return
+	}
+	cl.push(data)
+}
+
+func ensureDirectChat(ctx context.Context, u1, u2 int64) (int64, bool, error) {
 	/**
 	Гарантирует наличие личного чата между двумя пользователями.
 	Если такой чат уже существует — возвращает его ID.
 	Если нет — создаёт новый чат и добавляет в него обоих участников.
+	Второе значение — true, если чат был создан.
+	Найденные и созданные чаты запоминаются в кэше directChats.
 	*/
 
 	// Упорядочиваем ID, чтобы избежать дубликатов в разных порядках
 	if u1 > u2 {
 		u1, u2 = u2, u1
 	}
+	key := [2]int64{u1, u2}
+	if chatID, ok := directChats.get(key); ok {
+		return chatID, false, nil
+	}
 
 	var chatID int64
 
@@ -71,7 +131,7 @@ func ensureDirectChat(ctx context.Context, u1, u2 int64) (int64, error) {
 		if err = Pool.QueryRow(ctx,
 			`INSERT INTO chats (is_group) VALUES (false) RETURNING id`,
 		).Scan(&chatID); err != nil {
-			return 0, err
+			return 0, false, err
 		}
 
 		// Добавляем обоих участников в таблицу chat_members
@@ -79,12 +139,19 @@ func ensureDirectChat(ctx context.Context, u1, u2 int64) (int64, error) {
 			`INSERT INTO chat_members (chat_id, user_id)
              VALUES ($1, $2), ($1, $3)`,
 			chatID, u1, u2); err != nil {
-			return 0, err
+			return 0, false, err
 		}
+		chatMembers.del(chatID) // состав чата изменился — сбрасываем его кэш
+		directChats.put(key, chatID)
+		return chatID, true, nil
+	}
+	if err != nil {
+		return 0, false, err
 	}
 
-	// Возвращаем ID чата (существующего или нового)
-	return chatID, err
+	// Возвращаем ID существующего чата
+	directChats.put(key, chatID)
+	return chatID, false, nil
 }
 
 func GetUserChats(ctx context.Context, username string) ([]ChatSummary, error) {
@@ -95,6 +162,31 @@ func GetUserChats(ctx context.Context, username string) ([]ChatSummary, error) {
 	Каждый элемент — это ChatSummary, содержащий ID, тип, отображаемое имя, последнее сообщение и его время.
 	*/
 
+	return queryUserChats(ctx, username, 0)
+}
+
+func GetUserChat(ctx context.Context, username string, chatID int64) (ChatSummary, error) {
+	/**
+	Возвращает сводку одного чата пользователя (как элемент GetUserChats).
+	Используется для пакета "chat_update", когда у пользователя появился новый чат.
+	*/
+
+	chats, err := queryUserChats(ctx, username, chatID)
+	if err != nil {
+		return ChatSummary{}, err
+	}
+	if len(chats) == 0 {
+		return ChatSummary{}, pgx.ErrNoRows
+	}
+	return chats[0], nil
+}
+
+func queryUserChats(ctx context.Context, username string, chatID int64) ([]ChatSummary, error) {
+	/**
+	Выбирает чаты пользователя с последними сообщениями.
+	chatID == 0 — все чаты, иначе только указанный.
+	*/
+
 	// 1) Получаем ID пользователя по его username
 	var uid int64
 	if err := Pool.QueryRow(ctx,
@@ -142,11 +234,12 @@ func GetUserChats(ctx context.Context, username string) ([]ChatSummary, error) {
 		) m ON true
 
 		-- Оставляем только чаты, где состоит указанный пользователь
-		WHERE cm.user_id = $1
+		-- (и только запрошенный чат, если $2 <> 0)
+		WHERE cm.user_id = $1 AND ($2::bigint = 0 OR c.id = $2)
 
 		-- Сортировка по дате последнего сообщения (или дате создания, если сообщений не было)
 		ORDER BY COALESCE(EXTRACT(EPOCH FROM m.send_at), EXTRACT(EPOCH FROM c.created_at)) * 1000 DESC
-	`, uid)
+	`, uid, chatID)
 	if err != nil {
 		return nil, err
 	}
@@ -256,5 +349,6 @@ func CreateGroupChat(ctx context.Context, ownerID int64, title string, memberIDs
 	if err := tx.Commit(ctx); err != nil {
 		return 0, fmt.Errorf("commit tx: %w", err)
 	}
+	chatMembers.del(chatID) // состав чата изменился — сбрасываем его кэш
 	return chatID, nil
 }
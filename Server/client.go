@@ -0,0 +1,213 @@
+package main
+
+import (
+	"bytes"
+	"compress/flate"
+	"encoding/json"
+	"errors"
+	"github.com/gorilla/websocket"
+	"log"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// sendQueueSize — сколько пакетов может ждать отправки в одно соединение
+const sendQueueSize = 256
+
+// writeTimeout — сколько ждать записи одного пакета в сокет
+const writeTimeout = 10 * time.Second
+
+// deflateLevel — уровень сжатия кадров для клиентов с enc=deflate
+// (BestSpeed: история и списки чатов сжимаются в разы и при нём, а CPU и память
+// компрессора на каждое соединение заметно меньше, чем на уровнях выше)
+const deflateLevel = flate.BestSpeed
+
+// slowConsumerPolicy — что делать с клиентом, который не успевает читать
+// (очередь отправки заполнена, пакет роутера некуда положить):
+//   - slowConsumerDrop — пропустить пакет (клиент догонит пропущенное через "history_since"
+//     после переподключения, но до этого может не увидеть часть сообщений);
+//   - slowConsumerDisconnect — закрыть соединение: клиент переподключится с resume=1
+//     и получит всё пропущенное.
+const slowConsumerPolicy = slowConsumerDisconnect
+
+const (
+	slowConsumerDrop = iota
+	slowConsumerDisconnect
+)
+
+// errClientClosed — соединение уже закрыто, пакет не отправлен
+var errClientClosed = errors.New("connection closed")
+
+// client — WebSocket-соединение пользователя.
+// В сокет пишет только своя горутина writeLoop, остальные кладут готовые кадры
+// в очередь out — медленный клиент не задерживает рассылку другим.
+type client struct {
+	user string
+	conn *websocket.Conn
+	out  chan []byte   // очередь кадров на отправку
+	done chan struct{} // закрывается вместе с соединением
+
+	closeOnce sync.Once
+	dropped   int64 // сколько пакетов пропущено из-за полной очереди (atomic)
+
+	// Сжатие кадров (enc=deflate): один поток deflate на всё соединение —
+	// повторяющиеся ключи и имена из прошлых пакетов сжимаются ссылками на них.
+	// Используется только в writeLoop
+	zw   *flate.Writer
+	zbuf bytes.Buffer
+}
+
+func newClient(user string, conn *websocket.Conn, enc string) *client {
+	/**
+	Создаёт клиента для соединения и запускает его горутину записи.
+
+	enc — формат кадров, запрошенный клиентом: "deflate" — JSON, сжатый одним
+	потоком deflate, в бинарных кадрах; иначе — обычный JSON в текстовых кадрах.
+	*/
+
+	cl := &client{
+		user: user,
+		conn: conn,
+		out:  make(chan []byte, sendQueueSize),
+		done: make(chan struct{}),
+	}
+	if enc == "deflate" {
+		cl.zw, _ = flate.NewWriter(&cl.zbuf, deflateLevel)
+		// кадры уже сжаты — permessage-deflate (если согласован) только тратил бы CPU
+		conn.EnableWriteCompression(false)
+	}
+	go cl.writeLoop()
+	return cl
+}
+
+func (cl *client) encoding() string {
+	if cl.zw != nil {
+		return "deflate"
+	}
+	return "json"
+}
+
+func (cl *client) compress(data []byte) ([]byte, error) {
+	/**
+	Сжимает кадр потоком соединения. Flush завершает кадр, чтобы клиент
+	мог распаковать его целиком, не дожидаясь следующих.
+	*/
+
+	cl.zbuf.Reset()
+	if _, err := cl.zw.Write(data); err != nil {
+		return nil, err
+	}
+	if err := cl.zw.Flush(); err != nil {
+		return nil, err
+	}
+	return cl.zbuf.Bytes(), nil
+}
+
+func (cl *client) writeLoop() {
+	/**
+	Единственный писатель в соединение: отправляет кадры из очереди по порядку.
+	При ошибке записи закрывает соединение.
+	*/
+
+	for {
+		select {
+		case data := <-cl.out:
+			frameType := websocket.TextMessage
+			if cl.zw != nil {
+				var err error
+				if data, err = cl.compress(data); err != nil {
+					log.Printf("client %s: compress: %v", cl.user, err)
+					cl.close()
+					return
+				}
+				frameType = websocket.BinaryMessage
+			}
+			_ = cl.conn.SetWriteDeadline(time.Now().Add(writeTimeout))
+			if err := cl.conn.WriteMessage(frameType, data); err != nil {
+				cl.close()
+				return
+			}
+		case <-cl.done:
+			return
+		}
+	}
+}
+
+func (cl *client) close() {
+	/**
+	Закрывает соединение (один раз): останавливает writeLoop,
+	а цикл чтения в handleWS завершится с ошибкой.
+	*/
+
+	cl.closeOnce.Do(func() {
+		close(cl.done)
+		cl.conn.Close()
+	})
+}
+
+func (cl *client) send(v interface{}) error {
+	/**
+	Ставит пакет в очередь отправки, при полной очереди — ждёт.
+	Для ответов на запросы самого клиента (списки чатов, история, ack):
+	они идут из горутины этого же соединения, ждать здесь безопасно.
+	*/
+
+	data, err := json.Marshal(v)
+	if err != nil {
+		return err
+	}
+	select {
+	case cl.out <- data:
+		return nil
+	case <-cl.done:
+		return errClientClosed
+	}
+}
+
+func (cl *client) push(data []byte) bool {
+	/**
+	Ставит готовый кадр в очередь без ожидания — для рассылки из роутера
+	и обработчиков, где один кадр уходит многим клиентам.
+	Если очередь заполнена, поступает по slowConsumerPolicy. Возвращает true,
+	если кадр поставлен в очередь.
+	*/
+
+	select {
+	case cl.out <- data:
+		return true
+	case <-cl.done:
+		return false
+	default:
+	}
+
+	if slowConsumerPolicy == slowConsumerDrop {
+		if n := atomic.AddInt64(&cl.dropped, 1); n == 1 || n%100 == 0 {
+			log.Printf("client %s: send queue full, %d packets dropped", cl.user, n)
+		}
+		return false
+	}
+	log.Printf("client %s: send queue full, disconnecting", cl.user)
+	cl.close()
+	return false
+}
+
+func lookupClients(usernames ...string) []*client {
+	/**
+	Возвращает соединения подключённых пользователей из списка, каждое один раз
+	(мьютекс держится только на время поиска в clients).
+	*/
+
+	mu.Lock()
+	defer mu.Unlock()
+
+	conns := make([]*client, 0, len(usernames))
+	seen := make(map[*client]bool, len(usernames))
+	for _, uname := range usernames {
+		if cl, ok := clients[uname]; ok && !seen[cl] {
+			seen[cl] = true
+			conns = append(conns, cl)
+		}
+	}
+	return conns
+}
@@ -9,8 +9,8 @@ import (
 // Глобальные переменные:
 var (
 	// clients — список всех подключённых по WebSocket пользователей:
-	// Ключ — имя пользователя (username), значение — WebSocket-соединение.
-	clients = map[string]*websocket.Conn{}
+	// Ключ — имя пользователя (username), значение — его соединение.
+	clients = map[string]*client{}
 
 	// mu — мьютекс (mutex) для защиты clients от одновременного доступа из нескольких горутин
 	mu sync.Mutex
@@ -21,10 +21,13 @@ var (
 	broadcast = make(chan Packet, 1024)
 
 	// upg — конфигурация апгрейда HTTP-соединения до WebSocket.
+	// EnableCompression — permessage-deflate для клиентов, которые его предлагают
+	// (Qt-клиент его не поддерживает и сжатие запрашивает сам, параметром enc=deflate).
 	upg = websocket.Upgrader{
 		CheckOrigin: func(*http.Request) bool {
 			return true
 		},
+		EnableCompression: true,
 	}
 )
 
@@ -38,6 +41,30 @@ type Packet struct {
 	Text   string        `json:"text,omitempty"`    // Текст сообщения (если Type == "msg")
 	Ts     int64         `json:"ts,omitempty"`      // Временная метка в миллисекундах
 	Chats  []ChatSummary `json:"chats,omitempty"`   // Используется при отправке списка чатов
+
+	// Partial — список чатов неполный (только изменившиеся чаты, при возобновлении сессии)
+	Partial bool `json:"partial,omitempty"`
+
+	// Пакет "chat_update" — изменения списка чатов вместо полного снимка "chats":
+	// новые сообщения в чатах, новые чаты и удалённые чаты
+	Updated []ChatUpdate  `json:"updated,omitempty"`
+	Added   []ChatSummary `json:"added,omitempty"`
+	Removed []int64       `json:"removed,omitempty"`
+
+	// Since — для запроса "history_since": chat_id → время последнего сообщения,
+	// которое уже есть у клиента (в миллисекундах)
+	Since map[int64]int64 `json:"since,omitempty"`
+
+	// Before — для запроса "history_before": нужна страница сообщений старше этого времени (мс)
+	Before int64 `json:"before,omitempty"`
+	// BeforeID — ID того же сообщения ("oldest_id" из истории): вместе с Before
+	// задаёт границу страницы точно, даже если в ту же миллисекунду есть другие сообщения
+	BeforeID int64 `json:"before_id,omitempty"`
+
+	// ClientID — идентификатор сообщения, выданный клиентом. Возвращается отправителю
+	// в эхо "msg" (или в пакете "ack" для повтора, вместе с Ts сохранённой копии)
+	// и позволяет отбросить повторную отправку
+	ClientID string `json:"client_id,omitempty"`
 }
 
 // loginReq — структура, описывающая тело запроса при попытке входа.
@@ -85,6 +112,13 @@ type ChatSummary struct {
 	LastAt   int64  `json:"last_at"`            // Время последнего сообщения
 }
 
+// ChatUpdate — изменение одного чата в пакете "chat_update": новое последнее сообщение
+type ChatUpdate struct {
+	ChatID  int64  `json:"chat_id"`  // ID чата
+	LastMsg string `json:"last_msg"` // Последнее сообщение
+	LastAt  int64  `json:"last_at"`  // Время последнего сообщения (мс)
+}
+
 // UserSummary содержит минимальную информацию о пользователе
 // для отображения в результатах поиска
 type UserSummary struct {
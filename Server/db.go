@@ -44,6 +44,25 @@ func InitDB() {
 
 	// Всё хорошо — выводим сообщение
 	log.Println("PostgreSQL connection pool is ready")
+
+	migrateDB()
+}
+
+func migrateDB() {
+	/**
+	Дополняет схему базы данных столбцами, которые появились в новых версиях сервера
+	(для уже существующих баз; повторный запуск ничего не меняет).
+	*/
+
+	ctx := context.Background()
+
+	// client_id сообщения — чтобы отправитель узнал своё сообщение в истории,
+	// если эхо потерялось вместе с соединением
+	if _, err := Pool.Exec(ctx,
+		`ALTER TABLE messages ADD COLUMN IF NOT EXISTS client_id TEXT`,
+	); err != nil {
+		log.Fatalf("Failed to migrate messages table: %v", err)
+	}
 }
 
 func CloseDB() {
@@ -18,6 +18,7 @@ func main() {
 	http.HandleFunc("/chats/direct", createDirectChatHandler) // создание личного чата
 	http.HandleFunc("/chats/group", createGroupChatHandler)   // создание группового чата
 	http.HandleFunc("/ws", handleWS)                          // WebSocket-соединение
+	registerDebugHandlers()                                   // /debug/cache (только с DEBUG_TOKEN)
 
 	// Запускаем отдельную горутину, которая будет слушать канал broadcast
 	// и рассылать сообщения клиентам
@@ -2,67 +2,203 @@ package main
 
 import (
 	"context"
-	"github.com/gorilla/websocket"
+	"encoding/json"
+	"fmt"
+	"hash/fnv"
 	"log"
+	"runtime"
+	"sync"
 	"time"
 )
 
+// historyPageSize — сколько сообщений отдаётся за одну страницу истории чата
+const historyPageSize = 50
+
+// historyBulkChunk — после скольких сообщений пакет "history_bulk" отправляется
+// (чат в пакет попадает целиком, поэтому пакет может быть чуть больше)
+const historyBulkChunk = 2000
+
+// routerShards — сколько горутин параллельно сохраняют и рассылают сообщения
+var routerShards = runtime.NumCPU()
+
+// clientIDTTL — сколько помнить client_id принятых сообщений для отбрасывания повторов
+const clientIDTTL = 10 * time.Minute
+
+// clientIDSet — недавно сохранённые сообщения по client_id (по пользователям)
+type clientIDSet struct {
+	mu     sync.Mutex
+	seen   map[string]int64 // "username\x00client_id" → время сообщения (мс, как p.Ts)
+	pruned time.Time        // когда последний раз удалялись устаревшие записи
+}
+
+// seenClientIDs — client_id всех недавно сохранённых сообщений
+var seenClientIDs = &clientIDSet{seen: map[string]int64{}}
+
+func (s *clientIDSet) lookup(username, clientID string) (int64, bool) {
+	/**
+	Если сообщение с таким client_id уже сохранено (повтор), возвращает
+	его время (мс) — оно уходит клиенту в "ack" — и true.
+	*/
+
+	s.mu.Lock()
+	defer s.mu.Unlock()
+
+	ts, ok := s.seen[username+"\x00"+clientID]
+	if !ok || time.Since(time.UnixMilli(ts)) > clientIDTTL {
+		return 0, false
+	}
+	return ts, true
+}
+
+func (s *clientIDSet) add(username, clientID string, ts int64) {
+	/**
+	Запоминает client_id сохранённого сообщения пользователя и его время.
+	Вызывается только после успешной записи в базу: если запись не удалась,
+	повтор от клиента должен сохраниться, а не получить "ack".
+	*/
+
+	key := username + "\x00" + clientID
+	now := time.Now()
+
+	s.mu.Lock()
+	defer s.mu.Unlock()
+
+	// Не чаще раза в минуту убираем записи старше clientIDTTL
+	if now.Sub(s.pruned) > time.Minute {
+		for k, ts := range s.seen {
+			if now.Sub(time.UnixMilli(ts)) > clientIDTTL {
+				delete(s.seen, k)
+			}
+		}
+		s.pruned = now
+	}
+
+	s.seen[key] = ts
+}
+
 func router() {
 	/**
 	Фоновая горутина, которая постоянно слушает канал broadcast и
-	рассылает входящие сообщения нужным пользователям через WebSocket.
+	раздаёт входящие сообщения routerShards обработчикам (deliver).
 
-	Также сохраняет каждое сообщение в базу данных и обновляет списки чатов у участников.
+	Сообщения одного чата (группового — по chat_id, личного — по паре участников)
+	всегда попадают в один и тот же обработчик, поэтому порядок внутри чата
+	сохраняется, а разные чаты сохраняются и рассылаются параллельно.
 	*/
 
+	shards := make([]chan Packet, routerShards)
+	for i := range shards {
+		shards[i] = make(chan Packet, cap(broadcast))
+		go func(in <-chan Packet) {
+			for p := range in {
+				deliver(p)
+			}
+		}(shards[i])
+	}
+
 	for p := range broadcast {
-		// Сохраняем сообщение в базу данных (в зависимости от типа чата)
-		if err := persistMsg(p); err != nil {
-			log.Printf("router: persistMsg failed: %v", err)
-		}
+		shards[routeKey(p)%uint32(len(shards))] <- p
+	}
+}
 
-		mu.Lock() // Блокируем доступ к clients на время рассылки
+func routeKey(p Packet) uint32 {
+	/**
+	Хэш чата сообщения: chat_id для групп, пара имён (в порядке возрастания) для личных.
+	*/
 
-		// === Групповое сообщение ===
-		if p.ChatID != 0 {
-			// Получаем список всех участников этого чата
-			members, err := GetChatMembers(context.Background(), p.ChatID)
-			if err != nil {
-				log.Printf("router: GetChatMembers failed: %v", err)
-			}
+	h := fnv.New32a()
+	if p.ChatID != 0 {
+		fmt.Fprintf(h, "g%d", p.ChatID)
+	} else if p.From < p.To {
+		fmt.Fprintf(h, "d%s\x00%s", p.From, p.To)
+	} else {
+		fmt.Fprintf(h, "d%s\x00%s", p.To, p.From)
+	}
+	return h.Sum32()
+}
 
-			// Рассылаем сообщение каждому участнику
-			for _, uname := range members {
-				if conn, ok := clients[uname]; ok {
-					conn.WriteJSON(p)      // Отправляем сообщение
-					sendChats(uname, conn) // Обновляем список чатов
-				}
-			}
+func deliver(p Packet) {
+	/**
+	Сохраняет сообщение в базу данных и рассылает его участникам чата.
 
-			// === Личное сообщение ===
-		} else {
-			// Отправляем получателю
-			if dst, ok := clients[p.To]; ok {
-				dst.WriteJSON(p)
-				sendChats(p.To, dst)
-			}
+	Также обновляет списки чатов у участников пакетом "chat_update":
+	только изменившийся чат, а не весь список.
+	Пакеты сериализуются один раз и ставятся в очереди соединений без ожидания,
+	глобальный мьютекс держится только на время поиска соединений.
+	*/
 
-			// Отправляем копию отправителю (чтобы он тоже увидел своё сообщение)
-			if src, ok := clients[p.From]; ok {
-				src.WriteJSON(p)
-				sendChats(p.From, src)
+	// Повтор, который пришёл, пока первая копия ещё ждала сохранения
+	// (копии одного чата обрабатываются по порядку одним обработчиком)
+	if ts, ok := seenClientIDs.lookup(p.From, p.ClientID); p.ClientID != "" && ok {
+		if ack, err := json.Marshal(Packet{Type: "ack", ClientID: p.ClientID, Ts: ts}); err == nil {
+			for _, cl := range lookupClients(p.From) {
+				cl.push(ack)
 			}
 		}
-		mu.Unlock() // Освобождаем мьютекс
+		return
+	}
+
+	// Сохраняем сообщение в базу данных (в зависимости от типа чата).
+	// Несохранённое сообщение не рассылается и не подтверждается:
+	// клиент повторит его по тайм-ауту
+	chatID, created, err := persistMsg(p)
+	if err != nil {
+		log.Printf("router: persistMsg failed: %v", err)
+		return
+	}
+	if p.ClientID != "" {
+		seenClientIDs.add(p.From, p.ClientID, p.Ts)
+	}
+
+	// Адресаты: все участники группы или оба участника личного чата
+	var recipients []string
+	if p.ChatID != 0 {
+		recipients, err = GetChatMembers(context.Background(), p.ChatID)
+		if err != nil {
+			log.Printf("router: GetChatMembers failed: %v", err)
+		}
+	} else {
+		recipients = []string{p.To, p.From}
+	}
+
+	msg, err := json.Marshal(p)
+	if err != nil {
+		log.Printf("router: marshal msg: %v", err)
+		return
+	}
+
+	// Изменение списка чатов — одно на всех участников
+	update, err := json.Marshal(Packet{
+		Type:    "chat_update",
+		Updated: []ChatUpdate{{ChatID: chatID, LastMsg: p.Text, LastAt: p.Ts}},
+	})
+	if err != nil {
+		log.Printf("router: marshal chat_update: %v", err)
+		return
+	}
+
+	for _, cl := range lookupClients(recipients...) {
+		// Отправляем сообщение; если клиент не успевает читать — дальше не пишем
+		if !cl.push(msg) || chatID == 0 {
+			continue
+		}
+		// Обновляем список чатов: новый личный чат отправляется целиком
+		// (у каждого участника своё отображаемое имя), иначе — только изменение
+		if created {
+			sendChatAdded(cl.user, cl, chatID)
+		} else {
+			cl.push(update)
+		}
 	}
 }
 
-func persistMsg(p Packet) error {
+func persistMsg(p Packet) (int64, bool, error) {
 	/**
 	Сохраняет сообщение из WebSocket-пакета в базу данных.
 
 	Если сообщение отправлено в групповой чат — использует p.ChatID.
 	Если сообщение личное — определяет чат по участникам и создаёт его при необходимости.
+	Возвращает ID чата и true, если личный чат был создан этим сообщением.
 	*/
 
 	ctx := context.Background()
@@ -71,20 +207,21 @@ func persistMsg(p Packet) error {
 	fromID, err := getUserID(ctx, p.From)
 	if err != nil {
 		log.Printf("unknown sender %q: %v", p.From, err)
-		return err
+		return 0, false, err
 	}
 
 	// === Групповой чат ===
 	if p.ChatID != 0 {
 		_, err := Pool.Exec(ctx,
-			`INSERT INTO messages (chat_id, sender_id, text) VALUES ($1, $2, $3)`,
-			p.ChatID, fromID, p.Text,
+			`INSERT INTO messages (chat_id, sender_id, text, send_at, client_id)
+             VALUES ($1, $2, $3, $4, NULLIF($5, ''))`,
+			p.ChatID, fromID, p.Text, time.UnixMilli(p.Ts), p.ClientID,
 		)
 		if err != nil {
 			log.Printf("insert group msg: %v", err)
-			return err
+			return 0, false, err
 		}
-		return nil
+		return p.ChatID, false, nil
 	}
 
 	// === Личное сообщение ===
@@ -93,90 +230,319 @@ func persistMsg(p Packet) error {
 	toID, err := getUserID(ctx, p.To)
 	if err != nil {
 		log.Printf("unknown recipient %q: %v", p.To, err)
-		return err
+		return 0, false, err
 	}
 
 	// Убеждаемся, что чат существует (или создаём новый)
-	chatID, err := ensureDirectChat(ctx, fromID, toID)
+	chatID, created, err := ensureDirectChat(ctx, fromID, toID)
 	if err != nil {
 		log.Printf("ensuring chat: %v", err)
-		return err
+		return 0, false, err
 	}
 
-	// Сохраняем сообщение в БД
+	// Сохраняем сообщение в БД (с тем же временем, что ушло клиентам в p.Ts,
+	// чтобы кэш клиента и запрос "history_since" опирались на одинаковые метки,
+	// и с client_id — по нему отправитель узнает сообщение в истории)
 	_, err = Pool.Exec(ctx,
-		`INSERT INTO messages (chat_id, sender_id, text) VALUES ($1, $2, $3)`,
-		chatID, fromID, p.Text,
+		`INSERT INTO messages (chat_id, sender_id, text, send_at, client_id)
+         VALUES ($1, $2, $3, $4, NULLIF($5, ''))`,
+		chatID, fromID, p.Text, time.UnixMilli(p.Ts), p.ClientID,
 	)
 	if err != nil {
 		log.Printf("insert msg: %v", err)
-		return err
+		return chatID, created, err
 	}
 
-	return nil
+	return chatID, created, nil
 }
 
-func sendHistory(username string, ws *websocket.Conn) {
+func sendHistory(username string, cl *client) {
 	/**
-	Отправляет пользователю историю сообщений для всех его чатов (до 50 сообщений на чат).
+	Отправляет пользователю историю сообщений для всех его чатов
+	(последние historyPageSize сообщений на чат).
 	Вызывается при подключении клиента по WebSocket.
 	*/
 
+	sendHistorySince(username, cl, nil)
+}
+
+func sendHistorySince(username string, cl *client, since map[int64]int64) {
+	/**
+	Отправляет пользователю историю его чатов с учётом того, что уже есть у клиента.
+
+	since — chat_id → время последнего сообщения в кэше клиента (мс).
+	Для чатов из since отправляются только более новые сообщения (поле "since"),
+	и только если они есть. Если новых сообщений больше страницы, клиент получает
+	последнюю страницу целиком (без "since") и догружает остальное постранично.
+	Для остальных чатов — последняя страница истории.
+
+	История всех чатов выбирается одним запросом и уходит несколькими пакетами
+	"history_bulk" (по historyBulkChunk сообщений, не разрывая чаты):
+	{"type": "history_bulk", "chats": [{"chat_id", "messages", "since" | "has_more", "oldest_id"}, ...]}
+	*/
+
 	ctx := context.Background()
 
-	// Получаем ID пользователя по username
-	var uid int64
-	_ = Pool.QueryRow(ctx,
-		`SELECT id FROM users WHERE username=$1`, username,
-	).Scan(&uid)
-
-	// Получаем ID всех чатов, в которых состоит пользователь
-	rows, _ := Pool.Query(ctx,
-		`SELECT c.id
-           FROM chats c
-           JOIN chat_members m ON m.chat_id = c.id
-          WHERE m.user_id = $1`, uid,
+	// Время кэша клиента по чатам — в виде двух массивов для unnest
+	ids := make([]int64, 0, len(since))
+	ats := make([]time.Time, 0, len(since))
+	for chatID, after := range since {
+		if after > 0 {
+			ids = append(ids, chatID)
+			// начиная со следующей миллисекунды после after
+			ats = append(ats, time.UnixMilli(after+1))
+		}
+	}
+
+	// Последние historyPageSize сообщений каждого чата пользователя (новее кэша клиента).
+	// Чаты без таких сообщений тоже попадают в результат — одной строкой с NULL
+	rows, err := Pool.Query(ctx,
+		`SELECT cm.chat_id, m.id, u.username, m.text, m.send_at, m.client_id
+           FROM chat_members cm
+           JOIN users me ON me.id = cm.user_id
+           LEFT JOIN unnest($2::bigint[], $3::timestamptz[]) AS s(chat_id, since_at)
+                  ON s.chat_id = cm.chat_id
+           LEFT JOIN LATERAL (
+                SELECT id, sender_id, text, send_at, client_id
+                  FROM messages
+                 WHERE chat_id = cm.chat_id
+                   AND send_at >= COALESCE(s.since_at, '-infinity')
+                 ORDER BY send_at DESC, id DESC
+                 LIMIT $4) m ON true
+           LEFT JOIN users u ON u.id = m.sender_id
+          WHERE me.username = $1
+          ORDER BY cm.chat_id, m.send_at, m.id`,
+		username, ids, ats, historyPageSize,
 	)
-	// Закрываем результат после завершения чтения всех chat_id
+	if err != nil {
+		log.Printf("sendHistory: query for %s: %v", username, err)
+		return
+	}
 	defer rows.Close()
 
-	for rows.Next() {
-		var chatID int64
-		// Получаем chat_id из строки результата
-		_ = rows.Scan(&chatID)
-
-		// Извлекаем до 50 сообщений из чата в хронологическом порядке
-		msgRows, _ := Pool.Query(ctx,
-			`SELECT u.username, m.text, m.send_at
-               FROM messages m
-               JOIN users u ON u.id = m.sender_id
-              WHERE m.chat_id = $1
-              ORDER BY m.send_at ASC
-              LIMIT 50`, chatID,
-		)
+	var (
+		bulk  []map[string]interface{} // чаты очередного пакета
+		count int                      // сообщений в bulk
+		dead  bool                     // соединение закрыто — дальше не отправляем
+	)
+
+	// flush отправляет накопленные чаты одним пакетом
+	flush := func() {
+		if len(bulk) == 0 || dead {
+			return
+		}
+		if err := cl.send(map[string]interface{}{
+			"type":  "history_bulk",
+			"chats": bulk,
+		}); err != nil {
+			log.Printf("sendHistory: write to %s: %v", username, err)
+			dead = true
+		}
+		bulk, count = nil, 0
+	}
 
-		// Список сообщений в текущем чате (для отправки клиенту)
-		var msgs []map[string]interface{}
-		for msgRows.Next() {
-			var from, text string
-			var ts time.Time
-			// Считываем отправителя, текст и временную метку из строки результата
-			_ = msgRows.Scan(&from, &text, &ts)
-
-			// Добавляем сообщение в список
-			msgs = append(msgs, map[string]interface{}{
-				"from": from,
-				"text": text,
-				"ts":   ts.UnixMilli(),
-			})
-		}
-		msgRows.Close()
-
-		// Отправляем клиенту историю сообщений по текущему чату
-		_ = ws.WriteJSON(map[string]interface{}{
-			"type":     "history",
+	// finish добавляет историю одного чата в очередной пакет
+	finish := func(chatID, oldestID int64, msgs []map[string]interface{}) {
+		after := since[chatID]
+		entry := map[string]interface{}{
 			"chat_id":  chatID,
 			"messages": msgs,
-		})
+		}
+		if after > 0 && len(msgs) < historyPageSize {
+			// У клиента уже есть история этого чата — отправляем только новое
+			if len(msgs) == 0 {
+				return
+			}
+			entry["since"] = after
+		} else {
+			// Последняя страница истории (с ID самого старого сообщения —
+			// от него клиент запросит страницу постарше)
+			entry["has_more"] = len(msgs) == historyPageSize
+			if oldestID > 0 {
+				entry["oldest_id"] = oldestID
+			}
+		}
+		bulk = append(bulk, entry)
+		count += len(msgs)
+		if count >= historyBulkChunk {
+			flush()
+		}
+	}
+
+	// Строки идут по чатам, внутри чата — в хронологическом порядке
+	var (
+		curID    int64
+		oldestID int64
+		msgs     []map[string]interface{}
+	)
+	for rows.Next() && !dead {
+		var chatID int64
+		var id *int64
+		var from, text, clientID *string
+		var ts *time.Time
+		if err := rows.Scan(&chatID, &id, &from, &text, &ts, &clientID); err != nil {
+			log.Printf("sendHistory: scan for %s: %v", username, err)
+			return
+		}
+
+		if chatID != curID {
+			if curID != 0 {
+				finish(curID, oldestID, msgs)
+			}
+			curID, oldestID, msgs = chatID, 0, []map[string]interface{}{}
+		}
+		if ts == nil {
+			continue // в чате нет сообщений новее кэша
+		}
+		if len(msgs) == 0 {
+			oldestID = *id
+		}
+		msgs = append(msgs, historyRow(username, *from, *text, *ts, clientID))
+	}
+	if err := rows.Err(); err != nil {
+		log.Printf("sendHistory: rows for %s: %v", username, err)
+		return
+	}
+	if curID != 0 {
+		finish(curID, oldestID, msgs)
+	}
+	flush()
+}
+
+func sendHistoryPage(username string, cl *client, chatID, before, beforeID int64) {
+	/**
+	Отправляет пользователю одну страницу истории чата — сообщения старше
+	сообщения (before, beforeID): времени в мс и ID. Если before == 0,
+	отправляется последняя страница.
+	Вызывается по запросу клиента "history_before" при прокрутке переписки вверх.
+	Ответ отправляется всегда (при ошибке — пустая страница без has_more),
+	иначе клиент так и будет ждать эту страницу.
+	*/
+
+	ctx := context.Background()
+
+	p := map[string]interface{}{
+		"type":     "history",
+		"chat_id":  chatID,
+		"messages": []map[string]interface{}{},
+		"has_more": false,
+	}
+	if before > 0 {
+		// Страница старых сообщений — клиент добавит её в начало переписки
+		p["before"] = before
+	}
+
+	// Историю отдаём только участникам чата
+	var member bool
+	err := Pool.QueryRow(ctx,
+		`SELECT EXISTS(
+            SELECT 1
+              FROM chat_members cm
+              JOIN users u ON u.id = cm.user_id
+             WHERE cm.chat_id = $1 AND u.username = $2)`, chatID, username,
+	).Scan(&member)
+	if err != nil {
+		log.Printf("sendHistoryPage: membership of %s in chat %d: %v", username, chatID, err)
+	} else if !member {
+		log.Printf("sendHistoryPage: %s is not a member of chat %d", username, chatID)
+	} else if msgs, oldestID, err := loadHistoryPage(ctx, username, chatID, 0, before, beforeID); err != nil {
+		log.Printf("sendHistoryPage: chat %d: %v", chatID, err)
+	} else {
+		p["messages"] = msgs
+		p["has_more"] = len(msgs) == historyPageSize
+		if oldestID > 0 {
+			p["oldest_id"] = oldestID
+		}
+	}
+	_ = cl.send(p)
+}
+
+func loadHistoryPage(ctx context.Context, username string, chatID, after, before, beforeID int64) ([]map[string]interface{}, int64, error) {
+	/**
+	Возвращает до historyPageSize самых новых сообщений чата в хронологическом порядке
+	и ID самого старого из них (0, если сообщений нет). username — кому отправляется
+	страница (в его собственных сообщениях есть client_id).
+
+	after    — если > 0, только сообщения новее этого времени (мс);
+	before   — если > 0, только сообщения старше сообщения (before, beforeID).
+	Сообщения упорядочены по (send_at, id), поэтому сообщения с одинаковым временем
+	не теряются на границе страниц. Если beforeID == 0 (ID сообщения клиенту
+	неизвестен — например, история прочитана из локального кэша), граничная
+	миллисекунда включается в страницу целиком, а повторы отбрасывает клиент.
+	*/
+
+	query := `SELECT m.id, u.username, m.text, m.send_at, m.client_id
+                FROM messages m
+                JOIN users u ON u.id = m.sender_id
+               WHERE m.chat_id = $1`
+	args := []interface{}{chatID}
+
+	if after > 0 {
+		// начиная со следующей миллисекунды после after
+		args = append(args, time.UnixMilli(after+1))
+		query += fmt.Sprintf(" AND m.send_at >= $%d", len(args))
+	}
+	if before > 0 && beforeID > 0 {
+		args = append(args, time.UnixMilli(before), beforeID)
+		query += fmt.Sprintf(" AND (m.send_at, m.id) < ($%d, $%d)", len(args)-1, len(args))
+	} else if before > 0 {
+		// включая миллисекунду before (повторы отбросит клиент)
+		args = append(args, time.UnixMilli(before+1))
+		query += fmt.Sprintf(" AND m.send_at < $%d", len(args))
+	}
+	args = append(args, historyPageSize)
+	query += fmt.Sprintf(" ORDER BY m.send_at DESC, m.id DESC LIMIT $%d", len(args))
+
+	rows, err := Pool.Query(ctx, query, args...)
+	if err != nil {
+		return nil, 0, err
+	}
+	defer rows.Close()
+
+	// Список сообщений (для отправки клиенту), пока — от новых к старым
+	var (
+		msgs     []map[string]interface{}
+		oldestID int64
+	)
+	for rows.Next() {
+		var id int64
+		var from, text string
+		var clientID *string
+		var ts time.Time
+		// Считываем ID, отправителя, текст, временную метку и client_id из строки результата
+		if err := rows.Scan(&id, &from, &text, &ts, &clientID); err != nil {
+			return nil, 0, err
+		}
+
+		// Добавляем сообщение в список
+		msgs = append(msgs, historyRow(username, from, text, ts, clientID))
+		oldestID = id
+	}
+	if err := rows.Err(); err != nil {
+		return nil, 0, err
+	}
+
+	// Разворачиваем в хронологический порядок
+	for i, j := 0, len(msgs)-1; i < j; i, j = i+1, j-1 {
+		msgs[i], msgs[j] = msgs[j], msgs[i]
+	}
+	return msgs, oldestID, nil
+}
+
+func historyRow(username, from, text string, ts time.Time, clientID *string) map[string]interface{} {
+	/**
+	Строка истории для отправки пользователю username.
+	В его собственных сообщениях передаётся client_id: если эхо сообщения потерялось
+	вместе с соединением, клиент узнает его в истории и не покажет дважды.
+	*/
+
+	row := map[string]interface{}{
+		"from": from,
+		"text": text,
+		"ts":   ts.UnixMilli(),
+	}
+	if clientID != nil && *clientID != "" && from == username {
+		row["client_id"] = *clientID
 	}
+	return row
 }
@@ -10,8 +10,13 @@ func getUserID(ctx context.Context, username string) (int64, error) {
 	Возвращает ID пользователя по его username.
 
 	Если пользователь не найден — возвращает ошибку.
+	Найденные ID запоминаются в кэше userIDs.
 	*/
 
+	if id, ok := userIDs.get(username); ok {
+		return id, nil
+	}
+
 	var id int64
 	err := Pool.QueryRow(ctx,
 		`SELECT id FROM users WHERE username=$1`, username).
@@ -19,6 +24,7 @@ func getUserID(ctx context.Context, username string) (int64, error) {
 	if err != nil {
 		return 0, fmt.Errorf("unknown user %q: %w", username, err)
 	}
+	userIDs.put(username, id)
 	return id, nil
 }
 
@@ -59,9 +65,14 @@ func GetChatMembers(ctx context.Context, chatID int64) ([]string, error) {
 	/**
 	Возвращает список username всех участников заданного чата.
 
-	Запрашивает из базы пользователей, связанных с chat_id через таблицу chat_members.
+	Запрашивает из базы пользователей, связанных с chat_id через таблицу chat_members,
+	и запоминает список в кэше chatMembers (возвращаемый срез нельзя изменять).
 	*/
 
+	if users, ok := chatMembers.get(chatID); ok {
+		return users, nil
+	}
+
 	// Получаем список имён пользователей, входящих в чат
 	rows, err := Pool.Query(ctx,
 		`SELECT u.username
@@ -83,5 +94,13 @@ func GetChatMembers(ctx context.Context, chatID int64) ([]string, error) {
 		// Добавляем имя участника в результат
 		users = append(users, uname)
 	}
+	if err := rows.Err(); err != nil {
+		return nil, err
+	}
+
+	// Пустой список не кэшируем: чат с таким ID может появиться позже
+	if len(users) > 0 {
+		chatMembers.put(chatID, users)
+	}
 	return users, nil
 }
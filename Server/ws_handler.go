@@ -43,24 +43,41 @@ func handleWS(w http.ResponseWriter, r *http.Request) {
 		log.Println("upgrade:", err)
 		return
 	}
+	cl := newClient(user, conn, r.URL.Query().Get("enc"))
+
+	// Первым пакетом сообщаем клиенту выбранный формат кадров
+	// (клиент, запросивший enc=deflate у старого сервера, его не получит и останется на JSON)
+	_ = cl.send(map[string]string{"type": "hello", "enc": cl.encoding()})
 
 	// Добавляем клиента в список подключённых пользователей
 	mu.Lock()
-	clients[user] = conn
+	clients[user] = cl
 	mu.Unlock()
 
+	// resume=1 — клиент переподключился после разрыва: список чатов у него уже есть,
+	// изменившиеся чаты и пропущенные сообщения он получит в ответ на "history_since"
+	resume := r.URL.Query().Get("resume") == "1"
+
 	// Отправляем клиенту список всех его чатов
-	sendChats(user, conn)
+	if !resume {
+		sendChats(user, cl)
+	}
 
-	// Параллельно отправляем клиенту историю сообщений
-	go sendHistory(user, conn)
+	// sync=1 — клиент хранит локальный кэш и сам запросит историю
+	// пакетом "history_since"; иначе сразу отправляем историю всех чатов
+	if r.URL.Query().Get("sync") != "1" {
+		go sendHistory(user, cl)
+	}
 
 	// Когда соединение завершится — удалим клиента из списка и закроем соединение
+	// (если клиент уже переподключился, в списке его новое соединение — его не трогаем)
 	defer func() {
 		mu.Lock()
-		delete(clients, user)
+		if clients[user] == cl {
+			delete(clients, user)
+		}
 		mu.Unlock()
-		conn.Close()
+		cl.close()
 	}()
 
 	// === Цикл получения сообщений от клиента ===
@@ -72,11 +89,35 @@ func handleWS(w http.ResponseWriter, r *http.Request) {
 			break // соединение закрыто или произошла ошибка
 		}
 
-		// Обрабатываем только сообщения типа "msg"
-		if p.Type == "msg" {
+		switch p.Type {
+		case "msg":
+			// Повтор уже сохранённого сообщения (клиент не дождался подтверждения) —
+			// только подтверждаем, второй раз не сохраняем и не рассылаем
+			// (в "ack" — время сохранённой копии, клиент запишет его в кэш)
+			if ts, ok := seenClientIDs.lookup(user, p.ClientID); p.ClientID != "" && ok {
+				_ = cl.send(Packet{Type: "ack", ClientID: p.ClientID, Ts: ts})
+				continue
+			}
+
 			p.From = user                 // Устанавливаем имя отправителя
 			p.Ts = time.Now().UnixMilli() // Временная метка отправки
 			broadcast <- p                // Отправляем сообщение в канал
+
+		case "history_since":
+			// Клиент сообщил, до какого момента у него есть история каждого чата.
+			// При возобновлении сессии сначала отправляем изменившиеся чаты
+			if resume {
+				sendChatsSince(user, cl, p.Since)
+			}
+			sendHistorySince(user, cl, p.Since)
+
+		case "chats_request":
+			// Клиент получил изменение неизвестного ему чата и просит полный список
+			sendChats(user, cl)
+
+		case "history_before":
+			// Клиент прокрутил переписку вверх и просит страницу постарше
+			sendHistoryPage(user, cl, p.ChatID, p.Before, p.BeforeID)
 		}
 	}
 }
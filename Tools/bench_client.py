@@ -0,0 +1,240 @@
+"""
+Замеры производительности горячих путей клиента (Qt в режиме offscreen).
+
+Сценарии:
+- handle_packet: пакет "history" на 1k / 10k / 100k сообщений;
+- reload_chat_view для большого чата;
+- переключение чатов через on_chat_selected;
+- ChatListModel.update_chats на 5k чатов (вставка и перестановка);
+- перерисовка списка чатов (ChatItemDelegate) и переписки (BubbleDelegate).
+
+Для каждого сценария — медиана времени по повторам; в конце — пиковый RSS
+и число QObject у окна. С --baseline результаты сравниваются с сохранёнными
+(--save сохраняет текущие), при замедлении больше --tolerance код выхода 1.
+
+Пример:
+    python Tools/bench_client.py --save baseline.json
+    python Tools/bench_client.py --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Qt без дисплея, кэш сообщений — во временной папке (до импорта модулей клиента)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+_CACHE_DIR = tempfile.TemporaryDirectory(prefix="tychagram-bench-")
+os.environ["TYCHAGRAM_CACHE_DIR"] = _CACHE_DIR.name
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Client"))
+
+from PyQt5.QtCore    import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+import chat_window
+import packets
+from chat_window import ChatWindow
+from models      import ChatSummary
+
+USERNAME = "bench"
+
+def history_packet(chat_id: int, count: int, peer: str) -> dict:
+    """
+    Пакет "history" на count сообщений (как его присылает сервер, до разбора).
+    """
+    start = int(time.time() * 1000) - count * 1000
+    return {
+        "type": "history",
+        "chat_id": chat_id,
+        "messages": [
+            {"from": USERNAME if i % 2 else peer,
+             "text": f"message {i} " + "lorem ipsum " * (i % 7),
+             "ts": start + i * 1000}
+            for i in range(count)
+        ],
+        "has_more": False,
+    }
+
+def chat_summaries(count: int, shift: int = 0) -> list:
+    """
+    count личных чатов; shift меняет время последних сообщений (перестановки).
+    """
+    rnd = random.Random(shift)
+    now = int(time.time() * 1000)
+    return [
+        ChatSummary(chat_id=i + 1, username=f"user{i}", display=f"User {i}",
+                    last_msg=f"last message {i}", last_at=now - rnd.randrange(10 ** 8))
+        for i in range(count)
+    ]
+
+def timed(fn, repeat: int) -> float:
+    """
+    Медиана времени выполнения fn за repeat повторов, мс.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+class OfflineBridge(QObject):
+    """
+    Заглушка WSBridge для замеров: те же сигналы и методы, но без сокета —
+    настоящий мост подключался бы к серверу и переподключался во время замеров.
+    """
+
+    got_packets = pyqtSignal(list)
+    connected = pyqtSignal()
+    disconnected = pyqtSignal()
+    acked = pyqtSignal(str, object)
+    send_failed = pyqtSignal(str)
+
+    def __init__(self, username: str, token: str, *args, **kwargs):
+        super().__init__()
+
+    def resumed(self) -> bool:
+        return False
+
+    def is_connected(self) -> bool:
+        return False
+
+    def send(self, data: dict) -> bool:
+        return False
+
+    def send_message(self, payload: dict) -> str:
+        return uuid.uuid4().hex
+
+    def confirm(self, client_id: str):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+class Bench:
+    """
+    Окно клиента без сервера: пакеты подаются прямо в handle_packet.
+    """
+
+    def __init__(self, app: QApplication):
+        self.app = app
+        # ChatWindow создаёт мост сам — подменяем его класс до создания окна
+        chat_window.WSBridge = OfflineBridge
+        self.win = ChatWindow(USERNAME, "bench-token")
+        self.win.resize(900, 600)
+        self.win.show()
+        self.app.processEvents()
+
+    def select(self, chat_id: int):
+        """
+        Открывает чат так же, как щелчок в списке.
+        """
+        self.win.on_chat_selected(self.win.chatModel.index_for_chat(chat_id))
+        self.app.processEvents()
+
+    def run(self, repeat: int) -> dict:
+        win, app = self.win, self.app
+        res = {}
+
+        # Список чатов: сначала маленький, чтобы открыть переписки
+        win.chatModel.update_chats(chat_summaries(3))
+        app.processEvents()
+
+        # 1) Приём истории (чат открыт — включает перестройку переписки)
+        for n in (1000, 10000, 100000):
+            raw = history_packet(1, n, "user0")
+            self.select(1)
+
+            def ingest():
+                # разбор пакета — часть замера (в клиенте он идёт в потоке PacketDecoder)
+                win.handle_packet(packets.parse(raw))
+                app.processEvents()
+
+            res[f"handle_history_{n // 1000}k_ms"] = timed(ingest, repeat if n < 100000 else 1)
+
+        # 2) Перестройка большой переписки
+        res["reload_chat_view_100k_ms"] = timed(
+            lambda: (win.reload_chat_view(), app.processEvents()), repeat)
+
+        # 3) Переключение между большими чатами
+        win.handle_packet(packets.parse(history_packet(2, 10000, "user1")))
+
+        def switch():
+            self.select(2)
+            self.select(1)
+
+        res["switch_chats_ms"] = timed(switch, repeat) / 2
+
+        # 4) Список чатов: 5k новых чатов, затем перестановка почти всех
+        win.chatModel.update_chats([])
+        big = chat_summaries(5000)
+        res["update_chats_5k_insert_ms"] = timed(
+            lambda: (win.chatModel.update_chats([]), win.chatModel.update_chats(big)), 1)
+        shifted = [chat_summaries(5000, shift=s) for s in range(repeat)]
+        it = iter(shifted)
+        res["update_chats_5k_move_ms"] = timed(lambda: win.chatModel.update_chats(next(it)), repeat)
+        app.processEvents()
+
+        # 5) Перерисовка видимых строк
+        viewport = win.chatListView.viewport()
+        res["repaint_chat_list_ms"] = timed(viewport.repaint, repeat * 5)
+        viewport = win.messages.viewport()
+        res["repaint_messages_ms"] = timed(viewport.repaint, repeat * 5)
+
+        # Память и объекты Qt
+        res["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        res["qobjects"] = len(win.findChildren(QObject))
+        return {k: round(v, 3) if isinstance(v, float) else v for k, v in res.items()}
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Возвращает список замедлений относительно baseline (больше чем на tolerance).
+    """
+    regressions = []
+    for key, base in baseline.items():
+        cur = result.get(key)
+        if not isinstance(cur, (int, float)) or not isinstance(base, (int, float)) or base <= 0:
+            continue
+        if cur > base * (1 + tolerance):
+            regressions.append(f"{key}: {base} → {cur} (+{(cur / base - 1) * 100:.0f}%)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности клиента Tychagram")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого замера")
+    parser.add_argument("--baseline", help="JSON с предыдущими результатами для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимое замедление относительно baseline (0.2 = 20%%)")
+    parser.add_argument("--save", help="сохранить результаты в этот JSON")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    bench = Bench(app)
+    result = bench.run(args.repeat)
+    bench.win.close()   # сохраняет и закрывает кэш, останавливает мост
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Сравнение форматов кадров WebSocket на истории из N сообщений (по умолчанию 10k).
+
+История нарезается на пакеты "history_bulk" так же, как это делает сервер
+(по HISTORY_BULK_CHUNK сообщений), и кодируется в каждом формате:
+- json          — текстовые кадры (без enc);
+- deflate       — enc=deflate: один поток deflate на соединение (как client.compress на сервере);
+- deflate-frame — каждый кадр сжат отдельно (как permessage-deflate без сохранения контекста);
+- msgpack       — для сравнения, если установлен пакет msgpack.
+
+Для каждого формата — байты на линии, время кодирования и время разбора
+на клиенте (распаковка + разбор, как PacketDecoder), медиана по повторам.
+
+Пример:
+    python Tools/bench_wire.py --messages 10000 --chats 200
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:     # необязательный формат — без пакета просто пропускается
+    msgpack = None
+
+HISTORY_BULK_CHUNK = 2000   # как historyBulkChunk на сервере
+DEFLATE_LEVEL = 1           # как deflateLevel (flate.BestSpeed) на сервере
+
+def history_frames(messages: int, chats: int, seed: int = 1) -> list:
+    """
+    Пакеты "history_bulk" с messages сообщениями в chats чатах.
+    """
+    rnd = random.Random(seed)
+    users = [f"user{i}" for i in range(chats + 1)]
+    start = int(time.time() * 1000) - messages * 1000
+    per_chat = max(1, messages // chats)
+
+    entries = []
+    ts = start
+    for chat in range(chats):
+        count = per_chat if chat < chats - 1 else messages - per_chat * (chats - 1)
+        peer = users[chat + 1]
+        msgs = []
+        for _ in range(max(0, count)):
+            ts += rnd.randrange(1, 2000)
+            words = rnd.randrange(1, 25)
+            msgs.append({"from": rnd.choice((users[0], peer)),
+                         "text": " ".join(rnd.choice(("привет", "ok", "lorem", "ipsum", "когда",
+                                                      "завтра", "созвон", "готово", "👍"))
+                                          for _ in range(words)),
+                         "ts": ts})
+        entries.append({"chat_id": chat + 1, "messages": msgs, "has_more": count >= 50})
+
+    frames, bulk, size = [], [], 0
+    for entry in entries:
+        bulk.append(entry)
+        size += len(entry["messages"])
+        if size >= HISTORY_BULK_CHUNK:
+            frames.append({"type": "history_bulk", "chats": bulk})
+            bulk, size = [], 0
+    if bulk:
+        frames.append({"type": "history_bulk", "chats": bulk})
+    return frames
+
+# === Форматы: encode(пакеты) → кадры, decode(кадры) → пакеты ===
+
+def encode_json(pkts: list) -> list:
+    return [json.dumps(p, ensure_ascii=False).encode("utf-8") for p in pkts]
+
+def decode_json(frames: list) -> list:
+    return [json.loads(f.decode("utf-8")) for f in frames]
+
+def encode_deflate(pkts: list) -> list:
+    z = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return [z.compress(raw) + z.flush(zlib.Z_SYNC_FLUSH) for raw in encode_json(pkts)]
+
+def decode_deflate(frames: list) -> list:
+    z = zlib.decompressobj(-zlib.MAX_WBITS)
+    return [json.loads(z.decompress(f).decode("utf-8")) for f in frames]
+
+def encode_deflate_frame(pkts: list) -> list:
+    out = []
+    for raw in encode_json(pkts):
+        z = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        out.append(z.compress(raw) + z.flush(zlib.Z_SYNC_FLUSH))
+    return out
+
+def decode_deflate_frame(frames: list) -> list:
+    return [json.loads(zlib.decompressobj(-zlib.MAX_WBITS).decompress(f).decode("utf-8"))
+            for f in frames]
+
+FORMATS = {
+    "json": (encode_json, decode_json),
+    "deflate": (encode_deflate, decode_deflate),
+    "deflate-frame": (encode_deflate_frame, decode_deflate_frame),
+}
+if msgpack is not None:
+    FORMATS["msgpack"] = (lambda pkts: [msgpack.packb(p) for p in pkts],
+                          lambda frames: [msgpack.unpackb(f) for f in frames])
+
+def timed(fn, repeat: int):
+    """
+    Медиана времени выполнения fn за repeat повторов (мс) и результат последнего вызова.
+    """
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), result
+
+def run(messages: int, chats: int, repeat: int) -> dict:
+    pkts = history_frames(messages, chats)
+    res = {"messages": messages, "chats": chats, "frames": len(pkts), "formats": {}}
+    json_bytes = None
+
+    for name, (encode, decode) in FORMATS.items():
+        encode_ms, frames = timed(lambda: encode(pkts), repeat)
+        decode_ms, decoded = timed(lambda: decode(frames), repeat)
+        if decoded != pkts:
+            raise SystemExit(f"{name}: decoded packets differ from the original")
+
+        wire = sum(len(f) for f in frames)
+        if json_bytes is None:
+            json_bytes = wire
+        res["formats"][name] = {
+            "wire_bytes": wire,
+            "ratio": round(json_bytes / wire, 2),
+            "encode_ms": round(encode_ms, 3),
+            "decode_ms": round(decode_ms, 3),
+        }
+    return res
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение форматов кадров WebSocket Tychagram")
+    parser.add_argument("--messages", type=int, default=10000, help="сообщений в истории")
+    parser.add_argument("--chats", type=int, default=200, help="чатов, между которыми они распределены")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого замера")
+    parser.add_argument("--save", help="сохранить результаты в этот JSON")
+    args = parser.parse_args()
+
+    result = run(args.messages, args.chats, args.repeat)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            f.write(text)
+    if msgpack is None:
+        print("msgpack не установлен — формат пропущен", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Проверка сценария «эхо потерялось» для исходящих сообщений клиента (Qt в режиме offscreen).
+
+Сервер сохранил сообщение, но эхо "msg" не дошло: соединение оборвалось.
+После переподключения клиент повторяет сообщение (сервер отвечает "ack")
+и синхронизирует историю ("history_since"), где это сообщение уже есть
+с client_id. В любом порядке ответов в переписке должна остаться одна
+копия сообщения в состоянии «доставлено».
+
+Сценарии:
+- дельта истории ("since"), затем "ack";
+- "ack", затем дельта истории;
+- последняя страница истории (без "since"), затем "ack".
+
+Пакеты подаются прямо в handle_packet, мост WebSocket заменён заглушкой.
+Код выхода 1, если хотя бы один сценарий не прошёл.
+
+Пример:
+    python Tools/check_outbox.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Qt без дисплея, кэш сообщений — во временной папке (до импорта модулей клиента)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+_CACHE_DIR = tempfile.TemporaryDirectory(prefix="tychagram-check-")
+os.environ["TYCHAGRAM_CACHE_DIR"] = _CACHE_DIR.name
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Client"))
+
+from PyQt5.QtCore    import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+import chat_window
+import packets
+from chat_window import ChatWindow
+from conv_store  import STATUS_SENT
+from models      import ChatSummary
+
+CHAT_ID = 1
+PEER = "peer"
+
+class RecordingBridge(QObject):
+    """
+    Заглушка WSBridge без сокета: запоминает выданные client_id
+    и сообщения, подтверждённые через историю (confirm).
+    """
+
+    got_packets = pyqtSignal(list)
+    connected = pyqtSignal()
+    disconnected = pyqtSignal()
+    acked = pyqtSignal(str, object)
+    send_failed = pyqtSignal(str)
+
+    def __init__(self, username: str, token: str, *args, **kwargs):
+        super().__init__()
+        self.issued = []
+        self.confirmed = set()
+
+    def resumed(self) -> bool:
+        return True
+
+    def is_connected(self) -> bool:
+        return True
+
+    def send(self, data: dict) -> bool:
+        return True
+
+    def send_message(self, payload: dict) -> str:
+        client_id = f"cid-{len(self.issued)}"
+        self.issued.append(client_id)
+        return client_id
+
+    def confirm(self, client_id: str):
+        self.confirmed.add(client_id)
+
+    def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+class Scenario:
+    """
+    Окно клиента с открытым личным чатом и одним сообщением собеседника в истории.
+    """
+
+    def __init__(self, app: QApplication, username: str):
+        self.app = app
+        self.username = username
+        self.t0 = int(time.time() * 1000) - 60000
+        self.win = ChatWindow(username, "check-token")
+        self.win.chatModel.update_chats([
+            ChatSummary(chat_id=CHAT_ID, username=PEER, display="Peer",
+                        last_msg="hi", last_at=self.t0)])
+        self.win.on_chat_selected(self.win.chatModel.index_for_chat(CHAT_ID))
+        self.feed({"type": "history", "chat_id": CHAT_ID, "has_more": False,
+                   "messages": [{"from": PEER, "text": "hi", "ts": self.t0}]})
+
+    def feed(self, pkt: dict):
+        self.win.handle_packet(packets.parse(pkt))
+        self.app.processEvents()
+
+    def send(self, text: str) -> str:
+        """
+        Отправляет сообщение из поля ввода; эхо "msg" не приходит (потерялось).
+        """
+        self.win.input.setText(text)
+        self.win.send()
+        self.app.processEvents()
+        return self.win.ws_bridge.issued[-1]
+
+    def reconnect(self):
+        # запрос синхронизации после переподключения (ответ подаётся через feed)
+        self.win.request_sync()
+
+    def own_row(self, text: str, ts: int, client_id: str) -> dict:
+        return {"from": self.username, "text": text, "ts": ts, "client_id": client_id}
+
+    def ack(self, client_id: str, ts: int):
+        self.win.on_message_acked(client_id, ts)
+        self.app.processEvents()
+
+    def problems(self, text: str, client_id: str, ts: int) -> list:
+        """
+        Что не так с перепиской после сценария (пустой список — всё верно).
+        """
+        copies = [m for m in self.win.store.messages(CHAT_ID) if m.text == text]
+        res = []
+        if len(copies) != 1:
+            res.append(f"{len(copies)} copies of the message in the chat")
+        res += [f"copy in state {m.status!r}" for m in copies if m.status != STATUS_SENT]
+        res += [f"copy with ts {m.ts}, expected {ts}" for m in copies if m.ts != ts]
+        if client_id in self.win.outgoing:
+            res.append("message still waits for the server")
+        if self.win.msgModel.rowCount() != len(self.win.store.messages(CHAT_ID)):
+            res.append("model and store disagree")
+        return res
+
+    def close(self):
+        self.win.close()
+
+def delta_then_ack(sc: Scenario) -> list:
+    text, ts = "lost-echo", sc.t0 + 1000
+    cid = sc.send(text)
+    sc.reconnect()
+    sc.feed({"type": "history", "chat_id": CHAT_ID, "since": sc.t0,
+             "messages": [sc.own_row(text, ts, cid)]})
+    sc.ack(cid, ts)
+    res = sc.problems(text, cid, ts)
+    if cid not in sc.win.ws_bridge.confirmed:
+        res.append("outbox entry not confirmed by history")
+    return res
+
+def ack_then_delta(sc: Scenario) -> list:
+    text, ts = "lost-echo", sc.t0 + 1000
+    cid = sc.send(text)
+    sc.reconnect()
+    sc.ack(cid, ts)
+    sc.feed({"type": "history", "chat_id": CHAT_ID, "since": sc.t0,
+             "messages": [sc.own_row(text, ts, cid)]})
+    return sc.problems(text, cid, ts)
+
+def page_then_ack(sc: Scenario) -> list:
+    text, ts = "lost-echo", sc.t0 + 1000
+    cid = sc.send(text)
+    sc.reconnect()
+    sc.feed({"type": "history", "chat_id": CHAT_ID, "has_more": False,
+             "messages": [{"from": PEER, "text": "hi", "ts": sc.t0},
+                          sc.own_row(text, ts, cid)]})
+    sc.ack(cid, ts)
+    return sc.problems(text, cid, ts)
+
+SCENARIOS = {
+    "delta_then_ack": delta_then_ack,
+    "ack_then_delta": ack_then_delta,
+    "page_then_ack": page_then_ack,
+}
+
+def main():
+    app = QApplication(sys.argv)
+    # ChatWindow создаёт мост сам — подменяем его класс до создания окон
+    chat_window.WSBridge = RecordingBridge
+
+    failed = 0
+    for i, (name, fn) in enumerate(SCENARIOS.items()):
+        sc = Scenario(app, f"check{i}")     # у каждого сценария свой файл кэша
+        try:
+            problems = fn(sc)
+        finally:
+            sc.close()
+        print(("FAIL " if problems else "ok   ") + name)
+        for p in problems:
+            print("    " + p)
+        failed += bool(problems)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
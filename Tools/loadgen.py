@@ -0,0 +1,332 @@
+"""
+Генератор нагрузки на сервер Tychagram (без Qt).
+
+Регистрирует (или логинит) N пользователей через REST, открывает N WebSocket-
+соединений с тем же форматом пакетов, что у WSBridge/ChatWindow.send, и шлёт
+личные и групповые сообщения с заданной частотой. Измеряет задержку
+отправка → доставка (по client_id), скорость пакетов и байт в секунду.
+Результат пишется в JSON, чтобы прогоны можно было сравнивать.
+
+Нужен aiohttp (pip install -r Tools/requirements.txt).
+
+Пример:
+    python Tools/loadgen.py --users 1000 --duration 60 --direct-rate 0.2 --out run.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, deque
+
+import aiohttp
+
+class Stats:
+    """
+    Общие счётчики прогона: пакеты и байты по направлениям,
+    время отправки недавних сообщений (по client_id) и задержки.
+    """
+
+    def __init__(self, sent_ttl: float):
+        self.sent_ttl = sent_ttl    # сколько помнить время отправки сообщения, с
+        self.sent_at = {}           # client_id → время отправки (time.monotonic)
+        self.sent_order = deque()   # (время отправки, client_id) в порядке отправки
+        self.delivery = []          # задержки отправка → получение адресатом, с
+        self.echo = []              # задержки отправка → эхо отправителю, с
+        self.packets_in = Counter() # тип пакета → сколько получено
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.msgs_sent = 0
+        self.connected = 0
+        self.connect_errors = 0
+        self.disconnects = 0
+        self.errors = Counter()     # текст ошибки → сколько раз
+
+    def track(self, client_id: str, now: float):
+        """
+        Запоминает время отправки сообщения и забывает отправленные раньше,
+        чем sent_ttl секунд назад: их доставка уже не учитывается в задержках,
+        а память не растёт с длительностью прогона.
+        """
+        self.sent_at[client_id] = now
+        self.sent_order.append((now, client_id))
+        cutoff = now - self.sent_ttl
+        while self.sent_order[0][0] < cutoff:
+            _, old = self.sent_order.popleft()
+            del self.sent_at[old]
+
+class LoadUser:
+    """
+    Один виртуальный пользователь: токен, WebSocket-соединение
+    и список чатов, в которые он пишет.
+    """
+
+    def __init__(self, username: str):
+        self.username = username
+        self.token = ""
+        self.ws = None
+        self.peer = ""              # собеседник для личных сообщений
+        self.groups = []            # chat_id групп, в которых состоит
+
+async def auth(session: aiohttp.ClientSession, api: str, user: LoadUser, password: str):
+    """
+    Регистрирует пользователя (POST /signup), а если имя уже занято — логинит (POST /login).
+    """
+    body = {"username": user.username, "first_name": user.username, "password": password}
+    async with session.post(f"{api}/signup", json=body) as resp:
+        if resp.status == 200:
+            user.token = (await resp.json(content_type=None))["token"]
+            return
+        if resp.status != 409:
+            raise RuntimeError(f"signup {user.username}: HTTP {resp.status}")
+
+    body = {"username": user.username, "password": password}
+    async with session.post(f"{api}/login", json=body) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"login {user.username}: HTTP {resp.status}")
+        user.token = (await resp.json(content_type=None))["token"]
+
+async def create_group(session: aiohttp.ClientSession, api: str,
+                       owner: LoadUser, members: list, title: str) -> int:
+    """
+    Создаёт групповой чат (POST /chats/group) и возвращает его chat_id.
+    """
+    body = {"title": title, "usernames": [m.username for m in members]}
+    headers = {"Authorization": f"Bearer {owner.token}"}
+    async with session.post(f"{api}/chats/group", json=body, headers=headers) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"group {title}: HTTP {resp.status}")
+        return (await resp.json(content_type=None))["chat_id"]
+
+async def reader(user: LoadUser, stats: Stats):
+    """
+    Читает входящие пакеты соединения и считает задержки доставки
+    сообщений, отправленных генератором (по client_id).
+    """
+    async for frame in user.ws:
+        if frame.type != aiohttp.WSMsgType.TEXT:
+            if frame.type == aiohttp.WSMsgType.BINARY:
+                stats.bytes_in += len(frame.data)
+            elif frame.type == aiohttp.WSMsgType.ERROR:
+                stats.errors[f"ws: {user.ws.exception()}"] += 1
+            continue
+
+        now = time.monotonic()
+        # байты на линии: текст кадра — UTF-8, кириллица и эмодзи длиннее символов
+        stats.bytes_in += len(frame.data.encode("utf-8"))
+        try:
+            pkt = json.loads(frame.data)
+        except ValueError:
+            stats.errors["bad json"] += 1
+            continue
+
+        ptype = pkt.get("type", "")
+        stats.packets_in[ptype] += 1
+        if ptype != "msg":
+            continue
+
+        sent = stats.sent_at.get(pkt.get("client_id"))
+        if sent is None:
+            continue
+        if pkt.get("from") == user.username:
+            stats.echo.append(now - sent)
+        else:
+            stats.delivery.append(now - sent)
+    stats.disconnects += 1
+
+async def writer(user: LoadUser, stats: Stats, direct_rate: float, group_rate: float, until: float):
+    """
+    Отправляет сообщения с пуассоновскими интервалами: личные — собеседнику,
+    групповые — в случайную из своих групп. Частоты — сообщений в секунду.
+    """
+    rate = direct_rate + (group_rate if user.groups else 0.0)
+    if rate <= 0:
+        return
+    direct_share = direct_rate / rate
+
+    while True:
+        await asyncio.sleep(random.expovariate(rate))
+        if time.monotonic() >= until or user.ws.closed:
+            return
+
+        client_id = uuid.uuid4().hex
+        text = f"load {client_id[:8]} {time.time():.3f}"
+        if random.random() < direct_share:
+            payload = {"type": "msg", "from": user.username, "to": user.peer,
+                       "text": text, "client_id": client_id}
+        else:
+            payload = {"type": "msg", "chat_id": random.choice(user.groups),
+                       "text": text, "client_id": client_id}
+
+        raw = json.dumps(payload)
+        stats.track(client_id, time.monotonic())
+        try:
+            await user.ws.send_str(raw)
+        except ConnectionError as e:
+            stats.errors[f"send: {e}"] += 1
+            return
+        stats.msgs_sent += 1
+        stats.bytes_out += len(raw)
+
+async def connect(session: aiohttp.ClientSession, ws_url: str, user: LoadUser,
+                  stats: Stats, sem: asyncio.Semaphore, timeout: float) -> bool:
+    """
+    Открывает WebSocket-соединение пользователя (как WSBridge: token и sync=1).
+    Рукопожатие ограничено timeout секундами.
+    """
+    async with sem:
+        try:
+            user.ws = await asyncio.wait_for(session.ws_connect(
+                ws_url, params={"token": user.token, "sync": "1"},
+                max_msg_size=0, heartbeat=None,
+            ), timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            stats.connect_errors += 1
+            stats.errors[f"connect: {e}"] += 1
+            return False
+    stats.connected += 1
+    return True
+
+def percentiles(samples: list) -> dict:
+    """
+    Возвращает перцентили задержек в миллисекундах.
+    """
+    if not samples:
+        return {"count": 0}
+    data = sorted(samples)
+    n = len(data)
+
+    def pick(p: float) -> float:
+        return round(data[min(n - 1, int(p * n))] * 1000, 3)
+
+    return {
+        "count": n,
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "p999": pick(0.999),
+        "max": round(data[-1] * 1000, 3),
+        "mean": round(sum(data) / n * 1000, 3),
+    }
+
+async def run(args) -> dict:
+    """
+    Полный прогон: подготовка пользователей и групп, подключение, нагрузка, отчёт.
+    """
+    stats = Stats(args.sent_ttl)
+    users = [LoadUser(f"{args.prefix}{i}") for i in range(args.users)]
+    for i, user in enumerate(users):
+        user.peer = users[(i + 1) % len(users)].username
+
+    # Тайм-аут каждого HTTP-запроса (и отдельно — установки TCP-соединения)
+    timeout = aiohttp.ClientTimeout(total=args.timeout, sock_connect=args.timeout)
+    conn = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=conn) as session:
+        # 1) Пользователи
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def auth_one(u):
+            async with sem:
+                await auth(session, args.api, u, args.password)
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(auth_one(u) for u in users))
+        auth_time = time.monotonic() - t0
+
+        # 2) Группы: пользователи разбиваются на группы по group_size
+        if args.group_rate > 0 and args.group_size > 1:
+            for g in range(0, len(users) - 1, args.group_size):
+                members = users[g:g + args.group_size]
+                if len(members) < 2:
+                    break
+                chat_id = await create_group(session, args.api, members[0],
+                                             members[1:], f"{args.prefix}group{g}")
+                for m in members:
+                    m.groups.append(chat_id)
+
+        # 3) Соединения (с ограничением одновременных подключений и плавным нарастанием)
+        t0 = time.monotonic()
+        delay = args.ramp / len(users) if args.ramp > 0 else 0
+
+        async def connect_one(i, u):
+            if delay:
+                await asyncio.sleep(i * delay)
+            return await connect(session, args.ws, u, stats, sem, args.timeout)
+
+        await asyncio.gather(*(connect_one(i, u) for i, u in enumerate(users)))
+        connect_time = time.monotonic() - t0
+        live = [u for u in users if u.ws is not None]
+
+        # 4) Нагрузка
+        readers = [asyncio.ensure_future(reader(u, stats)) for u in live]
+        start = time.monotonic()
+        until = start + args.duration
+        await asyncio.gather(*(writer(u, stats, args.direct_rate, args.group_rate, until)
+                               for u in live))
+        # Ждём доставки последних сообщений
+        await asyncio.sleep(args.drain)
+        elapsed = time.monotonic() - start
+
+        for u in live:
+            await u.ws.close()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    packets = sum(stats.packets_in.values())
+    return {
+        "config": vars(args),
+        "users": len(users),
+        "connected": stats.connected,
+        "connect_errors": stats.connect_errors,
+        "disconnects": stats.disconnects - len(live),
+        "auth_seconds": round(auth_time, 3),
+        "connect_seconds": round(connect_time, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_sent": stats.msgs_sent,
+        "messages_delivered": len(stats.delivery),
+        "messages_echoed": len(stats.echo),
+        "packets_in": dict(stats.packets_in),
+        "packets_in_per_sec": round(packets / elapsed, 1),
+        "bytes_in_per_sec": round(stats.bytes_in / elapsed, 1),
+        "bytes_out_per_sec": round(stats.bytes_out / elapsed, 1),
+        "latency_delivery_ms": percentiles(stats.delivery),
+        "latency_echo_ms": percentiles(stats.echo),
+        "errors": dict(stats.errors.most_common(20)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера Tychagram")
+    parser.add_argument("--api", default="http://localhost:8080", help="адрес REST API")
+    parser.add_argument("--ws", default="ws://localhost:8080/ws", help="адрес WebSocket")
+    parser.add_argument("--users", type=int, default=100, help="число пользователей и соединений")
+    parser.add_argument("--prefix", default="load", help="префикс имён пользователей")
+    parser.add_argument("--password", default="loadgen-pass", help="пароль пользователей")
+    parser.add_argument("--duration", type=float, default=30, help="длительность нагрузки, с")
+    parser.add_argument("--direct-rate", type=float, default=0.1,
+                        help="личных сообщений в секунду на пользователя")
+    parser.add_argument("--group-rate", type=float, default=0.0,
+                        help="групповых сообщений в секунду на пользователя")
+    parser.add_argument("--group-size", type=int, default=10, help="участников в группе")
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="одновременных запросов при подготовке и подключении")
+    parser.add_argument("--ramp", type=float, default=0, help="растянуть подключение на столько секунд")
+    parser.add_argument("--drain", type=float, default=2, help="сколько ждать доставки в конце, с")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="тайм-аут HTTP-запросов и подключения WebSocket, с")
+    parser.add_argument("--sent-ttl", type=float, default=60,
+                        help="сколько помнить отправленные сообщения для замера задержки, с")
+    parser.add_argument("--out", help="файл для JSON-отчёта (по умолчанию — stdout)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Локальная замена сервера Tychagram на asyncio (aiohttp), без PostgreSQL.
+
+Реализует REST (/login, /signup, /users/search, /chats/direct, /chats/group)
+и WebSocket /ws с теми же JSON-пакетами, что у Go-сервера (Packet, ChatSummary):
+"chats", "history", "msg", "ack", а также запросы "history_since"
+и "history_before", "chats_request"; список чатов после сообщений обновляется
+пакетами "chat_update". Как и Go-сервер, с enc=deflate сжимает кадры одним
+потоком deflate на соединение. Данные хранятся в памяти.
+
+Сценарии для воспроизводимых замеров клиента:
+- --chats N      — у пользователя --user N чатов с ботами;
+- --history M    — в каждом чате M сообщений истории;
+- --storm R      — боты пишут пользователю R сообщений в секунду.
+
+Нужен aiohttp (pip install -r Tools/requirements.txt).
+
+Пример:
+    python Tools/mock_server.py --user demo --password demo --chats 500 --history 2000 --storm 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import zlib
+
+from aiohttp import web, WSMsgType
+
+HISTORY_PAGE_SIZE = 50  # как historyPageSize на сервере
+HISTORY_BULK_CHUNK = 2000  # как historyBulkChunk на сервере
+SEARCH_LIMIT = 20       # как LIMIT в SearchUsers
+
+class MockServer:
+    """
+    Состояние и обработчики сервера-заглушки.
+    Поведение повторяет Go-сервер: после каждого сообщения участникам
+    рассылаются само сообщение и изменение списка чатов ("chat_update").
+    """
+
+    def __init__(self):
+        self.users = {}         # username → {"password", "display_name"}
+        self.tokens = {}        # token → username
+        self.chats = {}         # chat_id → {"is_group", "title", "members", "messages", "created_at"}
+        self.direct = {}        # frozenset(username, username) → chat_id
+        self.clients = {}       # username → WebSocketResponse
+        self.deflaters = {}     # WebSocketResponse → поток сжатия (для enc=deflate)
+        self.seen_ids = {}      # (username, client_id) сохранённого сообщения → его ts
+        self._next_chat = 1
+        self._last_ts = 0
+
+    # === Данные ===
+
+    def now_ms(self) -> int:
+        """
+        Текущее время в мс; строго возрастает, чтобы у сообщений не было одинаковых меток.
+        """
+        ts = max(int(time.time() * 1000), self._last_ts + 1)
+        self._last_ts = ts
+        return ts
+
+    def add_user(self, username: str, password: str, first_name: str = "", last_name: str = "") -> bool:
+        """
+        Добавляет пользователя. Возвращает False, если имя занято.
+        """
+        if username in self.users:
+            return False
+        display = " ".join(p for p in (first_name, last_name) if p) or username
+        self.users[username] = {"password": password, "display_name": display}
+        return True
+
+    def new_token(self, username: str) -> str:
+        token = uuid.uuid4().hex
+        self.tokens[token] = username
+        return token
+
+    def ensure_direct(self, u1: str, u2: str) -> tuple:
+        """
+        Возвращает (id личного чата двух пользователей, создан ли он сейчас).
+        """
+        key = frozenset((u1, u2))
+        chat_id = self.direct.get(key)
+        if chat_id is not None:
+            return chat_id, False
+        chat_id = self.create_chat(False, "", [u1, u2])
+        self.direct[key] = chat_id
+        return chat_id, True
+
+    def create_chat(self, is_group: bool, title: str, members: list) -> int:
+        chat_id = self._next_chat
+        self._next_chat += 1
+        self.chats[chat_id] = {
+            "is_group": is_group,
+            "title": title,
+            "members": list(dict.fromkeys(members)),
+            "messages": [],     # {"from", "text", "ts"} по возрастанию времени
+            "created_at": self.now_ms(),
+        }
+        return chat_id
+
+    def chat_summary(self, username: str, chat_id: int) -> dict:
+        """
+        Сводка одного чата пользователя (как GetUserChat).
+        """
+        return next(s for s in self.chat_summaries(username) if s["chat_id"] == chat_id)
+
+    def chat_summaries(self, username: str) -> list:
+        """
+        Список чатов пользователя в формате ChatSummary (сначала свежие).
+        """
+        res = []
+        for chat_id, chat in self.chats.items():
+            if username not in chat["members"]:
+                continue
+            last = chat["messages"][-1] if chat["messages"] else None
+            s = {
+                "chat_id": chat_id,
+                "is_group": chat["is_group"],
+                "display": chat["title"],
+                "last_msg": last["text"] if last else "",
+                "last_at": last["ts"] if last else 0,
+            }
+            if chat["is_group"]:
+                s["title"] = chat["title"]
+            else:
+                peer = next((m for m in chat["members"] if m != username), username)
+                s["username"] = peer
+                s["display"] = self.users[peer]["display_name"]
+            s["_order"] = last["ts"] if last else chat["created_at"]
+            res.append(s)
+        res.sort(key=lambda s: s.pop("_order"), reverse=True)
+        return res
+
+    def history_page(self, chat_id: int, viewer: str, after: int = 0, before: int = 0,
+                     before_id: int = 0):
+        """
+        До HISTORY_PAGE_SIZE самых новых сообщений чата и ID первого из них
+        (как loadHistoryPage). ID сообщения — его номер в чате, начиная с 1.
+        after — только новее этого времени; before — только старше сообщения
+        (before, before_id), а без before_id — включая миллисекунду before.
+        client_id остаётся только в сообщениях самого viewer (как historyRow).
+        """
+        bound = (before, before_id) if before_id else (before, float("inf"))
+        sel = [(i + 1, m) for i, m in enumerate(self.chats[chat_id]["messages"])
+               if (not after or m["ts"] > after)
+               and (not before or (m["ts"], i + 1) < bound)]
+        sel = sel[-HISTORY_PAGE_SIZE:]
+        rows = [m if "client_id" not in m or m["from"] == viewer
+                else {k: v for k, v in m.items() if k != "client_id"}
+                for _, m in sel]
+        return rows, (sel[0][0] if sel else 0)
+
+    # === Рассылка ===
+
+    async def send(self, username: str, pkt: dict):
+        ws = self.clients.get(username)
+        if ws is not None and not ws.closed:
+            await self.send_ws(ws, pkt)
+
+    async def send_ws(self, ws, pkt: dict):
+        """
+        Отправляет пакет в соединение: сжатым бинарным кадром (enc=deflate) или текстом.
+        """
+        raw = json.dumps(pkt, ensure_ascii=False)
+        z = self.deflaters.get(ws)
+        if z is None:
+            await ws.send_str(raw)
+        else:
+            await ws.send_bytes(z.compress(raw.encode("utf-8")) + z.flush(zlib.Z_SYNC_FLUSH))
+
+    async def send_chats(self, username: str):
+        await self.send(username, {"type": "chats", "chats": self.chat_summaries(username), "to": ""})
+
+    async def send_chat_added(self, username: str, chat_id: int):
+        await self.send(username, {"type": "chat_update", "to": "",
+                                   "added": [self.chat_summary(username, chat_id)]})
+
+    async def deliver(self, sender: str, pkt: dict):
+        """
+        Сохраняет сообщение и рассылает его участникам чата
+        (вместе с изменением списка чатов), как router на Go-сервере.
+        """
+        pkt["from"] = sender
+        pkt["ts"] = self.now_ms()
+        created = False
+
+        if pkt.get("chat_id"):
+            chat = self.chats.get(pkt["chat_id"])
+            if chat is None or sender not in chat["members"]:
+                return
+            chat_id = pkt["chat_id"]
+            targets = chat["members"]
+        else:
+            peer = pkt.get("to", "")
+            if peer not in self.users:
+                return
+            chat_id, created = self.ensure_direct(sender, peer)
+            chat = self.chats[chat_id]
+            targets = [peer, sender] if peer != sender else [sender]
+
+        row = {"from": sender, "text": pkt.get("text", ""), "ts": pkt["ts"]}
+        chat["messages"].append(row)
+        if pkt.get("client_id"):
+            row["client_id"] = pkt["client_id"]
+            # как seenClientIDs.add: только сохранённые сообщения
+            self.seen_ids[(sender, pkt["client_id"])] = pkt["ts"]
+        update = {"type": "chat_update", "to": "", "updated": [
+            {"chat_id": chat_id, "last_msg": pkt.get("text", ""), "last_at": pkt["ts"]}]}
+        for uname in targets:
+            await self.send(uname, pkt)
+            if created:
+                await self.send_chat_added(uname, chat_id)
+            else:
+                await self.send(uname, update)
+
+    async def send_history_since(self, username: str, since: dict):
+        """
+        Как sendHistorySince: дельты для чатов из since, последние страницы — для остальных;
+        всё вместе — пакетами "history_bulk" по HISTORY_BULK_CHUNK сообщений.
+        """
+        bulk, count = [], 0
+        for chat_id in [cid for cid, c in self.chats.items() if username in c["members"]]:
+            after = int(since.get(str(chat_id), since.get(chat_id, 0)) or 0)
+            msgs, oldest_id = self.history_page(chat_id, username, after=after)
+            entry = {"chat_id": chat_id, "messages": msgs}
+            if after > 0 and len(msgs) < HISTORY_PAGE_SIZE:
+                if not msgs:
+                    continue
+                entry["since"] = after
+            else:
+                entry["has_more"] = len(msgs) == HISTORY_PAGE_SIZE
+                if oldest_id:
+                    entry["oldest_id"] = oldest_id
+            bulk.append(entry)
+            count += len(msgs)
+            if count >= HISTORY_BULK_CHUNK:
+                await self.send(username, {"type": "history_bulk", "chats": bulk})
+                bulk, count = [], 0
+        if bulk:
+            await self.send(username, {"type": "history_bulk", "chats": bulk})
+
+    # === HTTP ===
+
+    def auth_user(self, request: web.Request) -> str:
+        parts = request.headers.get("Authorization", "").split()
+        if len(parts) != 2 or parts[0] != "Bearer" or parts[1] not in self.tokens:
+            raise web.HTTPUnauthorized(text="unauthorized")
+        return self.tokens[parts[1]]
+
+    async def signup(self, request: web.Request):
+        req = await request.json()
+        if not self.add_user(req.get("username", ""), req.get("password", ""),
+                             req.get("first_name", ""), req.get("last_name", "")):
+            raise web.HTTPConflict(text="username taken")
+        return web.json_response({"token": self.new_token(req["username"]), "username": req["username"]})
+
+    async def login(self, request: web.Request):
+        req = await request.json()
+        user = self.users.get(req.get("username", ""))
+        if user is None:
+            raise web.HTTPNotFound(text="user not found")
+        if user["password"] != req.get("password"):
+            raise web.HTTPUnauthorized(text="wrong password")
+        return web.json_response({"token": self.new_token(req["username"]), "username": req["username"]})
+
+    async def search(self, request: web.Request):
+        me = self.auth_user(request)
+        q = request.query.get("q", "").lower()
+        if not q:
+            return web.json_response([])
+        res = [{"username": u, "display_name": info["display_name"]}
+               for u, info in sorted(self.users.items())
+               if u != me and (q in u.lower() or q in info["display_name"].lower())]
+        return web.json_response(res[:SEARCH_LIMIT])
+
+    async def chat_direct(self, request: web.Request):
+        me = self.auth_user(request)
+        peer = (await request.json()).get("username", "")
+        if peer not in self.users:
+            raise web.HTTPNotFound(text="peer not found")
+        chat_id, created = self.ensure_direct(me, peer)
+        if created:
+            await self.send_chat_added(me, chat_id)
+            await self.send_chat_added(peer, chat_id)
+        return web.json_response({"chat_id": chat_id})
+
+    async def chat_group(self, request: web.Request):
+        me = self.auth_user(request)
+        req = await request.json()
+        title, usernames = req.get("title", ""), req.get("usernames") or []
+        if not title or not usernames:
+            raise web.HTTPBadRequest(text="title and at least one user required")
+        for u in usernames:
+            if u not in self.users:
+                raise web.HTTPNotFound(text=f"user {u} not found")
+        chat_id = self.create_chat(True, title, [me] + usernames)
+        for u in self.chats[chat_id]["members"]:
+            await self.send_chat_added(u, chat_id)
+        return web.json_response({"chat_id": chat_id})
+
+    # === WebSocket ===
+
+    async def ws_handler(self, request: web.Request):
+        user = self.tokens.get(request.query.get("token", ""))
+        if user is None:
+            raise web.HTTPUnauthorized(text="invalid token")
+
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.clients[user] = ws
+
+        enc = "json"
+        if request.query.get("enc") == "deflate":
+            enc = "deflate"
+            self.deflaters[ws] = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+        await self.send_ws(ws, {"type": "hello", "enc": enc, "to": ""})
+
+        resume = request.query.get("resume") == "1"
+        if not resume:
+            await self.send_chats(user)
+        if request.query.get("sync") != "1":
+            await self.send_history_since(user, {})
+
+        try:
+            async for frame in ws:
+                if frame.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    p = json.loads(frame.data)
+                except ValueError:
+                    break
+                await self.handle_packet(user, ws, p, resume)
+        finally:
+            if self.clients.get(user) is ws:
+                del self.clients[user]
+            self.deflaters.pop(ws, None)
+        return ws
+
+    async def handle_packet(self, user: str, ws, p: dict, resume: bool):
+        ptype = p.get("type")
+        if ptype == "msg":
+            cid = p.get("client_id")
+            if cid:
+                ts = self.seen_ids.get((user, cid))
+                if ts is not None:
+                    await self.send_ws(ws, {"type": "ack", "client_id": cid, "ts": ts, "to": ""})
+                    return
+            await self.deliver(user, p)
+
+        elif ptype == "history_since":
+            since = p.get("since") or {}
+            if resume:
+                changed = [c for c in self.chat_summaries(user)
+                           if c["last_at"] > int(since.get(str(c["chat_id"]), -1))]
+                if changed:
+                    await self.send(user, {"type": "chats", "chats": changed, "partial": True, "to": ""})
+            await self.send_history_since(user, since)
+
+        elif ptype == "chats_request":
+            await self.send_chats(user)
+
+        elif ptype == "history_before":
+            chat_id, before = p.get("chat_id", 0), p.get("before", 0)
+            reply = {"type": "history", "chat_id": chat_id, "messages": [], "has_more": False}
+            if before:
+                reply["before"] = before
+            chat = self.chats.get(chat_id)
+            if chat is not None and user in chat["members"]:
+                msgs, oldest_id = self.history_page(chat_id, user, before=before,
+                                                    before_id=p.get("before_id", 0))
+                reply["messages"] = msgs
+                reply["has_more"] = len(msgs) == HISTORY_PAGE_SIZE
+                if oldest_id:
+                    reply["oldest_id"] = oldest_id
+            await self.send(user, reply)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/signup", self.signup)
+        app.router.add_post("/login", self.login)
+        app.router.add_get("/users/search", self.search)
+        app.router.add_post("/chats/direct", self.chat_direct)
+        app.router.add_post("/chats/group", self.chat_group)
+        app.router.add_get("/ws", self.ws_handler)
+        return app
+
+    # === Сценарии ===
+
+    def seed(self, username: str, password: str, chats: int, history: int, groups: int = 0):
+        """
+        Готовит сценарий: пользователь username с chats личными чатами (с ботами)
+        и groups групповыми; в каждом чате history сообщений, с шагом в секунду.
+        """
+        self.add_user(username, password)
+        start = self.now_ms() - history * 1000
+        for i in range(chats + groups):
+            bot = f"bot{i}"
+            self.add_user(bot, password, "Bot", str(i))
+            if i < chats:
+                chat_id, _ = self.ensure_direct(username, bot)
+            else:
+                chat_id = self.create_chat(True, f"Group {i - chats}", [username, bot])
+            msgs = self.chats[chat_id]["messages"]
+            for j in range(history):
+                sender = bot if j % 2 else username
+                msgs.append({"from": sender, "text": f"message {j} in chat {chat_id}",
+                             "ts": start + j * 1000 + i})
+        self._last_ts = max(self._last_ts, start + history * 1000 + chats + groups)
+
+    async def storm(self, username: str, rate: float):
+        """
+        Шторм сообщений: боты пишут пользователю rate сообщений в секунду
+        (пуассоновский поток) в случайные чаты.
+        """
+        chat_ids = [cid for cid, c in self.chats.items() if username in c["members"]]
+        if not chat_ids or rate <= 0:
+            return
+        n = 0
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            chat_id = random.choice(chat_ids)
+            chat = self.chats[chat_id]
+            bot = next((m for m in chat["members"] if m != username), username)
+            n += 1
+            if chat["is_group"]:
+                pkt = {"type": "msg", "chat_id": chat_id, "to": "", "text": f"storm {n}"}
+            else:
+                pkt = {"type": "msg", "to": username, "text": f"storm {n}"}
+            await self.deliver(bot, pkt)
+
+async def serve(args):
+    server = MockServer()
+    if args.user:
+        server.seed(args.user, args.password, args.chats, args.history, args.groups)
+
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"mock server listening on {args.host}:{args.port}", flush=True)
+
+    try:
+        if args.user and args.storm > 0:
+            await server.storm(args.user, args.storm)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер-заглушка Tychagram (без базы данных)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--user", default="", help="пользователь сценария (создаётся заранее)")
+    parser.add_argument("--password", default="demo", help="пароль пользователя сценария и ботов")
+    parser.add_argument("--chats", type=int, default=0, help="личных чатов у пользователя сценария")
+    parser.add_argument("--groups", type=int, default=0, help="групповых чатов у пользователя сценария")
+    parser.add_argument("--history", type=int, default=0, help="сообщений истории в каждом чате")
+    parser.add_argument("--storm", type=float, default=0, help="входящих сообщений в секунду")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()